@@ -0,0 +1,206 @@
+# actores/actor_eventos.py
+
+import asyncio
+import time
+import zmq
+from comun.zeromq_utils import (
+    create_context,
+    create_sub_socket,
+    create_req_socket,
+    decode_message,
+    encode_message,
+    ContadoresFlujo,
+)
+from comun.zeromq_async import (
+    create_async_context,
+    ClienteAsync,
+    MonitorHeartbeatAsync,
+)
+from comun.membresia import iniciar_reporte_membresia
+from comun.perfilado import instalar_senal_perfil
+from comun.administracion import Ajustes, ServidorAdmin
+from comun.config import (
+    endpoint_conexion,
+    ASYNC_MAX_EN_CURSO,
+    MEMBRESIA_HABILITADA,
+    REQ_TIMEOUT_MS,
+    ZMQ_HWM_EVENTOS,
+)
+
+# Bucle común de los actores de devolución y renovación: escuchan un tópico del
+# GC y aplican cada evento en el GA, reintentando (mismo id_solicitud) hasta que
+# el GA responda.
+# Cada actor solo aporta su operación, tópico y textos.
+
+
+class TipoEvento:
+    """Lo propio de cada actor: operación, tópico del GC y nombres para trazas"""
+    def __init__(self, operacion: str, topic: bytes, etiqueta: str, accion: str):
+        self.operacion = operacion          # "devolucion"
+        self.topic = topic                  # TOPIC_DEVOLUCION
+        self.etiqueta = etiqueta            # "ActorDevolucion" (prefijo de las trazas)
+        self.accion = accion                # "devolución"
+        self.componente = f"actor_{operacion}"  # nombre para membresía, admin y perfil
+
+
+def get_endpoints_for_sede(sede: int):
+    """Devuelve los endpoints del GC (PUB) y del GA segun sede"""
+    return endpoint_conexion(sede, "gc_pub"), endpoint_conexion(sede, "ga")
+
+
+def run_actor_eventos(sede: int, tipo: TipoEvento):
+    """Actor de eventos (devolución / renovación):
+    - Se suscribe al tópico del tipo publicado por el GC
+    - Por cada mensaje, llama al GA con la operación del tipo (o "lote")
+    - Implementa reintento infinito si el GA no responde (espera a que reviva).
+    """
+    endpoint_pub_gc, endpoint_ga = get_endpoints_for_sede(sede)
+    muestreador = instalar_senal_perfil(f"{tipo.componente}-sede{sede}")
+    prefijo = f"[{tipo.etiqueta} Sede {sede}]"
+
+    print(f"{prefijo} Suscrito a {endpoint_pub_gc} (topic {tipo.topic.decode()})")
+    print(f"{prefijo} Comunicando con GA en {endpoint_ga}")
+
+    context = create_context()
+    # Ajustes en caliente (socket de administración, ver comun/administracion.py)
+    ajustes = Ajustes(timeout_ga_ms=REQ_TIMEOUT_MS, trazas=True)
+    version_ajustes = ajustes.version
+
+    # SUB al GC (escuchar los eventos del tópico)
+    socket_sub = create_sub_socket(context, endpoint_pub_gc, tipo.topic, ZMQ_HWM_EVENTOS)
+    contadores = ContadoresFlujo()  # eventos recibidos y perdidos (saltos de secuencia del GC)
+    # REQ al GA (aplicar el evento en la BD)
+    socket_req_ga = create_req_socket(context, endpoint_ga, ajustes["timeout_ga_ms"])
+
+    estado = {"cola": 0}
+    if MEMBRESIA_HABILITADA:
+        iniciar_reporte_membresia(tipo.componente, sede, lambda: {"estado": "OK", "cola": estado["cola"]})
+    ServidorAdmin(tipo.componente, sede, ajustes, lambda: dict(contadores.como_dict(), cola=estado["cola"]),
+                  muestreador).start()
+
+    while True:
+        topic, raw_msg = socket_sub.recv_multipart()
+        evento = decode_message(raw_msg)
+        contadores.registrar_recibido(topic, evento.get("seq"))
+        if ajustes.version != version_ajustes:
+            version_ajustes = ajustes.version
+            socket_req_ga.setsockopt(zmq.RCVTIMEO, ajustes["timeout_ga_ms"])
+            socket_req_ga.setsockopt(zmq.SNDTIMEO, ajustes["timeout_ga_ms"])
+
+        operacion = evento.get("operacion")
+        payload = evento.get("payload", {}) or {}
+
+        # "lote": varios eventos de una carga masiva en un solo mensaje
+        if operacion not in (tipo.operacion, "lote"):
+            # Ignorar mensajes raros
+            print(f"{prefijo} Operación inesperada: {operacion}")
+            continue
+
+        if ajustes["trazas"]:
+            print(f"{prefijo} --- Nueva solicitud ---")
+            print(f"{prefijo} Procesando {tipo.accion}: {payload}")
+
+        # El id se repite en cada reintento: el GA aplica el evento una sola vez
+        solicitud_ga = {
+            "operacion": operacion,
+            "payload": payload,
+            "id_solicitud": evento.get("id_solicitud"),
+        }
+
+        # --- LOGICA DE ESPERA Y REINTENTO (LAZY PIRATE) ---
+        estado["cola"] = 1
+        while True:
+            try:
+                socket_req_ga.send(encode_message(solicitud_ga))
+                # Si el GA esta muerto, recv lanzará excepción por timeout
+                raw_resp = socket_req_ga.recv()
+                resp_ga = decode_message(raw_resp)
+                if resp_ga.get("razon") in ("OCUPADO", "DRENANDO"):
+                    # GA en pausa o drenando (reinicio): no aplicó nada, se reintenta con el mismo id
+                    time.sleep(resp_ga.get("reintentar_en_ms", 1000) / 1000)
+                    continue
+                if ajustes["trazas"]:
+                    print(f"{prefijo} Respuesta GA: {resp_ga}")
+                estado["cola"] = 0
+                break  # Éxito, salimos del bucle de reintentos
+
+            except Exception as e:
+                print(f"{prefijo} GA no responde o está caído ({e}).")
+                print(f"{prefijo} Esperando a que reviva para reintentar...")
+
+                # Cerramos el socket "dañado" y creamos uno nuevo para reconectar limpiamente
+                socket_req_ga.close()
+                time.sleep(2)  # Espera de 2 segundos antes de reintentar
+                socket_req_ga = create_req_socket(context, endpoint_ga, ajustes["timeout_ga_ms"])
+
+
+async def run_actor_eventos_async(sede: int, tipo: TipoEvento):
+    """Actor de eventos en modo asyncio:
+    - Cada evento se atiende en su propia tarea (hasta ASYNC_MAX_EN_CURSO a la vez)
+    - Timeout por cancelación: el socket al GA no se destruye ni se recrea
+    - El heartbeat del GA se escucha en el mismo event loop: si el GA está caído
+      se espera a que vuelva en vez de reintentar a ciegas
+    """
+    endpoint_pub_gc, endpoint_ga = get_endpoints_for_sede(sede)
+    muestreador = instalar_senal_perfil(f"{tipo.componente}-sede{sede}")
+    hb_endpoint = endpoint_conexion(sede, "ga_heartbeat")
+    prefijo = f"[{tipo.etiqueta} Sede {sede}]"
+
+    print(f"{prefijo} (asyncio) Suscrito a {endpoint_pub_gc} (topic {tipo.topic.decode()})")
+    print(f"{prefijo} (asyncio) Comunicando con GA en {endpoint_ga}")
+
+    context = create_async_context()
+    socket_sub = create_sub_socket(context, endpoint_pub_gc, tipo.topic, ZMQ_HWM_EVENTOS)
+    contadores = ContadoresFlujo()  # eventos recibidos y perdidos (saltos de secuencia del GC)
+    cliente_ga = ClienteAsync(context, endpoint_ga)
+    monitor_ga = MonitorHeartbeatAsync(context, hb_endpoint)
+    limite = asyncio.Semaphore(ASYNC_MAX_EN_CURSO)
+    tareas = set()
+    ajustes = Ajustes(timeout_ga_ms=REQ_TIMEOUT_MS, trazas=True)
+    ServidorAdmin(tipo.componente, sede, ajustes,
+                  lambda: dict(contadores.como_dict(), cola=cliente_ga.en_curso), muestreador).start()
+    if MEMBRESIA_HABILITADA:
+        iniciar_reporte_membresia(tipo.componente, sede, lambda: {"estado": "OK", "cola": cliente_ga.en_curso})
+
+    async def procesar(solicitud_ga: dict):
+        try:
+            while True:
+                resp_ga = await cliente_ga.solicitar(solicitud_ga, ajustes["timeout_ga_ms"])
+                if resp_ga is not None and resp_ga.get("razon") in ("OCUPADO", "DRENANDO"):
+                    # GA en pausa o drenando (reinicio): no aplicó nada, se reintenta con el mismo id
+                    await asyncio.sleep(resp_ga.get("reintentar_en_ms", 1000) / 1000)
+                    continue
+                if resp_ga is not None:
+                    if ajustes["trazas"]:
+                        print(f"{prefijo} Respuesta GA: {resp_ga}")
+                    return
+                print(f"{prefijo} GA no responde ({cliente_ga.en_curso} en curso). Reintentando...")
+                if monitor_ga.caido:
+                    await monitor_ga.esperar_vivo(60)
+                else:
+                    await asyncio.sleep(2)
+        finally:
+            limite.release()
+
+    while True:
+        # Contrapresión: con ASYNC_MAX_EN_CURSO eventos en curso no se lee más del
+        # GC; se llena la cola del SUB (HWM) y el GC retiene en vez de descartar
+        await limite.acquire()
+        topic, raw_msg = await socket_sub.recv_multipart()
+        evento = decode_message(raw_msg)
+        contadores.registrar_recibido(topic, evento.get("seq"))
+
+        operacion = evento.get("operacion")
+        payload = evento.get("payload", {}) or {}
+
+        if operacion not in (tipo.operacion, "lote"):
+            print(f"{prefijo} Operación inesperada: {operacion}")
+            limite.release()
+            continue
+
+        if ajustes["trazas"]:
+            print(f"{prefijo} Procesando {tipo.accion}: {payload}")
+        tarea = asyncio.ensure_future(procesar({"operacion": operacion, "payload": payload,
+                                                "id_solicitud": evento.get("id_solicitud")}))
+        tareas.add(tarea)
+        tarea.add_done_callback(tareas.discard)
@@ -1,51 +1,93 @@
 # actores/actor_prestamo.py
 
 import argparse
+import asyncio
 import time
+import zmq
 from comun.zeromq_utils import (
     create_context,
     create_rep_socket,
     create_req_socket,
     encode_message,
     decode_message,
+    create_router_socket,
+    split_envelope,
 )
+from comun.zeromq_async import (
+    create_async_context,
+    ClienteAsync,
+    MonitorHeartbeatAsync,
+)
+from comun.membresia import iniciar_reporte_membresia, VistaMembresia
+from comun.perfilado import instalar_senal_perfil
+from comun.administracion import Ajustes, ServidorAdmin
 from comun.config import (
-    ACTOR_PRESTAMOS_SEDE1_ENDPOINT,
-    ACTOR_PRESTAMOS_SEDE2_ENDPOINT,
-    GA_SEDE1_ENDPOINT,
-    GA_SEDE2_ENDPOINT,
+    SEDES,
+    get_peers,
+    endpoints_bind,
+    endpoint_conexion,
+    ASYNC_MAX_EN_CURSO,
+    MEMBRESIA_HABILITADA,
+    REQ_TIMEOUT_MS,
 )
 
 
 def get_endpoints_for_sede(sede: int):
-    if sede == 1:
-        return (
-            ACTOR_PRESTAMOS_SEDE1_ENDPOINT,
-            GA_SEDE1_ENDPOINT,  # primario
-            GA_SEDE2_ENDPOINT,  # respaldo
-        )
-    elif sede == 2:
-        return (
-            ACTOR_PRESTAMOS_SEDE2_ENDPOINT,
-            GA_SEDE2_ENDPOINT,  # primario
-            GA_SEDE1_ENDPOINT,  # respaldo
-        )
-    else:
-        raise ValueError("La sede debe ser 1 o 2")
+    """Endpoints del actor (bind), GA primario (la propia sede) y GA de respaldo de cada otra sede"""
+    respaldos = {peer: endpoint_conexion(peer, "ga") for peer in get_peers(sede)}
+    return endpoints_bind(sede, "actor_prestamos"), endpoint_conexion(sede, "ga"), respaldos
+
+
+def orden_respaldos(sede: int, vista=None):
+    """
+    Sedes de respaldo en orden de preferencia.
+    Sin membresía: de la más cercana a la más lejana.
+    Con membresía: primero los GA vivos con menor cola/carga (a igual carga, el
+    más cercano), luego los que la vista aún no conoce; los caídos se omiten.
+    """
+    peers = get_peers(sede)
+    if vista is None:
+        return peers
+
+    def carga(peer):
+        m = vista.miembros.get(f"ga-{peer}", {})
+        return m.get("cola", 0), m.get("carga", 0)
+
+    vivos = sorted((p for p in peers if vista.esta_vivo(f"ga-{p}")), key=carga)
+    desconocidos = [p for p in peers if not vista.conocido(f"ga-{p}")]
+    # Si la vista da a todos por caídos se intenta igual, por cercanía
+    return (vivos + desconocidos) or peers
 
 
 def run_actor_prestamos(sede: int):
-    endpoint_actor, endpoint_ga_primario, endpoint_ga_backup = get_endpoints_for_sede(sede)
+    endpoint_actor, endpoint_ga_primario, endpoints_ga_backup = get_endpoints_for_sede(sede)
+    muestreador = instalar_senal_perfil(f"actor_prestamo-sede{sede}")
 
-    print(f"[ActorPrestamos Sede {sede}] Esperando solicitudes en {endpoint_actor}")
+    print(f"[ActorPrestamos Sede {sede}] Esperando solicitudes en {', '.join(endpoint_actor)}")
     print(f"[ActorPrestamos Sede {sede}] GA primario:  {endpoint_ga_primario}")
-    print(f"[ActorPrestamos Sede {sede}] GA respaldo:  {endpoint_ga_backup}")
+    for peer, endpoint in endpoints_ga_backup.items():
+        print(f"[ActorPrestamos Sede {sede}] GA respaldo:  {endpoint} (Sede {peer})")
 
     context = create_context()
+    # Ajustes en caliente (socket de administración, ver comun/administracion.py)
+    ajustes = Ajustes(timeout_ga_ms=REQ_TIMEOUT_MS, trazas=True)
+    version_ajustes = ajustes.version
 
     socket_rep_gc = create_rep_socket(context, endpoint_actor)
-    socket_req_ga_primario = create_req_socket(context, endpoint_ga_primario)
-    socket_req_ga_backup = create_req_socket(context, endpoint_ga_backup)
+    socket_req_ga_primario = create_req_socket(context, endpoint_ga_primario, ajustes["timeout_ga_ms"])
+    sockets_req_ga_backup = {
+        peer: create_req_socket(context, endpoint, ajustes["timeout_ga_ms"])
+        for peer, endpoint in endpoints_ga_backup.items()
+    }
+
+    # Membresía: reportar carga y saber si el GA primario está caído sin esperar el timeout
+    vista = None
+    estado = {"cola": 0}
+    if MEMBRESIA_HABILITADA:
+        vista = VistaMembresia().start()
+        iniciar_reporte_membresia("actor_prestamo", sede, lambda: {"estado": "OK", "cola": estado["cola"]})
+    ga_primario_id = f"ga-{sede}"
+    ServidorAdmin("actor_prestamos", sede, ajustes, lambda: {"cola": estado["cola"]}, muestreador).start()
 
     while True:
         try:
@@ -55,20 +97,31 @@ def run_actor_prestamos(sede: int):
             print(f"[Actor] Error al recibir del GC: {e}")
             # Reiniciar socket REP si es necesario (raro en REP)
             continue
+        if ajustes.version != version_ajustes:
+            version_ajustes = ajustes.version
+            for socket_ga in [socket_req_ga_primario, *sockets_req_ga_backup.values()]:
+                socket_ga.setsockopt(zmq.RCVTIMEO, ajustes["timeout_ga_ms"])
+                socket_ga.setsockopt(zmq.SNDTIMEO, ajustes["timeout_ga_ms"])
 
         operacion = msg_gc.get("operacion")
         payload = msg_gc.get("payload", {}) or {}
         usar_backup_flag = msg_gc.get("usar_backup", False)
+        if vista and vista.conocido(ga_primario_id) and not vista.esta_vivo(ga_primario_id):
+            usar_backup_flag = True
 
-        print(f"[ActorPrestamos Sede {sede}] --- Solicitud: {operacion} | {payload.get('libro_codigo')} ---")
+        if ajustes["trazas"]:
+            print(f"[ActorPrestamos Sede {sede}] --- Solicitud: {operacion} | {payload.get('libro_codigo')} ---")
 
-        if operacion != "prestamo":
+        # "lote": varios préstamos de una carga masiva que el GA aplica de una vez
+        if operacion not in ("prestamo", "lote"):
             resp = {"ok": False, "razon": "INVALID", "mensaje": "Solo prestamos"}
             socket_rep_gc.send(encode_message(resp))
             continue
 
-        solicitud_ga = {"operacion": "prestamo", "payload": payload}
+        # Mismo id al primario y a los respaldos: el préstamo se aplica una sola vez
+        solicitud_ga = {"operacion": operacion, "payload": payload, "id_solicitud": msg_gc.get("id_solicitud")}
         resp_ga = None
+        estado["cola"] = 1
 
         # --- LOGICA DE FAILOVER ROBUSTA ---
         exito = False
@@ -76,42 +129,159 @@ def run_actor_prestamos(sede: int):
         # 1. INTENTO CON PRIMARIO (si GC no forzó backup)
         if not usar_backup_flag:
             try:
-                print(f"[Actor] Contactando GA Primario...")
+                if ajustes["trazas"]:
+                    print(f"[Actor] Contactando GA Primario...")
                 socket_req_ga_primario.send(encode_message(solicitud_ga))
                 raw_resp = socket_req_ga_primario.recv()
                 resp_ga = decode_message(raw_resp)
-                exito = True
+                if resp_ga.get("razon") == "DRENANDO":
+                    # Reinicio sin corte del primario: no aplicó nada, va al respaldo
+                    print(f"[Actor] GA Primario drenando. Probando respaldo.")
+                    usar_backup_flag = True
+                else:
+                    exito = True
             except Exception as e:
                 print(f"[Actor] Fallo GA Primario ({e}). Cerrando socket y probando respaldo.")
                 socket_req_ga_primario.close()
-                socket_req_ga_primario = create_req_socket(context, endpoint_ga_primario)
+                socket_req_ga_primario = create_req_socket(context, endpoint_ga_primario, ajustes["timeout_ga_ms"])
                 usar_backup_flag = True  # Forzar paso al backup
 
-        # 2. INTENTO CON RESPALDO (si falló primario o GC lo pidió)
+        # 2. INTENTO CON RESPALDOS (si falló primario o GC lo pidió), en orden de preferencia
         if not exito and usar_backup_flag:
-            try:
-                print(f"[Actor] Contactando GA Respaldo...")
-                socket_req_ga_backup.send(encode_message(solicitud_ga))
-                raw_resp = socket_req_ga_backup.recv()
-                resp_ga = decode_message(raw_resp)
-                exito = True
-            except Exception as e:
-                print(f"[Actor] Fallo GA Respaldo ({e}). Cerrando socket.")
-                socket_req_ga_backup.close()
-                socket_req_ga_backup = create_req_socket(context, endpoint_ga_backup)
+            for peer in orden_respaldos(sede, vista):
+                try:
+                    print(f"[Actor] Contactando GA Respaldo (Sede {peer})...")
+                    sockets_req_ga_backup[peer].send(encode_message(solicitud_ga))
+                    raw_resp = sockets_req_ga_backup[peer].recv()
+                    resp_ga = decode_message(raw_resp)
+                    if resp_ga.get("razon") == "DRENANDO":
+                        continue
+                    exito = True
+                    break
+                except Exception as e:
+                    print(f"[Actor] Fallo GA Respaldo Sede {peer} ({e}). Cerrando socket.")
+                    sockets_req_ga_backup[peer].close()
+                    sockets_req_ga_backup[peer] = create_req_socket(context, endpoints_ga_backup[peer],
+                                                                    ajustes["timeout_ga_ms"])
+
+        if not exito:
+            resp_ga = {
+                "ok": False,
+                "razon": "GA_CRASH",
+                "mensaje": "Ningún Gestor de Almacenamiento está accesible.",
+            }
+
+        if ajustes["trazas"]:
+            print(f"[ActorPrestamos Sede {sede}] Resultado: {resp_ga.get('ok')}")
+        socket_rep_gc.send(encode_message(resp_ga))
+        estado["cola"] = 0
+
+
+async def run_actor_prestamos_async(sede: int):
+    """Actor de Préstamos en modo asyncio:
+    - ROUTER hacia el GC: varias solicitudes en curso, cada una en su propia tarea
+    - Timeout del GA por cancelación (sin cerrar/reabrir sockets) y paso al respaldo
+    - El heartbeat del GA primario se escucha en el mismo loop: si ya se sabe
+      caído se va directo al respaldo sin esperar el timeout
+    """
+    endpoint_actor, endpoint_ga_primario, endpoints_ga_backup = get_endpoints_for_sede(sede)
+    muestreador = instalar_senal_perfil(f"actor_prestamo-sede{sede}")
+    hb_primario = endpoint_conexion(sede, "ga_heartbeat")
+
+    print(f"[ActorPrestamos Sede {sede}] (asyncio) Esperando solicitudes en {', '.join(endpoint_actor)}")
+    print(f"[ActorPrestamos Sede {sede}] GA primario:  {endpoint_ga_primario}")
+    for peer, endpoint in endpoints_ga_backup.items():
+        print(f"[ActorPrestamos Sede {sede}] GA respaldo:  {endpoint} (Sede {peer})")
+
+    context = create_async_context()
+    socket_router_gc = create_router_socket(context, endpoint_actor)
+    ga_primario = ClienteAsync(context, endpoint_ga_primario)
+    ga_backups = {peer: ClienteAsync(context, endpoint) for peer, endpoint in endpoints_ga_backup.items()}
+    monitor_primario = MonitorHeartbeatAsync(context, hb_primario)
+    limite = asyncio.Semaphore(ASYNC_MAX_EN_CURSO)
+    tareas = set()
+    vista = None
+
+    def en_curso():
+        return ga_primario.en_curso + sum(c.en_curso for c in ga_backups.values())
+
+    if MEMBRESIA_HABILITADA:
+        vista = VistaMembresia().start()
+        iniciar_reporte_membresia("actor_prestamo", sede, lambda: {"estado": "OK", "cola": en_curso()})
+    ga_primario_id = f"ga-{sede}"
+    ajustes = Ajustes(timeout_ga_ms=REQ_TIMEOUT_MS, trazas=True)
+    ServidorAdmin("actor_prestamos", sede, ajustes, lambda: {"cola": en_curso()}, muestreador).start()
+
+    async def atender(sobre: list, msg_gc: dict):
+        async with limite:
+            operacion = msg_gc.get("operacion")
+            payload = msg_gc.get("payload", {}) or {}
+            usar_backup_flag = msg_gc.get("usar_backup", False) or monitor_primario.caido
+            if vista and vista.conocido(ga_primario_id) and not vista.esta_vivo(ga_primario_id):
+                usar_backup_flag = True
+
+            if operacion not in ("prestamo", "lote"):
+                resp = {"ok": False, "razon": "INVALID", "mensaje": "Solo prestamos"}
+                await socket_router_gc.send_multipart(sobre + [encode_message(resp)])
+                return
+
+            solicitud_ga = {"operacion": operacion, "payload": payload, "id_solicitud": msg_gc.get("id_solicitud")}
+            resp_ga = None
+
+            # 1. INTENTO CON PRIMARIO (si GC no forzó backup ni se sabe caído)
+            if not usar_backup_flag:
+                resp_ga = await ga_primario.solicitar(solicitud_ga, ajustes["timeout_ga_ms"])
+                if resp_ga is None:
+                    print(f"[Actor] Fallo GA Primario (timeout). Probando respaldo.")
+                elif resp_ga.get("razon") == "DRENANDO":
+                    resp_ga = None  # reinicio sin corte del primario: no aplicó nada
 
+            # 2. INTENTO CON RESPALDOS, en orden de preferencia
+            if resp_ga is None:
+                for peer in orden_respaldos(sede, vista):
+                    resp_ga = await ga_backups[peer].solicitar(solicitud_ga, ajustes["timeout_ga_ms"])
+                    if resp_ga is not None and resp_ga.get("razon") == "DRENANDO":
+                        resp_ga = None
+                        continue
+                    if resp_ga is not None:
+                        break
+                    print(f"[Actor] Fallo GA Respaldo Sede {peer} (timeout).")
+            if resp_ga is None:
                 resp_ga = {
                     "ok": False,
                     "razon": "GA_CRASH",
-                    "mensaje": "Ambos Gestores de Almacenamiento están inaccesibles.",
+                    "mensaje": "Ningún Gestor de Almacenamiento está accesible.",
                 }
 
-        print(f"[ActorPrestamos Sede {sede}] Resultado: {resp_ga.get('ok')}")
-        socket_rep_gc.send(encode_message(resp_ga))
+            if ajustes["trazas"]:
+                print(f"[ActorPrestamos Sede {sede}] Resultado: {resp_ga.get('ok')}")
+            await socket_router_gc.send_multipart(sobre + [encode_message(resp_ga)])
+
+    while True:
+        sobre, raw = split_envelope(await socket_router_gc.recv_multipart())
+        try:
+            msg_gc = decode_message(raw)
+        except Exception as e:
+            print(f"[Actor] Mensaje inválido del GC: {e}")
+            continue
+        if ajustes["trazas"]:
+            print(f"[ActorPrestamos Sede {sede}] --- Solicitud: {msg_gc.get('operacion')} | "
+                  f"{(msg_gc.get('payload') or {}).get('libro_codigo')} ---")
+        tarea = asyncio.ensure_future(atender(sobre, msg_gc))
+        tareas.add(tarea)
+        tarea.add_done_callback(tareas.discard)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Actor de Prestamos")
-    parser.add_argument("--sede", type=int, choices=[1, 2], required=True)
+    parser.add_argument("--sede", type=int, choices=SEDES, required=True)
+    parser.add_argument(
+        "--asyncio",
+        action="store_true",
+        help="Ejecutar con zmq.asyncio (muchas solicitudes en curso en un solo proceso)",
+    )
     args = parser.parse_args()
-    run_actor_prestamos(args.sede)
\ No newline at end of file
+    if args.asyncio:
+        asyncio.run(run_actor_prestamos_async(args.sede))
+    else:
+        run_actor_prestamos(args.sede)
\ No newline at end of file
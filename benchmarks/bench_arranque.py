@@ -0,0 +1,71 @@
+# benchmarks/bench_arranque.py
+"""
+Benchmark de arranque del GA: carga JSON completa vs snapshot binario perezoso.
+Uso: python -m benchmarks.bench_arranque --libros 200000
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from gestor_almacenamiento.ga import load_db, save_db, find_libro
+from gestor_almacenamiento.formato_binario import (
+    escribir_snapshot_binario,
+    cargar_snapshot_binario,
+)
+
+
+def generar_catalogo(n: int) -> dict:
+    rng = random.Random(42)
+    libros = []
+    for i in range(1, n + 1):
+        totales = rng.randint(1, 4)
+        libros.append({
+            "codigo": f"L{i:07d}",
+            "titulo": f"Libro {i}",
+            "autor": f"Autor {((i - 1) % 50) + 1}",
+            "ejemplares_totales": totales,
+            "ejemplares_disponibles": totales,
+            "prestamos": [],
+        })
+    return {"version": 0, "libros": libros}
+
+
+def medir(etiqueta: str, fn):
+    t0 = time.perf_counter()
+    resultado = fn()
+    ms = (time.perf_counter() - t0) * 1000
+    print(f"  {etiqueta:<38} {ms:10.2f} ms")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del GA")
+    parser.add_argument("--libros", type=int, default=100000)
+    parser.add_argument("--consultas", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = generar_catalogo(args.libros)
+    codigos = [f"L{random.randint(1, args.libros):07d}" for _ in range(args.consultas)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / "bd.json"
+        bin_path = Path(tmp) / "bd.bin"
+        save_db(json_path, db)
+        escribir_snapshot_binario(bin_path, db)
+        print(f"Catálogo: {args.libros} libros | JSON {json_path.stat().st_size / 1e6:.1f} MB"
+              f" | binario {bin_path.stat().st_size / 1e6:.1f} MB")
+
+        print("JSON:")
+        db_json = medir("load_db (arranque)", lambda: load_db(json_path))
+        medir(f"{args.consultas} consultas find_libro", lambda: [find_libro(db_json, c) for c in codigos])
+
+        print("Snapshot binario:")
+        db_bin = medir("cargar_snapshot_binario (arranque)", lambda: cargar_snapshot_binario(bin_path))
+        medir(f"{args.consultas} consultas find_libro", lambda: [find_libro(db_bin, c) for c in codigos])
+        medir("reescritura snapshot (registros crudos)",
+              lambda: escribir_snapshot_binario(Path(tmp) / "bd2.bin", {"version": 1, "libros": db_bin["libros"]}))
+
+
+if __name__ == "__main__":
+    main()
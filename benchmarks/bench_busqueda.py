@@ -0,0 +1,127 @@
+# benchmarks/bench_busqueda.py
+"""
+Benchmark del índice de búsqueda por título/autor (gestor_almacenamiento/busqueda.py):
+construcción, memoria, latencia de consultas por tipo y costo de mantenerlo.
+Los títulos se arman con un vocabulario de frecuencias tipo Zipf (unas pocas
+palabras muy comunes y muchas raras), como en un catálogo real.
+Uso: python -m benchmarks.bench_busqueda --libros 1000000
+"""
+import argparse
+import itertools
+import random
+import time
+from gestor_almacenamiento.busqueda import IndiceBusqueda, palabras
+from gestor_almacenamiento.snapshot import copiar_libro
+
+SILABAS = ["ma", "ri", "so", "la", "ne", "to", "ca", "mi", "lo", "sa", "ve", "de", "ra", "ti", "no", "ba",
+           "gu", "el", "fe", "cor", "tran", "sol", "mar", "pen", "dul", "bri", "cas", "hon", "lu", "qui"]
+
+
+def _rss_mb() -> float:
+    """Memoria residente del proceso (Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * 4096 / 1e6
+    except OSError:
+        return 0.0
+
+
+def generar_vocabulario(rng: random.Random, n: int) -> list:
+    vistas = set()
+    while len(vistas) < n:
+        vistas.add("".join(rng.choice(SILABAS) for _ in range(rng.randint(2, 4))))
+    return sorted(vistas)
+
+
+def generar_catalogo(n: int, semilla: int = 7) -> list:
+    rng = random.Random(semilla)
+    vocabulario = generar_vocabulario(rng, 50000)
+    rng.shuffle(vocabulario)  # la frecuencia no depende del orden alfabético
+    acumulados = list(itertools.accumulate(1 / (r + 1) for r in range(len(vocabulario))))  # Zipf
+    nombres = generar_vocabulario(rng, 2000)
+    apellidos = generar_vocabulario(rng, 20000)
+    libros = []
+    for i in range(1, n + 1):
+        titulo = " ".join(rng.choices(vocabulario, cum_weights=acumulados, k=rng.randint(2, 6))).capitalize()
+        autor = f"{rng.choice(nombres).capitalize()} {rng.choice(apellidos).capitalize()}"
+        libros.append({"codigo": f"L{i:07d}", "titulo": titulo, "autor": autor,
+                       "ejemplares_totales": 1, "ejemplares_disponibles": 1, "prestamos": []})
+    return libros
+
+
+def percentiles(tiempos: list) -> str:
+    tiempos = sorted(tiempos)
+    p = lambda q: tiempos[min(len(tiempos) - 1, int(q * len(tiempos)))] * 1000
+    return f"p50 {p(0.50):8.3f} ms  p95 {p(0.95):8.3f} ms  p99 {p(0.99):8.3f} ms  max {tiempos[-1] * 1000:8.3f} ms"
+
+
+def consultas_de(libros: list, rng: random.Random, n: int) -> dict:
+    """Consultas por tipo, sacadas del propio catálogo"""
+    muestra = [rng.choice(libros) for _ in range(n)]
+    tipos = {"palabra exacta": [], "dos palabras": [], "prefijo 3 letras": [], "titulo + prefijo": [],
+             "autor completo": []}
+    for libro in muestra:
+        t, a = palabras(libro["titulo"]), palabras(libro["autor"])
+        tipos["palabra exacta"].append(rng.choice(t))
+        tipos["dos palabras"].append(" ".join(rng.sample(t, 2)))
+        tipos["prefijo 3 letras"].append(rng.choice(t)[:3])
+        tipos["titulo + prefijo"].append(f"{t[0]} {t[-1][:4]}")
+        tipos["autor completo"].append(" ".join(a))
+    return tipos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de búsqueda")
+    parser.add_argument("--libros", type=int, default=1000000)
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--limite", type=int, default=10)
+    args = parser.parse_args()
+    rng = random.Random(11)
+
+    libros = generar_catalogo(args.libros)
+    db = {"version": 0, "libros": libros}
+    print(f"Catálogo: {args.libros} libros")
+
+    rss0 = _rss_mb()
+    indice = IndiceBusqueda()
+    t0 = time.perf_counter()
+    indice.reconstruir(db)
+    print(f"  construcción                {(time.perf_counter() - t0):8.2f} s")
+    memoria = indice.memoria()
+    print(f"  memoria del índice (RSS)    {_rss_mb() - rss0:8.1f} MB  | {memoria['palabras']} palabras,"
+          f" listas {memoria['bytes_listas'] / 1e6:.1f} MB")
+
+    print(f"Consultas ({args.consultas} por tipo, {args.limite} resultados):")
+    for tipo, textos in consultas_de(libros, rng, args.consultas).items():
+        tiempos, vacias, truncadas = [], 0, 0
+        for texto in textos:
+            t0 = time.perf_counter()
+            resultados, _, truncado = indice.buscar(texto, args.limite)
+            tiempos.append(time.perf_counter() - t0)
+            vacias += not resultados
+            truncadas += truncado
+        print(f"  {tipo:<18} {percentiles(tiempos)}  (vacías {vacias}, truncadas {truncadas})")
+
+    print("Mantenimiento (registrar_cambio):")
+    muestra = [rng.randrange(len(libros)) for _ in range(10000)]
+    t0 = time.perf_counter()
+    for i in muestra:
+        antes = libros[i]
+        despues = copiar_libro(antes)
+        despues["ejemplares_disponibles"] -= 1
+        indice.registrar_cambio(antes, despues)
+    print(f"  préstamo (sin cambio de texto)  {(time.perf_counter() - t0) / len(muestra) * 1e6:8.2f} us")
+    t0 = time.perf_counter()
+    for i in muestra:
+        antes = libros[i]
+        despues = dict(antes, titulo=antes["titulo"] + " edicion revisada")
+        indice.registrar_cambio(antes, despues)
+        libros[i] = despues
+    print(f"  cambio de título            {(time.perf_counter() - t0) / len(muestra) * 1e6:8.2f} us")
+    t0 = time.perf_counter()
+    indice.buscar("edicion revisada", args.limite)
+    print(f"  primera consulta tras cambios (ordena vocabulario) {(time.perf_counter() - t0) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
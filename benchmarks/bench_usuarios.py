@@ -0,0 +1,91 @@
+# benchmarks/bench_usuarios.py
+"""
+Benchmark del índice de préstamos por usuario (gestor_almacenamiento/usuarios.py):
+memoria con 1M usuarios, reconstrucción, costo de mantenerlo en cada operación
+y consulta O(1) frente a recorrer el catálogo.
+Uso: python -m benchmarks.bench_usuarios --usuarios 1000000
+"""
+import argparse
+import random
+import time
+from gestor_almacenamiento.usuarios import IndicePrestamosUsuario
+from gestor_almacenamiento.snapshot import copiar_libro
+from benchmarks.bench_busqueda import _rss_mb
+
+
+def generar_catalogo(libros: int, usuarios: int, semilla: int = 5) -> list:
+    """Catálogo con préstamos: la mayoría de los usuarios con 1 préstamo, algunos con hasta 5"""
+    rng = random.Random(semilla)
+    catalogo = [{"codigo": f"L{i:07d}", "titulo": f"Libro {i}", "autor": f"Autor {i % 500}",
+                 "ejemplares_totales": 0, "ejemplares_disponibles": 0, "prestamos": []}
+                for i in range(1, libros + 1)]
+    for u in range(usuarios):
+        usuario = f"U{u:07d}"
+        for _ in range(rng.choice((1, 1, 1, 1, 2, 2, 3, 5))):
+            libro = rng.choice(catalogo)
+            libro["prestamos"].append({"usuario_id": usuario, "fecha_entrega": "2025-12-04", "renovaciones": 0})
+            libro["ejemplares_totales"] += 1
+    return catalogo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de préstamos por usuario")
+    parser.add_argument("--usuarios", type=int, default=1000000)
+    parser.add_argument("--libros", type=int, default=200000)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    libros = generar_catalogo(args.libros, args.usuarios)
+    db = {"version": 0, "libros": libros}
+    print(f"Catálogo: {args.libros} libros, {args.usuarios} usuarios con préstamos")
+
+    rss0 = _rss_mb()
+    indice = IndicePrestamosUsuario(limite=5)
+    t0 = time.perf_counter()
+    indice.reconstruir(db)
+    print(f"  reconstrucción              {(time.perf_counter() - t0):8.2f} s")
+    memoria = indice.memoria()
+    print(f"  memoria (RSS)               {_rss_mb() - rss0:8.1f} MB  | {memoria['usuarios']} usuarios,"
+          f" {memoria['prestamos']} préstamos, estimado {memoria['bytes'] / 1e6:.1f} MB"
+          f" ({memoria['bytes'] / max(1, memoria['usuarios']):.0f} B/usuario)")
+
+    usuarios = [f"U{rng.randrange(args.usuarios):07d}" for _ in range(100000)]
+    t0 = time.perf_counter()
+    for u in usuarios:
+        indice.rechazo(u)
+    print(f"  límite por usuario (índice) {(time.perf_counter() - t0) / len(usuarios) * 1e9:8.0f} ns")
+    t0 = time.perf_counter()
+    n = sum(1 for libro in libros for p in libro["prestamos"] if p["usuario_id"] == usuarios[0])
+    print(f"  mismo conteo sin índice     {(time.perf_counter() - t0) * 1000:8.1f} ms (recorre el catálogo)")
+    assert n == indice.cantidad(usuarios[0])
+
+    print("Mantenimiento (registrar_cambio):")
+    muestra = [rng.randrange(len(libros)) for _ in range(20000)]
+    t0 = time.perf_counter()
+    for i in muestra:
+        antes = libros[i]
+        despues = copiar_libro(antes)
+        despues["prestamos"].append({"usuario_id": f"N{i}", "fecha_entrega": "2025-12-04", "renovaciones": 0})
+        indice.registrar_cambio(antes, despues)
+        libros[i] = despues
+    print(f"  préstamo                    {(time.perf_counter() - t0) / len(muestra) * 1e6:8.2f} us")
+    t0 = time.perf_counter()
+    for i in muestra:
+        antes = libros[i]
+        despues = copiar_libro(antes)
+        despues["prestamos"][-1]["renovaciones"] += 1
+        indice.registrar_cambio(antes, despues)
+        libros[i] = despues
+    print(f"  renovación                  {(time.perf_counter() - t0) / len(muestra) * 1e6:8.2f} us")
+    t0 = time.perf_counter()
+    for i in muestra:
+        antes = libros[i]
+        despues = copiar_libro(antes)
+        despues["prestamos"].pop()
+        indice.registrar_cambio(antes, despues)
+        libros[i] = despues
+    print(f"  devolución                  {(time.perf_counter() - t0) / len(muestra) * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# benchmarks/bench_zeromq.py
+"""
+Microbenchmarks de transporte ZeroMQ con los mismos constructores de sockets y
+codecs del sistema (comun/zeromq_utils.py), separados del procesamiento:
+  - REQ/REP        latencia ida y vuelta y throughput (una solicitud a la vez)
+  - DEALER/ROUTER  latencia y throughput con N solicitudes en curso (ventana)
+  - PUB/SUB        latencia de un salto y throughput, con mensajes perdidos (HWM)
+sobre inproc, ipc y tcp, barriendo tamaños de mensaje.
+
+El servidor corre en un hilo del mismo proceso (inproc lo exige); así los tres
+transportes se comparan en igualdad de condiciones, GIL incluido.
+
+Uso:
+  python -m benchmarks.bench_zeromq
+  python -m benchmarks.bench_zeromq --patrones reqrep,dealer --transportes tcp --tamanos 100,10000 --mensajes 20000
+  python -m benchmarks.bench_zeromq --sin-codec   # bytes crudos: solo transporte, sin JSON
+"""
+import argparse
+import os
+import struct
+import tempfile
+import threading
+import time
+import zmq
+
+from comun.zeromq_utils import (
+    create_context,
+    create_req_socket,
+    create_rep_socket,
+    create_router_socket,
+    create_pub_socket,
+    create_sub_socket,
+    encode_message,
+    decode_message,
+    split_envelope,
+)
+
+TOPIC = b"BENCH"
+MARCA = struct.Struct("<d")
+
+
+def endpoint_para(transporte: str, nombre: str, carpeta: str) -> str:
+    if transporte == "inproc":
+        return f"inproc://bench-{nombre}"
+    if transporte == "ipc":
+        return f"ipc://{os.path.join(carpeta, nombre)}.ipc"
+    return "tcp://127.0.0.1:{puerto}"
+
+
+def _bind_tcp(endpoint: str, crear):
+    """Para tcp se busca un puerto libre; el resto de transportes usa el endpoint tal cual"""
+    if "{puerto}" not in endpoint:
+        return crear(endpoint), endpoint
+    for puerto in range(47000, 48000):
+        try:
+            ep = endpoint.format(puerto=puerto)
+            return crear(ep), ep
+        except zmq.ZMQError:
+            continue
+    raise RuntimeError("No hay puertos libres para el benchmark")
+
+
+class Codec:
+    """Con codec: mensajes dict -> JSON (como el sistema). Sin codec: bytes crudos."""
+    def __init__(self, usar_json: bool, tamano: int):
+        self.usar_json = usar_json
+        self.relleno = "x" * tamano
+        self.crudo = b"x" * max(tamano, MARCA.size)
+
+    def mensaje(self, marca: float = 0.0) -> bytes:
+        if self.usar_json:
+            return encode_message({"operacion": "prestamo", "t": marca, "relleno": self.relleno})
+        return MARCA.pack(marca) + self.crudo[MARCA.size:]
+
+    def marca(self, raw: bytes) -> float:
+        if self.usar_json:
+            return decode_message(raw)["t"]
+        return MARCA.unpack_from(raw)[0]
+
+    def eco(self, raw: bytes) -> bytes:
+        """El servidor decodifica y vuelve a codificar, como un GA o GC real"""
+        if self.usar_json:
+            return encode_message(decode_message(raw))
+        return raw
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0.0
+
+
+# PATRONES
+def bench_reqrep(context, endpoint, codec: Codec, n: int):
+    socket_rep, endpoint = _bind_tcp(endpoint, lambda ep: create_rep_socket(context, ep))
+
+    def servidor():
+        for _ in range(n):
+            socket_rep.send(codec.eco(socket_rep.recv()))
+
+    hilo = threading.Thread(target=servidor, daemon=True)
+    hilo.start()
+    socket_req = create_req_socket(context, endpoint, timeout_ms=10000)
+    latencias = []
+    t0 = time.perf_counter()
+    for _ in range(n):
+        t = time.perf_counter()
+        socket_req.send(codec.mensaje(t))
+        codec.marca(socket_req.recv())
+        latencias.append(time.perf_counter() - t)
+    duracion = time.perf_counter() - t0
+    hilo.join()
+    socket_req.close()
+    socket_rep.close()
+    return latencias, n / duracion, 0
+
+
+def bench_dealer(context, endpoint, codec: Codec, n: int, ventana: int):
+    socket_router, endpoint = _bind_tcp(endpoint, lambda ep: create_router_socket(context, ep))
+
+    def servidor():
+        for _ in range(n):
+            sobre, raw = split_envelope(socket_router.recv_multipart())
+            socket_router.send_multipart(sobre + [codec.eco(raw)])
+
+    hilo = threading.Thread(target=servidor, daemon=True)
+    hilo.start()
+    socket_dealer = context.socket(zmq.DEALER)
+    socket_dealer.connect(endpoint)
+    latencias = []
+    enviados = recibidos = 0
+    t0 = time.perf_counter()
+    while recibidos < n:
+        # Mantener 'ventana' solicitudes en curso (como ClienteAsync)
+        while enviados < n and enviados - recibidos < ventana:
+            socket_dealer.send_multipart([b"", codec.mensaje(time.perf_counter())])
+            enviados += 1
+        _, raw = socket_dealer.recv_multipart()
+        latencias.append(time.perf_counter() - codec.marca(raw))
+        recibidos += 1
+    duracion = time.perf_counter() - t0
+    hilo.join()
+    socket_dealer.close()
+    socket_router.close()
+    return latencias, n / duracion, 0
+
+
+def bench_pubsub(context, endpoint, codec: Codec, n: int):
+    socket_pub, endpoint = _bind_tcp(endpoint, lambda ep: create_pub_socket(context, ep))
+    socket_sub = create_sub_socket(context, endpoint, TOPIC)
+    socket_sub.setsockopt(zmq.RCVTIMEO, 500)
+    fin = TOPIC + b"-FIN"
+    socket_sub.setsockopt(zmq.SUBSCRIBE, fin)
+
+    # Esperar a que la suscripción llegue al PUB (slow joiner)
+    while True:
+        socket_pub.send_multipart([TOPIC, codec.mensaje(-1.0)])
+        try:
+            socket_sub.recv_multipart()
+            break
+        except zmq.Again:
+            continue
+    socket_sub.setsockopt(zmq.RCVTIMEO, 100)
+    while True:
+        try:
+            socket_sub.recv_multipart()  # descartar calentamiento
+        except zmq.Again:
+            break
+
+    latencias = []
+    resultado = {}
+
+    def suscriptor():
+        socket_sub.setsockopt(zmq.RCVTIMEO, 5000)
+        t_primero = None
+        while True:
+            try:
+                topic, raw = socket_sub.recv_multipart()
+            except zmq.Again:
+                break
+            if topic == fin:
+                break
+            ahora = time.perf_counter()
+            t_primero = t_primero or ahora
+            latencias.append(ahora - codec.marca(raw))
+        resultado["duracion"] = time.perf_counter() - (t_primero or time.perf_counter())
+
+    hilo = threading.Thread(target=suscriptor)
+    hilo.start()
+    for _ in range(n):
+        socket_pub.send_multipart([TOPIC, codec.mensaje(time.perf_counter())])
+    socket_pub.send_multipart([fin, b""])
+    hilo.join()
+    socket_sub.close()
+    socket_pub.close()
+    recibidos = len(latencias)
+    return latencias, recibidos / max(resultado["duracion"], 1e-9), n - recibidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de transporte ZeroMQ")
+    parser.add_argument("--patrones", type=str, default="reqrep,dealer,pubsub")
+    parser.add_argument("--transportes", type=str, default="inproc,ipc,tcp")
+    parser.add_argument("--tamanos", type=str, default="64,1024,16384,262144", help="Bytes de relleno por mensaje")
+    parser.add_argument("--mensajes", type=int, default=5000)
+    parser.add_argument("--ventana", type=int, default=64, help="Solicitudes en curso en DEALER/ROUTER")
+    parser.add_argument("--sin-codec", action="store_true", help="Bytes crudos en vez de JSON")
+    args = parser.parse_args()
+
+    context = create_context()
+    print(f"{'patrón':<8} {'transp.':<7} {'bytes':>8} {'p50 µs':>9} {'p99 µs':>9} {'msg/s':>10} {'MB/s':>8} {'perdidos':>9}")
+    with tempfile.TemporaryDirectory() as carpeta:
+        for patron in args.patrones.split(","):
+            for transporte in args.transportes.split(","):
+                for tamano in (int(t) for t in args.tamanos.split(",")):
+                    codec = Codec(not args.sin_codec, tamano)
+                    bytes_msg = len(codec.mensaje())
+                    endpoint = endpoint_para(transporte, f"{patron}-{tamano}", carpeta)
+                    # Mensajes grandes: menos repeticiones para que cada caso dure parecido
+                    n = max(200, min(args.mensajes, args.mensajes * 1024 // max(tamano, 1024)))
+                    if patron == "reqrep":
+                        latencias, tasa, perdidos = bench_reqrep(context, endpoint, codec, n)
+                    elif patron == "dealer":
+                        latencias, tasa, perdidos = bench_dealer(context, endpoint, codec, n, args.ventana)
+                    elif patron == "pubsub":
+                        latencias, tasa, perdidos = bench_pubsub(context, endpoint, codec, n)
+                    else:
+                        raise ValueError(f"Patrón desconocido: {patron}")
+                    print(f"{patron:<8} {transporte:<7} {bytes_msg:>8} {percentil(latencias, 0.5) * 1e6:>9.1f}"
+                          f" {percentil(latencias, 0.99) * 1e6:>9.1f} {tasa:>10,.0f}"
+                          f" {tasa * bytes_msg / 1e6:>8.1f} {perdidos:>9}")
+    context.term()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# benchmarks/simulacion_motor.py
+"""
+Simulación determinista del motor de operaciones del GA, sin ZeroMQ.
+Reproduce un log de solicitudes (formato de los archivos del PS) o una carga
+generada con semilla directamente contra las funciones de operación, valida
+invariantes y reporta op/s por backend de almacenamiento.
+
+Uso:
+  python -m benchmarks.simulacion_motor --libros 10000 --ops 200000
+  python -m benchmarks.simulacion_motor --bd bd/bd_primaria_sede1.json --log ps_sede1_a.txt --repeticiones 1000
+  python -m benchmarks.simulacion_motor --backends ops,motor,binario --comparar
+"""
+import argparse
+import copy
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from gestor_almacenamiento import ga
+from gestor_almacenamiento.formato_binario import escribir_snapshot_binario, cargar_snapshot_binario
+from gestor_almacenamiento.tabla_disponibilidad import TablaDisponibilidad
+from gestor_almacenamiento.vencimientos import IndiceVencimientos
+from benchmarks.bench_arranque import generar_catalogo
+from ps.ps import parse_line
+
+
+# BACKENDS: factory(db, carpeta_tmp) -> (aplicar(operacion, payload) -> respuesta, obtener_db())
+def backend_ops(db: dict, tmp: Path):
+    """Funciones op_* directas sobre el dict (sin tabla ni índices)"""
+    ops = {"prestamo": ga.op_prestamo, "devolucion": ga.op_devolucion, "renovacion": ga.op_renovacion}
+    estado = {"db": db}
+
+    def aplicar(operacion, payload):
+        estado["db"], resp = ops[operacion](estado["db"], payload)
+        return resp
+    return aplicar, lambda: estado["db"]
+
+
+def backend_motor(db: dict, tmp: Path):
+    """aplicar_operacion del GA: tabla de disponibilidad mapeada + índice de vencimientos"""
+    tabla = TablaDisponibilidad(tmp / "disponibilidad.tbl")
+    tabla.reconstruir(db)
+    indices = [IndiceVencimientos()]
+    for indice in indices:
+        indice.reconstruir(db)
+    estado = {"db": db}
+
+    def aplicar(operacion, payload):
+        estado["db"], resp = ga.aplicar_operacion(estado["db"], tabla, operacion, payload, indices)
+        return resp
+    return aplicar, lambda: estado["db"]
+
+
+def backend_binario(db: dict, tmp: Path):
+    """Igual que 'motor' pero sobre el catálogo perezoso del snapshot binario"""
+    escribir_snapshot_binario(tmp / "bd.bin", db)
+    return backend_motor(cargar_snapshot_binario(tmp / "bd.bin"), tmp)
+
+
+BACKENDS = {
+    "ops": backend_ops,
+    "motor": backend_motor,
+    "binario": backend_binario,
+}
+
+
+# INVARIANTES
+class Invariantes:
+    """
+    - ejemplares_disponibles nunca negativo
+    - disponibles <= totales (los libros que ya lo violaban al inicio se reportan aparte)
+    - máximo 2 renovaciones por préstamo
+    - disponibles + préstamos activos se conserva (no se crean ni pierden ejemplares)
+    """
+    def __init__(self, db: dict):
+        self.stock = {}
+        self.preexistentes = set()
+        for libro in db.get("libros", []):
+            if "ejemplares_disponibles" not in libro:
+                continue  # registro incompleto: no se puede validar
+            self.stock[libro["codigo"]] = libro["ejemplares_disponibles"] + len(libro.get("prestamos", []))
+            if libro["ejemplares_disponibles"] > libro.get("ejemplares_totales", 0):
+                self.preexistentes.add(libro["codigo"])
+        self.violaciones = []
+
+    def verificar(self, libro: dict, n_op: int = -1):
+        codigo = libro["codigo"]
+        if codigo not in self.stock:
+            return
+        disponibles = libro["ejemplares_disponibles"]
+        if disponibles < 0:
+            self.violaciones.append((n_op, codigo, "stock negativo"))
+        if disponibles > libro.get("ejemplares_totales", 0) and codigo not in self.preexistentes:
+            self.violaciones.append((n_op, codigo, "disponibles > totales"))
+        if any(p.get("renovaciones", 0) > 2 for p in libro.get("prestamos", [])):
+            self.violaciones.append((n_op, codigo, "más de 2 renovaciones"))
+        if disponibles + len(libro.get("prestamos", [])) != self.stock[codigo]:
+            self.violaciones.append((n_op, codigo, "ejemplares creados o perdidos"))
+
+    def verificar_todo(self, db: dict):
+        for libro in db.get("libros", []):
+            self.verificar(libro)
+
+
+# CARGAS DE TRABAJO
+def generar_carga(n_ops: int, codigos: list, n_usuarios: int, semilla: int, sesgo: float):
+    """
+    Carga determinista: 50% préstamos, 30% devoluciones y 20% renovaciones de
+    préstamos que la propia carga generó. 'sesgo' es la fracción de préstamos
+    que van al 1% de libros más pedidos. La fecha avanza un día cada 1000 ops.
+    """
+    rng = random.Random(semilla)
+    populares = codigos[:max(1, len(codigos) // 100)]
+    activos = []
+    fecha = date(2025, 11, 20)
+    carga = []
+    for i in range(n_ops):
+        if i and i % 1000 == 0:
+            fecha += timedelta(days=1)
+        r = rng.random()
+        if r < 0.5 or not activos:
+            codigo = rng.choice(populares if rng.random() < sesgo else codigos)
+            usuario = f"U{rng.randint(1, n_usuarios):06d}"
+            activos.append((codigo, usuario))
+            carga.append(("prestamo", {"libro_codigo": codigo, "usuario_id": usuario,
+                                       "fecha_actual": fecha.isoformat()}))
+        elif r < 0.8:
+            j = rng.randrange(len(activos))
+            activos[j], activos[-1] = activos[-1], activos[j]
+            codigo, usuario = activos.pop()
+            carga.append(("devolucion", {"libro_codigo": codigo, "usuario_id": usuario,
+                                         "fecha_actual": fecha.isoformat()}))
+        else:
+            codigo, usuario = rng.choice(activos)
+            carga.append(("renovacion", {"libro_codigo": codigo, "usuario_id": usuario,
+                                         "fecha_actual": fecha.isoformat()}))
+    return carga
+
+
+def leer_log(path: Path):
+    """Operaciones de un archivo de solicitudes del PS (OPERACION;LIBRO;USUARIO;FECHA)"""
+    carga = []
+    with open(path, "r", encoding="utf-8") as f:
+        for linea in f:
+            op = parse_line(linea)
+            if op is not None:
+                carga.append(op)
+    return carga
+
+
+# EJECUCIÓN
+def simular(nombre: str, db: dict, carga: list, verificar: bool):
+    with tempfile.TemporaryDirectory() as tmp:
+        aplicar, obtener_db = BACKENDS[nombre](db, Path(tmp))
+        invariantes = Invariantes(obtener_db())
+        firmas = []
+        ok = errores = 0
+
+        t0 = time.perf_counter()
+        for n_op, (operacion, payload) in enumerate(carga):
+            try:
+                resp = aplicar(operacion, payload)
+            except Exception as e:
+                errores += 1
+                firmas.append(("ERROR", type(e).__name__))
+                continue
+            ok += bool(resp.get("ok"))
+            firmas.append((resp.get("ok"), resp.get("mensaje")))
+            if verificar:
+                libro = ga.find_libro(obtener_db(), payload.get("libro_codigo"))
+                if libro is not None:
+                    invariantes.verificar(libro, n_op)
+        duracion = time.perf_counter() - t0
+
+        invariantes.verificar_todo(obtener_db())
+        print(f"  {nombre:<8} {len(carga):>10} ops {duracion:9.3f} s {len(carga) / duracion:>12,.0f} op/s"
+              f" | ok {ok} | rechazadas {len(carga) - ok - errores} | errores {errores}"
+              f" | violaciones {len(invariantes.violaciones)} | versión {obtener_db().get('version', 0)}")
+        for n_op, codigo, detalle in invariantes.violaciones[:5]:
+            print(f"      op {n_op}: {codigo} {detalle}")
+        if invariantes.preexistentes:
+            print(f"      ({len(invariantes.preexistentes)} libros ya tenían disponibles > totales al inicio)")
+        return firmas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulación del motor de operaciones del GA")
+    parser.add_argument("--bd", type=str, default=None, help="BD JSON de partida (por defecto catálogo generado)")
+    parser.add_argument("--libros", type=int, default=10000)
+    parser.add_argument("--log", type=str, default=None, help="Archivo de solicitudes del PS a reproducir")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Veces que se reproduce el log")
+    parser.add_argument("--ops", type=int, default=100000, help="Operaciones de la carga generada")
+    parser.add_argument("--usuarios", type=int, default=5000)
+    parser.add_argument("--sesgo", type=float, default=0.2)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--backends", type=str, default=",".join(BACKENDS))
+    parser.add_argument("--sin-verificar", action="store_true", help="No validar invariantes en cada operación")
+    parser.add_argument("--comparar", action="store_true", help="Exigir respuestas idénticas entre backends")
+    args = parser.parse_args()
+
+    ga.GA_LOG_VERSIONES = False
+    db = ga.load_db(Path(args.bd)) if args.bd else generar_catalogo(args.libros)
+    if args.log:
+        carga = leer_log(Path(args.log)) * args.repeticiones
+        origen = f"log {args.log} x{args.repeticiones}"
+    else:
+        codigos = [l["codigo"] for l in db["libros"]]
+        carga = generar_carga(args.ops, codigos, args.usuarios, args.semilla, args.sesgo)
+        origen = f"carga generada (semilla {args.semilla})"
+    print(f"Catálogo: {len(db['libros'])} libros | {origen}: {len(carga)} ops")
+
+    resultados = {}
+    for nombre in args.backends.split(","):
+        resultados[nombre] = simular(nombre, copy.deepcopy(db), carga, not args.sin_verificar)
+
+    if args.comparar and len(resultados) > 1:
+        nombres = list(resultados)
+        referencia = resultados[nombres[0]]
+        for nombre in nombres[1:]:
+            diferencia = next((i for i, (a, b) in enumerate(zip(referencia, resultados[nombre])) if a != b), None)
+            if diferencia is None:
+                print(f"  {nombre}: mismas respuestas que {nombres[0]}")
+            else:
+                print(f"  {nombre}: DIFIERE de {nombres[0]} en la op {diferencia}: "
+                      f"{referencia[diferencia]} vs {resultados[nombre][diferencia]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#comun/administracion.py
+import argparse
+import json
+import os
+import threading
+import zmq
+from comun.config import SEDES, endpoints_bind, endpoint_conexion
+from comun.zeromq_utils import (
+    bind_endpoints,
+    create_req_socket,
+    encode_message,
+    decode_message,
+)
+from comun.perfilado import temporizadores
+
+# SOCKET DE ADMINISTRACIÓN
+# Cada componente (GA, GC, actores) atiende un REP propio ("<componente>_admin"
+# en la topología) para ajustarlo sin reiniciarlo, consultar su estado y darle
+# órdenes. Mensajes: {"comando": "estado"}, {"comando": "ajustar", "nombre":
+# "timeout_ga_ms", "valor": 1000}, {"comando": "snapshot"}, ...
+# Los valores ajustables viven en un objeto Ajustes que el componente consulta
+# en cada uso; lo que depende de un socket (timeouts, HWM) lo aplica el propio
+# hilo dueño del socket al ver que cambió la versión de los ajustes.
+
+
+class Ajustes:
+    """Valores ajustables en caliente. El tipo de cada uno lo fija su valor inicial."""
+    def __init__(self, **valores):
+        self.valores = dict(valores)
+        self.al_cambiar = {}
+        self.version = 0
+
+    def __getitem__(self, nombre: str):
+        return self.valores[nombre]
+
+    def definir(self, nombre: str, valor, al_cambiar=None):
+        """Agrega un ajuste; al_cambiar(valor) se llama cada vez que se modifica"""
+        self.valores[nombre] = valor
+        if al_cambiar is not None:
+            self.al_cambiar[nombre] = al_cambiar
+
+    def fijar(self, nombre: str, valor):
+        if nombre not in self.valores:
+            raise KeyError(f"Ajuste desconocido: {nombre}")
+        tipo = type(self.valores[nombre])
+        if tipo is bool and isinstance(valor, str):
+            valor = valor.lower() in ("1", "true", "si", "sí", "on")
+        valor = tipo(valor)
+        self.valores[nombre] = valor
+        self.version += 1
+        if nombre in self.al_cambiar:
+            self.al_cambiar[nombre](valor)
+        return valor
+
+
+class ServidorAdmin:
+    """
+    REP de administración en su propio hilo.
+    Comandos propios: ayuda, estado, ajustes, ajustar, tiempos, perfilar.
+    El componente agrega los suyos con comando(nombre, funcion(msg) -> dict).
+    """
+    def __init__(self, componente: str, sede: int, ajustes: Ajustes, estado_callback=None, muestreador=None):
+        self.componente = componente
+        self.sede = sede
+        self.ajustes = ajustes
+        self.estado_callback = estado_callback or (lambda: {})
+        self.muestreador = muestreador
+        self.comandos = {
+            "estado": lambda msg: dict(self.estado_callback(), componente=componente, sede=sede, pid=os.getpid()),
+            "ajustes": lambda msg: dict(self.ajustes.valores),
+            "ajustar": self._ajustar,
+            "tiempos": lambda msg: temporizadores.reporte(),
+            "perfilar": self._perfilar,
+        }
+
+    def comando(self, nombre: str, funcion):
+        self.comandos[nombre] = funcion
+        return self
+
+    def _ajustar(self, msg: dict) -> dict:
+        valor = self.ajustes.fijar(msg["nombre"], msg["valor"])
+        print(f"[Admin {self.componente} Sede {self.sede}] {msg['nombre']} = {valor}")
+        return {msg["nombre"]: valor}
+
+    def _perfilar(self, msg: dict) -> dict:
+        if self.muestreador is None:
+            raise ValueError("Perfilado no disponible en este componente")
+        salida = self.muestreador.perfilar(float(msg.get("segundos", 10)))
+        if salida is None:
+            raise ValueError("Ya hay un perfil en curso")
+        return {"archivo": str(salida)}
+
+    def atender(self, msg: dict) -> dict:
+        comando = msg.get("comando", "ayuda")
+        if comando == "ayuda":
+            return {"ok": True, "comandos": sorted(self.comandos) + ["ayuda"], "ajustes": sorted(self.ajustes.valores)}
+        funcion = self.comandos.get(comando)
+        if funcion is None:
+            return {"ok": False, "mensaje": f"Comando desconocido: {comando}"}
+        try:
+            return {"ok": True, "resultado": funcion(msg)}
+        except (KeyError, ValueError, TypeError) as e:
+            return {"ok": False, "mensaje": str(e.args[0]) if e.args else type(e).__name__}
+
+    def start(self):
+        endpoints = endpoints_bind(self.sede, f"{self.componente}_admin")
+        socket_rep = zmq.Context.instance().socket(zmq.REP)
+        bind_endpoints(socket_rep, endpoints)
+        print(f"[Admin {self.componente} Sede {self.sede}] Administración en {', '.join(endpoints)}")
+
+        def run():
+            while True:
+                try:
+                    msg = decode_message(socket_rep.recv())
+                except Exception as e:
+                    socket_rep.send(encode_message({"ok": False, "mensaje": f"Mensaje inválido: {e}"}))
+                    continue
+                socket_rep.send(encode_message(self.atender(msg)))
+
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+
+def enviar_comando(componente: str, sede: int, msg: dict, timeout_ms: int = 3000):
+    """Cliente: envía un comando al socket de administración de un componente"""
+    socket_req = create_req_socket(zmq.Context.instance(), endpoint_conexion(sede, f"{componente}_admin"), timeout_ms)
+    try:
+        socket_req.send(encode_message(msg))
+        return decode_message(socket_req.recv())
+    finally:
+        socket_req.close(linger=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Administración en caliente de un componente",
+        epilog="Ej.: estado | ajustes | ajustar timeout_ga_ms 1000 | perfilar 5 | snapshot | pausar | reanudar"
+               " | drenar | terminar (GA y GC; reinicio escalonado: python -m comun.despliegue)",
+    )
+    parser.add_argument("--componente", required=True,
+                        choices=["ga", "gc", "actor_prestamos", "actor_devolucion", "actor_renovacion"])
+    parser.add_argument("--sede", type=int, choices=SEDES, required=True)
+    parser.add_argument("comando")
+    parser.add_argument("argumentos", nargs="*")
+    args = parser.parse_args()
+
+    msg = {"comando": args.comando}
+    if args.comando == "ajustar":
+        msg["nombre"], msg["valor"] = args.argumentos
+    elif args.comando == "perfilar" and args.argumentos:
+        msg["segundos"] = args.argumentos[0]
+    print(json.dumps(enviar_comando(args.componente, args.sede, msg), ensure_ascii=False, indent=2))
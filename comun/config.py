@@ -1,6 +1,9 @@
 #comun/config.py
 
+import json
+import math
 import os
+import socket
 from pathlib import Path
 
 #RUTAS
@@ -11,92 +14,259 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 BD_DIR = BASE_DIR / "bd"
 BD_DIR.mkdir(exist_ok=True)
 
-#Archivos de la BD
-BD_PRIMARIA_SEDE1 = BD_DIR / "bd_primaria_sede1.json"
-BD_REPLICA_SEDE1 = BD_DIR / "bd_replica_sede1.json"
-BD_PRIMARIA_SEDE2 = BD_DIR / "bd_primaria_sede2.json"
-BD_REPLICA_SEDE2 = BD_DIR / "bd_replica_sede2.json"
+#Archivos de cada sede: ver get_bd_paths_for_sede()
+#(bd_primaria_sedeN.json, bd_replica_sedeN.json, snapshot .bin, disponibilidad .tbl, vencidos .jsonl, cambios .jsonl)
+#Escritura atómica (temporal + fsync + rename, ver gestor_almacenamiento/persistencia.py).
+#BD_FSYNC=0 omite los fsync (pruebas en disco efímero): el rename sigue siendo atómico
+#ante la caída del proceso, no ante un corte de luz
+BD_FSYNC = os.getenv("BD_FSYNC", "1") == "1"
 
 #PUB/SUB ZEROMQ
 TOPIC_DEVOLUCION = b"DEVOLUCION"
 TOPIC_RENOVACION = b"RENOVACION"
+TOPIC_VENCIDO = b"VENCIDO"
 
 #DIRECCIONES Y PUERTOS ZEROMQ
+#Cada sede N expone (puerto base + N):
+#  PS <-> GC (REQ/REP)                  5550+N   GC_SEDEN_ENDPOINT_REQREP
+#  GC -> Actores (PUB)                  6000+N   GC_SEDEN_ENDPOINT_PUB
+#  GC <-> Actor de préstamos            6100+N   ACTOR_PRESTAMOS_SEDEN_ENDPOINT
+#  Gestor de Almacenamiento GA          7000+N   GA_SEDEN_ENDPOINT
+#  Heartbeat GA (tolerancia a fallos)   8000+N   GA_SEDEN_HEARTBEAT_ENDPOINT
+#  Préstamos vencidos (PUB)             8300+N   GA_SEDEN_VENCIMIENTOS_ENDPOINT
+#  Replicación de libros GA -> GA (PUB) 8400+N   GA_SEDEN_REPLICACION_ENDPOINT
+#  Administración (REP) del GA          8500+N   GA_SEDEN_ADMIN_ENDPOINT
+#  Administración del GC                8600+N   GC_SEDEN_ADMIN_ENDPOINT
+#  Administración de los actores        8700/8800/8900+N (préstamos/devolución/renovación)
+#  Cambios de la BD del GA (CDC, PUB)    9000+N   GA_SEDEN_CDC_ENDPOINT
 
-#Gestores de Carga PS <-> GC
-GC_SEDE1_ENDPOINT_REQREP = os.getenv(
-    "GC_SEDE1_ENDPOINT_REQREP",
-    "tcp://127.0.0.1:5551"  # PS <-> GC Sede 1
-)
+#TOPOLOGÍA (N SEDES)
+#Por defecto 2 sedes en 127.0.0.1. TOPOLOGIA_SEDES=N agrega sedes con el mismo
+#esquema de puertos (puerto base + número de sede); cada endpoint se puede
+#sobreescribir con la variable de entorno de su rol (ej. GA_SEDE3_ENDPOINT).
+#TOPOLOGIA_ARCHIVO apunta a un JSON con la lista completa, por ejemplo:
+#{"sedes": [{"sede": 1, "host": "10.0.0.1", "ubicacion": [0, 0]},
+#           {"sede": 2, "host": "10.0.0.2", "ubicacion": [5, 0], "ga": "tcp://10.0.0.2:9000"}]}
+#"ubicacion" define qué sede es la más cercana (respaldo preferido).
+_ROLES_SEDE = {
+    "gc_reqrep": ("GC_SEDE{n}_ENDPOINT_REQREP", 5550),
+    "gc_pub": ("GC_SEDE{n}_ENDPOINT_PUB", 6000),
+    "actor_prestamos": ("ACTOR_PRESTAMOS_SEDE{n}_ENDPOINT", 6100),
+    "ga": ("GA_SEDE{n}_ENDPOINT", 7000),
+    "ga_heartbeat": ("GA_SEDE{n}_HEARTBEAT_ENDPOINT", 8000),
+    "ga_vencimientos": ("GA_SEDE{n}_VENCIMIENTOS_ENDPOINT", 8300),
+    "ga_replicacion": ("GA_SEDE{n}_REPLICACION_ENDPOINT", 8400),
+    "ga_admin": ("GA_SEDE{n}_ADMIN_ENDPOINT", 8500),
+    "gc_admin": ("GC_SEDE{n}_ADMIN_ENDPOINT", 8600),
+    "actor_prestamos_admin": ("ACTOR_PRESTAMOS_SEDE{n}_ADMIN_ENDPOINT", 8700),
+    "actor_devolucion_admin": ("ACTOR_DEVOLUCION_SEDE{n}_ADMIN_ENDPOINT", 8800),
+    "actor_renovacion_admin": ("ACTOR_RENOVACION_SEDE{n}_ADMIN_ENDPOINT", 8900),
+    "ga_cdc": ("GA_SEDE{n}_CDC_ENDPOINT", 9000),
+}
 
-GC_SEDE2_ENDPOINT_REQREP = os.getenv(
-    "GC_SEDE2_ENDPOINT_REQREP",
-    "tcp://127.0.0.1:5552"  # PS <-> GC Sede 2
-)
 
-#Publicación de eventos GC -> Actores
-GC_SEDE1_ENDPOINT_PUB = os.getenv(
-    "GC_SEDE1_ENDPOINT_PUB",
-    "tcp://127.0.0.1:6001"  #DEVOLUCION/RENOVACION Sede 1
-)
+def _sede_por_defecto(n: int, host: str = "127.0.0.1") -> dict:
+    sede = {"sede": n, "host": host, "ubicacion": [n, 0]}
+    for rol, (variable, puerto_base) in _ROLES_SEDE.items():
+        sede[rol] = os.getenv(variable.format(n=n), f"tcp://{host}:{puerto_base + n}")
+    return sede
 
-GC_SEDE2_ENDPOINT_PUB = os.getenv(
-    "GC_SEDE2_ENDPOINT_PUB",
-    "tcp://127.0.0.1:6002"  #DEVOLUCION/RENOVACION Sede 2
-)
 
-#Comunicación síncrona GC <-> Actor de préstamos
-ACTOR_PRESTAMOS_SEDE1_ENDPOINT = os.getenv(
-    "ACTOR_PRESTAMOS_SEDE1_ENDPOINT",
-    "tcp://127.0.0.1:6101"
-)
+def cargar_topologia() -> dict:
+    """Devuelve {numero_sede: {rol: endpoint, 'ubicacion': [x, y]}}"""
+    archivo = os.getenv("TOPOLOGIA_ARCHIVO")
+    if archivo:
+        with open(archivo, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        topologia = {}
+        for entrada in data["sedes"]:
+            n = int(entrada["sede"])
+            sede = _sede_por_defecto(n, entrada.get("host", "127.0.0.1"))
+            sede.update(entrada)
+            sede["sede"] = n
+            topologia[n] = sede
+        return topologia
+    n_sedes = int(os.getenv("TOPOLOGIA_SEDES", "2"))
+    return {n: _sede_por_defecto(n) for n in range(1, n_sedes + 1)}
 
-ACTOR_PRESTAMOS_SEDE2_ENDPOINT = os.getenv(
-    "ACTOR_PRESTAMOS_SEDE2_ENDPOINT",
-    "tcp://127.0.0.1:6102"
-)
 
-#Gestor de Almacenamiento GA
-GA_SEDE1_ENDPOINT = os.getenv(
-    "GA_SEDE1_ENDPOINT",
-    "tcp://127.0.0.1:7001"
-)
+TOPOLOGIA = cargar_topologia()
+SEDES = sorted(TOPOLOGIA)
 
-GA_SEDE2_ENDPOINT = os.getenv(
-    "GA_SEDE2_ENDPOINT",
-    "tcp://127.0.0.1:7002"
-)
+#TRANSPORTE ENTRE COMPONENTES DEL MISMO HOST
+#TRANSPORTE=tcp (por defecto): todo por TCP, como siempre.
+#TRANSPORTE=auto: cada componente escucha además en ipc:// y quien corre en el
+#mismo host se conecta por ipc (sin pila TCP); entre hosts se sigue usando TCP.
+#Todos los componentes de un host deben usar el mismo valor.
+#Con una sede en un solo proceso (sede_proceso_unico.py) se usa inproc://.
+TRANSPORTE = os.getenv("TRANSPORTE", "tcp")
+IPC_DIR = Path(os.getenv("IPC_DIR", "/tmp/proyecto-distri-ipc"))
+#Nombre o IP de este host en la topología (además de 127.0.0.1/localhost)
+HOST_LOCAL = os.getenv("HOST_LOCAL", socket.gethostname())
 
 
-#HEARTBEAT TOLERANCIA A FALLOS
-#Puertos heartbeat GA para detectar caídas
-GA_SEDE1_HEARTBEAT_ENDPOINT = os.getenv(
-    "GA_SEDE1_HEARTBEAT_ENDPOINT",
-    "tcp://127.0.0.1:8001"
-)
+#HIGH-WATER MARKS (mensajes en cola por conexión antes de bloquear/descartar)
+#Eventos GC -> actores: el GC no descarta (XPUB sin pérdidas), al llenarse la
+#cola retiene los eventos y, pasado GC_MAX_COLA_EVENTOS, responde OCUPADO al PS
+ZMQ_HWM_EVENTOS = int(os.getenv("ZMQ_HWM_EVENTOS", "1000"))
+#Replicación GA -> GA: un salto se repara pidiendo a la sede los mensajes que
+#guarda en memoria (los últimos REPLICACION_MEMORIA) o, si ya no los tiene,
+#fusionando su archivo
+ZMQ_HWM_REPLICACION = int(os.getenv("ZMQ_HWM_REPLICACION", "10000"))
+REPLICACION_MEMORIA = int(os.getenv("REPLICACION_MEMORIA", "1000"))
 
-GA_SEDE2_HEARTBEAT_ENDPOINT = os.getenv(
-    "GA_SEDE2_HEARTBEAT_ENDPOINT",
-    "tcp://127.0.0.1:8002"
-)
+#TIMEOUT POR DEFECTO DE LOS SOCKETS REQ (ajustable en caliente por componente, ver comun/administracion.py)
+REQ_TIMEOUT_MS = int(os.getenv("REQ_TIMEOUT_MS", "3000"))
 
+#HEARTBEAT TOLERANCIA A FALLOS
 HEARTBEAT_INTERVAL_SECONDS = 2.0    #stoy vivo
 HEARTBEAT_TIMEOUT_SECONDS = 5.0
 
+#MEMBRESÍA DEL CLÚSTER (agregador de heartbeats de GA, GC y actores)
+MEMBRESIA_HABILITADA = os.getenv("MEMBRESIA_HABILITADA", "0") == "1"
+MEMBRESIA_ENDPOINT_PULL = os.getenv(
+    "MEMBRESIA_ENDPOINT_PULL",
+    "tcp://127.0.0.1:8101"  #componentes -> agregador
+)
+MEMBRESIA_ENDPOINT_PUB = os.getenv(
+    "MEMBRESIA_ENDPOINT_PUB",
+    "tcp://127.0.0.1:8102"  #agregador -> componentes (vista del clúster)
+)
+TOPIC_MEMBRESIA = b"MEMBRESIA"
+VERSION_SISTEMA = "1.0"
+
+
+#CONTROL DE ADMISIÓN EN EL GC
+GC_MAX_COLA_PRESTAMOS = int(os.getenv("GC_MAX_COLA_PRESTAMOS", "50"))
+GC_MAX_COLA_EVENTOS = int(os.getenv("GC_MAX_COLA_EVENTOS", "1000"))
+GC_PLAZO_RESPUESTA_MS = int(os.getenv("GC_PLAZO_RESPUESTA_MS", "2500"))  #debajo del timeout de 3 s del PS
+GC_TASA_POR_PS = float(os.getenv("GC_TASA_POR_PS", "20"))      #solicitudes/segundo por PS
+GC_RAFAGA_POR_PS = float(os.getenv("GC_RAFAGA_POR_PS", "40"))
+GC_LOTE_EVENTOS = int(os.getenv("GC_LOTE_EVENTOS", "50"))      #eventos publicados por vuelta sin préstamos en cola
+GC_MAX_CONSULTAS = int(os.getenv("GC_MAX_CONSULTAS", "100"))    #consultas encoladas hacia el GA (más: OCUPADO)
+#Consultas de solo lectura: el GC las reenvía al GA sin pasar por los actores
+#("disponibilidad" la responde el propio GC leyendo la tabla mapeada si está en la misma máquina)
+OPERACIONES_CONSULTA = ("buscar", "prestamos_usuario", "disponibilidad")
+
+#COALESCENCIA DE SOLICITUDES EN EL GC
+GC_TTL_RECIENTES_S = float(os.getenv("GC_TTL_RECIENTES_S", "5"))    #vida de un resultado reciente para reintentos
+GC_MAX_RECIENTES = int(os.getenv("GC_MAX_RECIENTES", "10000"))
+
+#CARGA MASIVA DESDE EL PS
+PS_TIMEOUT_LOTE_MS = int(os.getenv("PS_TIMEOUT_LOTE_MS", "10000"))   #un lote tarda más que una solicitud
+
+#MODO ASYNCIO (zmq.asyncio)
+ASYNC_MAX_EN_CURSO = int(os.getenv("ASYNC_MAX_EN_CURSO", "256"))   #solicitudes simultáneas por proceso
+
+
+
+#TRAZAS DEL GA: una línea por cambio de versión (se apaga en simulaciones y cargas masivas)
+GA_LOG_VERSIONES = os.getenv("GA_LOG_VERSIONES", "1") == "1"
+
+#BARRIDO DE PRÉSTAMOS VENCIDOS EN EL GA
+GA_INTERVALO_VENCIMIENTOS_S = float(os.getenv("GA_INTERVALO_VENCIMIENTOS_S", "60"))
+
+#CUPOS POR SEDE: cada cuánto se piden a las demás sedes los cupos que faltaron
+GA_INTERVALO_REBALANCEO_S = float(os.getenv("GA_INTERVALO_REBALANCEO_S", "2"))
+
+#CATÁLOGO INICIAL: CSV/JSON-lines que se importa al crear la BD de una sede (si no, 1000 libros generados)
+CATALOGO_INICIAL = os.getenv("CATALOGO_INICIAL")
+
+#IDEMPOTENCIA: respuestas recordadas por id de solicitud en el GA (se persisten con la BD)
+GA_MAX_SOLICITUDES = int(os.getenv("GA_MAX_SOLICITUDES", "10000"))
+
+#LÍMITE DE PRÉSTAMOS ACTIVOS POR USUARIO (0 = sin límite, por defecto: se activa con la variable o en caliente)
+GA_MAX_PRESTAMOS_USUARIO = int(os.getenv("GA_MAX_PRESTAMOS_USUARIO", "0"))
+
+#FLUJO DE CAMBIOS (CDC) DEL GA: registros recientes en memoria y registros por archivo antes de rotarlo
+CDC_MEMORIA = int(os.getenv("CDC_MEMORIA", "10000"))
+CDC_MAX_REGISTROS = int(os.getenv("CDC_MAX_REGISTROS", "1000000"))
+
+#PERFILADO BAJO DEMANDA (kill -USR1 <pid>): archivos .folded para flamegraph/speedscope
+PERFIL_DIR = Path(os.getenv("PERFIL_DIR", str(BASE_DIR / "perfiles")))
+PERFIL_DURACION_S = float(os.getenv("PERFIL_DURACION_S", "10"))
+PERFIL_INTERVALO_MS = float(os.getenv("PERFIL_INTERVALO_MS", "10"))
+
 
 
 #UTILIDADES
+def get_sede(sede: int) -> dict:
+    """Endpoints de una sede según la topología"""
+    if sede not in TOPOLOGIA:
+        raise ValueError(f"La sede debe ser una de {SEDES}")
+    return TOPOLOGIA[sede]
+
+
+def distancia_sedes(a: int, b: int) -> float:
+    return math.dist(get_sede(a)["ubicacion"], get_sede(b)["ubicacion"])
+
+
+def get_peers(sede: int):
+    """Las demás sedes, de la más cercana a la más lejana"""
+    return sorted((s for s in SEDES if s != sede), key=lambda s: (distancia_sedes(sede, s), s))
+
+
+#(sede, rol) atendidos por este mismo proceso: se conectan por inproc://
+_EN_PROCESO = set()
+
+
+def marcar_en_proceso(sede: int, roles):
+    """Modo proceso único: estos roles de la sede se atienden en este proceso (mismo contexto ZMQ)"""
+    for rol in roles:
+        _EN_PROCESO.add((sede, rol))
+
+
+def _host_endpoint(endpoint: str):
+    """Host de un endpoint tcp://host:puerto (None si no es TCP)"""
+    if not endpoint.startswith("tcp://"):
+        return None
+    return endpoint[len("tcp://"):].rsplit(":", 1)[0]
+
+
+def _es_local(endpoint: str) -> bool:
+    return _host_endpoint(endpoint) in ("127.0.0.1", "localhost", HOST_LOCAL)
+
+
+def _ipc(sede: int, rol: str) -> str:
+    return f"ipc://{IPC_DIR}/sede{sede}-{rol}"
+
+
+def endpoints_bind(sede: int, rol: str) -> list:
+    """Endpoints donde escucha el rol: siempre el de la topología (para otros hosts) y además ipc/inproc"""
+    endpoint = get_sede(sede)[rol]
+    endpoints = [endpoint]
+    if TRANSPORTE == "auto" and _host_endpoint(endpoint) is not None:
+        IPC_DIR.mkdir(parents=True, exist_ok=True)
+        endpoints.append(_ipc(sede, rol))
+    if (sede, rol) in _EN_PROCESO:
+        endpoints.append(f"inproc://sede{sede}-{rol}")
+    return endpoints
+
+
+def endpoint_conexion(sede: int, rol: str) -> str:
+    """Endpoint para conectarse a un rol: inproc si está en este proceso, ipc si está en este host, si no TCP"""
+    if (sede, rol) in _EN_PROCESO:
+        return f"inproc://sede{sede}-{rol}"
+    endpoint = get_sede(sede)[rol]
+    if TRANSPORTE == "auto" and _es_local(endpoint):
+        return _ipc(sede, rol)
+    return endpoint
+
+
+def rol_en_este_host(sede: int, rol: str) -> bool:
+    """True si el rol de la sede corre en este host (sus archivos locales son los del rol)"""
+    return (sede, rol) in _EN_PROCESO or _es_local(get_sede(sede)[rol])
+
+
 def get_bd_paths_for_sede(sede: int):
-    """Devuelve rutas de BD primaria y réplica para una sede dada (1 o 2)."""
-    if sede == 1:
-        return {
-            "primaria": BD_PRIMARIA_SEDE1,
-            "replica": BD_REPLICA_SEDE1,
-        }
-    elif sede == 2:
-        return {
-            "primaria": BD_PRIMARIA_SEDE2,
-            "replica": BD_REPLICA_SEDE2,
-        }
-    else:
-        raise ValueError("La sede debe ser 1 o 2")
+    """Devuelve rutas de BD (primaria, réplica, snapshot binario, disponibilidad, vencidos, cambios, relevo) para una sede dada."""
+    get_sede(sede)
+    return {
+        "primaria": BD_DIR / f"bd_primaria_sede{sede}.json",
+        "replica": BD_DIR / f"bd_replica_sede{sede}.json",
+        "snapshot": BD_DIR / f"bd_snapshot_sede{sede}.bin",
+        "disponibilidad": BD_DIR / f"disponibilidad_sede{sede}.tbl",
+        "vencimientos": BD_DIR / f"vencidos_sede{sede}.jsonl",
+        "cambios": BD_DIR / f"cambios_sede{sede}.jsonl",
+        "relevo": BD_DIR / f"relevo_sede{sede}.json",
+    }
@@ -0,0 +1,101 @@
+#comun/despliegue.py
+import argparse
+import os
+import subprocess
+import sys
+import time
+from comun.config import SEDES, BASE_DIR
+from comun.administracion import enviar_comando
+
+# REINICIO ESCALONADO (SIN CORTE) DE GA Y GC
+# Por cada sede, de a una: drenar -> esperar "drenado" -> terminar -> arrancar
+# el proceso nuevo -> esperar a que atienda. Mientras tanto:
+# - GA: su heartbeat dice "DRENANDO" y el GC/actor mandan los préstamos al GA
+#   de respaldo; devoluciones y renovaciones esperan y reintentan con su id.
+#   El GA nuevo carga el snapshot binario al día y retoma el relevo (sesión y
+#   secuencia de replicación): ninguna sede fusiona archivos completos.
+# - GC: los PS reciben OCUPADO y reintentan tras el tiempo indicado.
+# Uso: python -m comun.despliegue --componente ga --sedes 1 2 3
+
+MODULOS = {"ga": "gestor_almacenamiento.ga", "gc": "gestor_carga.gc"}
+LOGS_DIR = BASE_DIR / "logs_despliegue"
+
+
+def estado(componente: str, sede: int, timeout_ms: int = 1000):
+    """Estado del componente, o None si no responde"""
+    try:
+        resp = enviar_comando(componente, sede, {"comando": "estado"}, timeout_ms)
+    except Exception:
+        return None
+    return resp.get("resultado") if resp.get("ok") else None
+
+
+def esperar(condicion, plazo_s: float, intervalo_s: float = 0.1) -> bool:
+    fin = time.time() + plazo_s
+    while time.time() < fin:
+        if condicion():
+            return True
+        time.sleep(intervalo_s)
+    return False
+
+
+def proceso_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        # Terminado pero sin recoger por su padre (zombie): ya no tiene los puertos
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return True
+
+
+def reiniciar(componente: str, sede: int, plazo_s: float) -> bool:
+    """Reinicio sin corte de un GA o GC local. Devuelve True si el nuevo quedó atendiendo"""
+    prefijo = f"[Despliegue {componente.upper()} Sede {sede}]"
+    actual = estado(componente, sede)
+    if actual is None:
+        print(f"{prefijo} No responde: se arranca sin drenar")
+    else:
+        t0 = time.time()
+        enviar_comando(componente, sede, {"comando": "drenar"})
+        if not esperar(lambda: (estado(componente, sede) or {}).get("drenado"), plazo_s):
+            print(f"{prefijo} No terminó de drenar en {plazo_s} s: se reanuda y se cancela el reinicio")
+            enviar_comando(componente, sede, {"comando": "reanudar"})
+            return False
+        print(f"{prefijo} Drenado en {(time.time() - t0) * 1000:.0f} ms")
+        enviar_comando(componente, sede, {"comando": "terminar"})
+        # Los puertos se liberan cuando el proceso termina
+        if not esperar(lambda: not proceso_vivo(actual["pid"]), plazo_s):
+            print(f"{prefijo} El proceso {actual['pid']} no terminó")
+            return False
+
+    t0 = time.time()
+    LOGS_DIR.mkdir(exist_ok=True)
+    log = open(LOGS_DIR / f"{componente}_sede{sede}.log", "a")
+    proceso = subprocess.Popen([sys.executable, "-m", MODULOS[componente], "--sede", str(sede)],
+                               cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    if not esperar(lambda: (estado(componente, sede) or {}).get("pid") == proceso.pid, plazo_s, 0.2):
+        print(f"{prefijo} El proceso nuevo ({proceso.pid}) no responde; ver {log.name}")
+        return False
+    print(f"{prefijo} Proceso nuevo {proceso.pid} atendiendo en {(time.time() - t0) * 1000:.0f} ms")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reinicio escalonado sin corte de GA o GC")
+    parser.add_argument("--componente", choices=sorted(MODULOS), required=True)
+    parser.add_argument("--sedes", type=int, nargs="+", choices=SEDES, required=True)
+    parser.add_argument("--plazo", type=float, default=30, help="Segundos máximos para drenar y para arrancar")
+    parser.add_argument("--pausa", type=float, default=2, help="Segundos entre una sede y la siguiente")
+    args = parser.parse_args()
+
+    for i, sede in enumerate(args.sedes):
+        if i:
+            time.sleep(args.pausa)  # el GA nuevo vuelve a emitir heartbeat "OK" antes de drenar otro
+        if not reiniciar(args.componente, sede, args.plazo):
+            sys.exit(1)
@@ -0,0 +1,109 @@
+#comun/membresia.py
+import json
+import threading
+import time
+import zmq
+from comun.config import (
+    MEMBRESIA_ENDPOINT_PULL,
+    MEMBRESIA_ENDPOINT_PUB,
+    TOPIC_MEMBRESIA,
+    HEARTBEAT_INTERVAL_SECONDS,
+    VERSION_SISTEMA,
+)
+from comun.zeromq_utils import start_heartbeat_sender
+
+
+def iniciar_reporte_membresia(componente: str, sede: int, data_callback, interval: float = HEARTBEAT_INTERVAL_SECONDS):
+    """
+    Inicia un hilo que reporta al agregador de membresía.
+    data_callback: función que devuelve un dict con el estado del componente,
+    por ejemplo {'estado': 'OK', 'carga': 12.5, 'cola': 3, 'version': 40}.
+    """
+    ctx = zmq.Context()
+    beat = start_heartbeat_sender(ctx, MEMBRESIA_ENDPOINT_PULL, interval)
+    miembro_id = f"{componente}-{sede}"
+
+    def run():
+        while True:
+            msg = {
+                "id": miembro_id,
+                "componente": componente,
+                "sede": sede,
+                "version_sw": VERSION_SISTEMA,
+                "timestamp": time.time(),
+            }
+            try:
+                msg.update(data_callback())
+            except Exception as e:
+                msg["estado"] = f"ERROR: {e}"
+            beat(msg)
+            time.sleep(interval)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+class MedidorCarga:
+    """Cuenta operaciones y devuelve la tasa (op/s) desde la última consulta"""
+    def __init__(self):
+        self.total = 0
+        self._ultimo_total = 0
+        self._ultimo_t = time.time()
+
+    def registrar(self, n: int = 1):
+        self.total += n
+
+    def tasa(self) -> float:
+        ahora = time.time()
+        dt = max(ahora - self._ultimo_t, 1e-6)
+        tasa = (self.total - self._ultimo_total) / dt
+        self._ultimo_total, self._ultimo_t = self.total, ahora
+        return round(tasa, 2)
+
+
+class VistaMembresia:
+    """
+    Suscriptor de la vista del clúster que publica el agregador.
+    Reemplaza las suscripciones punto a punto: un solo SUB da vida, carga y
+    cola de todos los componentes.
+    """
+    def __init__(self, endpoint: str = MEMBRESIA_ENDPOINT_PUB):
+        self.endpoint = endpoint
+        self.miembros = {}
+        self.ultima_vista = 0
+
+    def start(self):
+        ctx = zmq.Context()
+        socket_sub = ctx.socket(zmq.SUB)
+        socket_sub.connect(self.endpoint)
+        socket_sub.setsockopt(zmq.SUBSCRIBE, TOPIC_MEMBRESIA)
+
+        def escuchar():
+            while True:
+                try:
+                    _, raw = socket_sub.recv_multipart()
+                    vista = json.loads(raw.decode("utf-8"))
+                    self.miembros = {m["id"]: m for m in vista.get("miembros", [])}
+                    self.ultima_vista = time.time()
+                except Exception as e:
+                    print(f"[Membresia] ERROR leyendo vista: {e}")
+
+        threading.Thread(target=escuchar, daemon=True).start()
+        return self
+
+    def conocido(self, miembro_id: str) -> bool:
+        return miembro_id in self.miembros
+
+    def esta_vivo(self, miembro_id: str) -> bool:
+        m = self.miembros.get(miembro_id)
+        return bool(m and m.get("vivo") and m.get("estado", "OK") == "OK")
+
+    def menos_cargado(self, componente: str, sedes=None):
+        """Miembro vivo y aceptando trabajo con menor cola (y luego menor carga), o None"""
+        candidatos = [
+            m for m in self.miembros.values()
+            if m.get("componente") == componente and m.get("vivo") and m.get("estado", "OK") == "OK"
+            and (sedes is None or m.get("sede") in sedes)
+        ]
+        if not candidatos:
+            return None
+        return min(candidatos, key=lambda m: (m.get("cola", 0), m.get("carga", 0)))
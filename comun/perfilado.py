@@ -0,0 +1,157 @@
+#comun/perfilado.py
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from comun.config import PERFIL_DIR, PERFIL_DURACION_S, PERFIL_INTERVALO_MS
+
+# PERFILADO BAJO DEMANDA
+# Un componente en marcha se perfila sin reiniciarlo: con "kill -USR1 <pid>"
+# (o el comando "perfilar" del socket de administración) se muestrean las
+# pilas de todos sus hilos durante PERFIL_DURACION_S segundos y se escribe un archivo
+# "collapsed" (una línea "hilo;marco;marco;... cuenta" por pila) que leen
+# flamegraph.pl o speedscope. En Linux solo se cuentan los hilos que usaron
+# CPU desde la muestra anterior: un hilo bloqueado en recv() no aparece.
+
+
+class Temporizadores:
+    """Tiempo acumulado por operación: llamadas, total y máximo"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.datos = {}  # nombre -> [n, total_s, max_s]
+
+    def registrar(self, nombre: str, segundos: float):
+        with self.lock:
+            d = self.datos.setdefault(nombre, [0, 0.0, 0.0])
+            d[0] += 1
+            d[1] += segundos
+            d[2] = max(d[2], segundos)
+
+    def medir(self, nombre: str):
+        """Decorador: registra la duración de cada llamada a la función"""
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envuelta(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return funcion(*args, **kwargs)
+                finally:
+                    self.registrar(nombre, time.perf_counter() - t0)
+            return envuelta
+        return decorador
+
+    def reporte(self) -> dict:
+        with self.lock:
+            return {
+                nombre: {
+                    "n": n,
+                    "total_ms": round(total * 1000, 3),
+                    "medio_us": round(total / n * 1e6, 1),
+                    "max_ms": round(maximo * 1000, 3),
+                }
+                for nombre, (n, total, maximo) in sorted(self.datos.items())
+            }
+
+    def reiniciar(self):
+        with self.lock:
+            self.datos.clear()
+
+
+# Uno por proceso: lo usan los op_* del GA, save_db, load_db, ...
+temporizadores = Temporizadores()
+
+
+def _cpu_hilo_ns(native_id: int):
+    """Tiempo de CPU de un hilo (Linux); None si no se puede leer"""
+    try:
+        with open(f"/proc/self/task/{native_id}/schedstat", "r") as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _pila(frame) -> str:
+    marcos = []
+    while frame is not None:
+        codigo = frame.f_code
+        marcos.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(marcos))
+
+
+class Muestreador:
+    """Perfilador por muestreo con sys._current_frames(): sin dependencias y sin tocar el código perfilado"""
+    def __init__(self, nombre: str, intervalo_s: float = PERFIL_INTERVALO_MS / 1000):
+        self.nombre = nombre
+        self.intervalo_s = intervalo_s
+        self.activo = False
+        self.lock = threading.Lock()
+
+    def perfilar(self, segundos: float = PERFIL_DURACION_S, salida: Path = None):
+        """Inicia un muestreo de 'segundos' en segundo plano; devuelve la ruta de salida o None si ya hay uno"""
+        with self.lock:
+            if self.activo:
+                return None
+            self.activo = True
+        if salida is None:
+            salida = PERFIL_DIR / f"{self.nombre}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        threading.Thread(target=self._run, args=(segundos, Path(salida)), daemon=True).start()
+        return salida
+
+    def _run(self, segundos: float, salida: Path):
+        propio = threading.get_ident()
+        pilas = Counter()
+        cpu_anterior = {}
+        muestras = 0
+        fin = time.time() + segundos
+        try:
+            while time.time() < fin:
+                hilos = {h.ident: h for h in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == propio:
+                        continue
+                    hilo = hilos.get(ident)
+                    native_id = getattr(hilo, "native_id", None)
+                    cpu = _cpu_hilo_ns(native_id) if native_id else None
+                    if cpu is not None:
+                        anterior = cpu_anterior.get(ident)
+                        cpu_anterior[ident] = cpu
+                        if anterior is None or cpu == anterior:
+                            continue  # sin CPU desde la muestra anterior: bloqueado/esperando
+                    nombre_hilo = hilo.name if hilo else str(ident)
+                    pilas[f"{nombre_hilo};{_pila(frame)}"] += 1
+                muestras += 1
+                time.sleep(self.intervalo_s)
+
+            salida.parent.mkdir(parents=True, exist_ok=True)
+            with open(salida, "w", encoding="utf-8") as f:
+                for pila, n in pilas.most_common():
+                    f.write(f"{pila} {n}\n")
+            tiempos = salida.with_suffix(".tiempos.json")
+            with open(tiempos, "w", encoding="utf-8") as f:
+                json.dump(temporizadores.reporte(), f, ensure_ascii=False, indent=2)
+            print(f"[Perfil {self.nombre}] {muestras} muestras, {sum(pilas.values())} pilas -> {salida} ({tiempos.name})")
+        except Exception as e:
+            print(f"[Perfil {self.nombre}] Error al perfilar: {e}")
+        finally:
+            with self.lock:
+                self.activo = False
+
+
+def instalar_senal_perfil(nombre: str):
+    """
+    SIGUSR1 inicia un perfil de PERFIL_DURACION_S segundos. Las señales solo se
+    pueden instalar desde el hilo principal: si el componente corre en un hilo
+    (sede_proceso_unico.py) la instala el proceso y perfila a todos.
+    Devuelve el Muestreador.
+    """
+    muestreador = Muestreador(nombre)
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda signum, frame: muestreador.perfilar())
+        print(f"[Perfil {nombre}] 'kill -USR1 {os.getpid()}' perfila {PERFIL_DURACION_S:g} s")
+    return muestreador
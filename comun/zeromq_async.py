@@ -0,0 +1,100 @@
+#comun/zeromq_async.py
+import asyncio
+import itertools
+import json
+import time
+import zmq
+import zmq.asyncio
+from comun.config import HEARTBEAT_TIMEOUT_SECONDS, REQ_TIMEOUT_MS
+from comun.zeromq_utils import encode_message, decode_message
+
+# Versión asyncio (zmq.asyncio) de las utilidades de comun/zeromq_utils.py.
+# Un solo proceso mantiene muchas solicitudes en curso sobre un mismo socket:
+# en vez de REQ (una solicitud a la vez, y hay que destruirlo tras un timeout)
+# se usa DEALER y cada solicitud lleva un id en el sobre. Los REP/ROUTER del
+# otro lado devuelven el sobre tal cual, así la respuesta se asocia a su id.
+
+
+def create_async_context():
+    """Contexto ZeroMQ para asyncio (uno por proceso)"""
+    return zmq.asyncio.Context()
+
+
+class ClienteAsync:
+    """Cliente DEALER con correlación por id: muchas solicitudes en curso y timeouts por cancelación"""
+    def __init__(self, context, endpoint: str):
+        self.endpoint = endpoint
+        self.socket = context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(endpoint)
+        self.pendientes = {}
+        self.ids = itertools.count()
+        self.lector = asyncio.ensure_future(self._leer())
+
+    async def _leer(self):
+        while True:
+            frames = await self.socket.recv_multipart()
+            futuro = self.pendientes.pop(frames[0], None)
+            # Si ya expiró (futuro cancelado) la respuesta tardía se descarta
+            if futuro is not None and not futuro.done():
+                futuro.set_result(decode_message(frames[-1]))
+
+    async def solicitar(self, data: dict, timeout_ms: int = REQ_TIMEOUT_MS):
+        """Envía y espera la respuesta; None si vence el timeout (el socket sigue sano)"""
+        req_id = str(next(self.ids)).encode()
+        futuro = asyncio.get_running_loop().create_future()
+        self.pendientes[req_id] = futuro
+        try:
+            await self.socket.send_multipart([req_id, b"", encode_message(data)])
+            return await asyncio.wait_for(futuro, timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.pendientes.pop(req_id, None)
+
+    @property
+    def en_curso(self) -> int:
+        return len(self.pendientes)
+
+    def close(self):
+        self.lector.cancel()
+        self.socket.close()
+
+
+class MonitorHeartbeatAsync:
+    """Escucha el heartbeat de un GA como una tarea más del event loop"""
+    def __init__(self, context, endpoint: str):
+        self.endpoint = endpoint
+        self.ultimo_timestamp = 0
+        self.version = -1
+        self.estado = "OK"  # "DRENANDO" durante un reinicio sin corte: cuenta como caído
+        self.socket = context.socket(zmq.SUB)
+        self.socket.connect(endpoint)
+        self.socket.setsockopt(zmq.SUBSCRIBE, b"HEARTBEAT")
+        self.tarea = asyncio.ensure_future(self._escuchar())
+
+    async def _escuchar(self):
+        while True:
+            try:
+                _, raw = await self.socket.recv_multipart()
+                data = json.loads(raw.decode("utf-8"))
+                self.ultimo_timestamp = time.time()
+                self.version = data.get("version", -1)
+                self.estado = data.get("estado", "OK")
+            except Exception as e:
+                print(f"[HB async] ERROR en monitor {self.endpoint}: {e}")
+
+    @property
+    def vivo(self) -> bool:
+        return time.time() - self.ultimo_timestamp <= HEARTBEAT_TIMEOUT_SECONDS and self.estado == "OK"
+
+    @property
+    def caido(self) -> bool:
+        """Se le vio vivo alguna vez y dejó de emitir (al arrancar aún no se sabe)"""
+        return self.ultimo_timestamp > 0 and not self.vivo
+
+    async def esperar_vivo(self, maximo_s: float):
+        """Espera (sin bloquear el loop) a que el GA vuelva a emitir heartbeat"""
+        fin = time.time() + maximo_s
+        while not self.vivo and time.time() < fin:
+            await asyncio.sleep(0.1)
@@ -2,6 +2,7 @@
 import json
 import zmq
 import time
+from comun.config import REQ_TIMEOUT_MS
 
 #SERIALIZACIÓN Y DESERIALIZACION
 def encode_message(data: dict) -> bytes:
@@ -12,40 +13,119 @@ def decode_message(raw: bytes) -> dict:
     """Convierte bytes recibidos por ZeroMQ en Dict Python"""
     return json.loads(raw.decode("utf-8"))
 
+def split_envelope(frames: list):
+    """Separa un mensaje de ROUTER [sobre..., b"", cuerpo] en (sobre con el delimitador, cuerpo)"""
+    return frames[:-1], frames[-1]
+
+class GeneradorIds:
+    """
+    Ids de solicitud ("id_solicitud"): se generan una vez por operación y se
+    repiten en cada reintento, así el GA la aplica una sola vez.
+    El prefijo lleva el instante de arranque: un proceso reiniciado no reutiliza ids.
+    """
+    def __init__(self, prefijo: str):
+        self.prefijo = f"{prefijo}-{int(time.time() * 1000):x}"
+        self.contador = 0
+
+    def nuevo(self) -> str:
+        self.contador += 1
+        return f"{self.prefijo}-{self.contador}"
+
 #CREACION DE SOCKETS
 def create_context():
-    """Crea un contexto global de ZeroMQ (se llama una vez por proceso)"""
-    return zmq.Context()
+    """Contexto global de ZeroMQ del proceso (compartido: inproc:// solo funciona dentro de un mismo contexto)"""
+    return zmq.Context.instance()
+
 
-def create_req_socket(context: zmq.Context, endpoint: str, timeout_ms=3000):
-    """Crea un socket REQ con timeout"""
+def bind_endpoints(socket, endpoints):
+    """Bind a un endpoint o a una lista (ej. tcp + ipc del mismo componente, ver config.endpoints_bind)"""
+    for endpoint in ([endpoints] if isinstance(endpoints, str) else endpoints):
+        socket.bind(endpoint)
+
+def create_req_socket(context: zmq.Context, endpoint: str, timeout_ms=None):
+    """Crea un socket REQ con timeout (REQ_TIMEOUT_MS si no se indica)"""
+    if timeout_ms is None:
+        timeout_ms = REQ_TIMEOUT_MS
     socket = context.socket(zmq.REQ)
     socket.setsockopt(zmq.RCVTIMEO, timeout_ms)
     socket.setsockopt(zmq.SNDTIMEO, timeout_ms)
     socket.connect(endpoint)
     return socket
 
-def create_rep_socket(context: zmq.Context, endpoint: str):
+def create_rep_socket(context: zmq.Context, endpoint):
     """Crea un socket REP para recibir solicitudes"""
     socket = context.socket(zmq.REP)
-    socket.bind(endpoint)
+    bind_endpoints(socket, endpoint)
     return socket
 
 
-def create_pub_socket(context: zmq.Context, endpoint: str):
-    """Crea un socket PUB, los actores se conectarán con SUB"""
+def create_router_socket(context: zmq.Context, endpoint):
+    """Crea un socket ROUTER (compatible con clientes REQ) para atender varias solicitudes a la vez"""
+    socket = context.socket(zmq.ROUTER)
+    bind_endpoints(socket, endpoint)
+    return socket
+
+
+def create_pub_socket(context: zmq.Context, endpoint, hwm: int = None):
+    """Crea un socket PUB, los actores se conectarán con SUB (hwm: mensajes por suscriptor antes de descartar)"""
     socket = context.socket(zmq.PUB)
-    socket.bind(endpoint)
+    if hwm is not None:
+        socket.setsockopt(zmq.SNDHWM, hwm)
+    bind_endpoints(socket, endpoint)
     return socket
 
 
-def create_sub_socket(context: zmq.Context, endpoint: str, topic: bytes):
+def create_xpub_socket(context: zmq.Context, endpoint, hwm: int):
+    """
+    PUB sin pérdidas: con la cola de un suscriptor llena, send(NOBLOCK) lanza
+    zmq.Again en vez de descartar, y el emisor decide (retener, frenar).
+    Entrega las (des)suscripciones como mensajes (1/0 + tópico) para saber quién escucha.
+    """
+    socket = context.socket(zmq.XPUB)
+    socket.setsockopt(zmq.SNDHWM, hwm)
+    socket.setsockopt(zmq.XPUB_NODROP, 1)
+    socket.setsockopt(zmq.XPUB_VERBOSER, 1)
+    bind_endpoints(socket, endpoint)
+    return socket
+
+
+def create_sub_socket(context: zmq.Context, endpoint: str, topic: bytes, hwm: int = None):
     """Crea un socket SUB suscrito a un tópico específico"""
     socket = context.socket(zmq.SUB)
+    if hwm is not None:
+        socket.setsockopt(zmq.RCVHWM, hwm)
     socket.connect(endpoint)
     socket.setsockopt(zmq.SUBSCRIBE, topic)
     return socket
 
+class ContadoresFlujo:
+    """
+    Contadores de un socket de eventos:
+    - enviados / bloqueados (cola llena al enviar: el mensaje se retuvo)
+    - recibidos / perdidos (saltos en la secuencia "seq" que pone el emisor)
+    """
+    def __init__(self):
+        self.enviados = 0
+        self.bloqueados = 0
+        self.recibidos = 0
+        self.perdidos = 0
+        self.ultimo_seq = {}
+
+    def registrar_recibido(self, topic: bytes, seq: int = None):
+        self.recibidos += 1
+        if seq is None:
+            return
+        ultimo = self.ultimo_seq.get(topic)
+        # seq menor o igual: el emisor se reinició y volvió a empezar
+        if ultimo is not None and seq > ultimo + 1:
+            self.perdidos += seq - ultimo - 1
+        self.ultimo_seq[topic] = seq
+
+    def como_dict(self) -> dict:
+        return {"enviados": self.enviados, "bloqueados": self.bloqueados,
+                "recibidos": self.recibidos, "perdidos": self.perdidos}
+
+
 #ENVÍO/RECEPCIÓN DE MENSAJES
 def safe_send(socket, data: dict):
     """Envia un mensaje en formato dict → JSON → bytes"""
@@ -65,13 +145,17 @@ def safe_recv(socket):
 
 #HEARTBEAT DETECCIÓN DE FALLOS
 def start_heartbeat_sender(context, endpoint: str, interval=2.0):
-    """Crea un socket PUSH para enviar heartbeats, devuelve la función que se debe llamar dentro de un loop"""
+    """Crea un socket PUSH para enviar heartbeats, devuelve la función que se debe llamar dentro de un loop.
+    beat(data) envía un dict como JSON; sin data envía solo b"HB".
+    """
     socket = context.socket(zmq.PUSH)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.SNDHWM, 10)  # si nadie escucha no acumular heartbeats viejos
     socket.connect(endpoint)
 
-    def beat():
+    def beat(data: dict = None):
         try:
-            socket.send(b"HB")
+            socket.send(encode_message(data) if data is not None else b"HB", zmq.NOBLOCK)
         except:
             pass
 
@@ -0,0 +1,211 @@
+# gestor_almacenamiento/busqueda.py
+import bisect
+import heapq
+import itertools
+import math
+import re
+import unicodedata
+from array import array
+from gestor_almacenamiento.formato_binario import recorrer_libros
+
+# BÚSQUEDA POR TÍTULO Y AUTOR
+# Índice invertido palabra -> libros, uno por campo. Cada libro indexado tiene
+# un número de documento creciente; las listas de documentos (array de enteros)
+# quedan ordenadas solo con agregar al final. Si cambia el título o el autor
+# (importación) el libro recibe un documento nuevo y el viejo queda muerto:
+# las listas no se tocan y el índice se compacta al reconstruirse.
+# Préstamos, devoluciones y renovaciones no cambian ni título ni autor: para
+# el índice son una comparación y nada más.
+#
+# Consulta: todas las palabras deben aparecer (en título o autor); la última
+# también vale como prefijo ("cien años de sol" encuentra "soledad").
+# Puntaje por palabra: peso del campo (título > autor) * idf, a la mitad si
+# solo coincide el prefijo.
+
+CAMPOS = (("titulo", 2.0), ("autor", 1.0))
+PESO_PREFIJO = 0.5
+MAX_EXPANSION = 32       # palabras del vocabulario que cubre el prefijo (las más frecuentes)
+MAX_CANDIDATOS = 5000    # libros puntuados por consulta (los de las mejores listas primero)
+_PALABRA = re.compile(r"[a-z0-9]+")
+
+
+def palabras(texto: str) -> list:
+    """Palabras normalizadas: minúsculas y sin tildes ("Canción" -> "cancion")"""
+    sin_tildes = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    return _PALABRA.findall(sin_tildes.lower())
+
+
+def _docs(valor):
+    """Lista de documentos de una palabra: un entero solo (lo más común) o un array"""
+    if valor is None:
+        return ()
+    return (valor,) if isinstance(valor, int) else valor
+
+
+class IndiceBusqueda:
+    """
+    Índice derivado del GA (se registra en 'indices'): registrar_cambio(antes,
+    despues) y reconstruir(db), con db_lock como los demás.
+    """
+    def __init__(self):
+        self.codigos = []     # documento -> código (None si quedó muerto)
+        self.doc_de = {}      # código -> documento vigente
+        self.postings = {campo: {} for campo, _ in CAMPOS}  # campo -> palabra -> int | array
+        self.vocabulario = []  # palabras ordenadas (para los prefijos)
+        self.nuevas = []       # palabras agregadas desde el último orden
+        self.vivos = 0
+
+    # MANTENIMIENTO (con db_lock)
+    def _agregar(self, libro: dict):
+        doc = len(self.codigos)
+        self.codigos.append(libro["codigo"])
+        self.doc_de[libro["codigo"]] = doc
+        self.vivos += 1
+        for campo, _ in CAMPOS:
+            postings = self.postings[campo]
+            for palabra in palabras(libro.get(campo)):
+                actual = postings.get(palabra)
+                if actual is None:
+                    if all(palabra not in p for p in self.postings.values()):
+                        self.nuevas.append(palabra)
+                    postings[palabra] = doc
+                elif isinstance(actual, int):
+                    if actual != doc:
+                        postings[palabra] = array("i", (actual, doc))
+                elif actual[-1] != doc:
+                    actual.append(doc)
+
+    def _quitar(self, codigo: str):
+        doc = self.doc_de.pop(codigo, None)
+        if doc is not None:
+            self.codigos[doc] = None
+            self.vivos -= 1
+
+    def registrar_cambio(self, libro_antes: dict, libro_despues: dict):
+        if libro_antes is not None and libro_despues is not None \
+                and all(libro_antes.get(campo) == libro_despues.get(campo) for campo, _ in CAMPOS):
+            return
+        if libro_antes is not None:
+            self._quitar(libro_antes["codigo"])
+        if libro_despues is not None:
+            self._quitar(libro_despues["codigo"])
+            self._agregar(libro_despues)
+
+    def reconstruir(self, db: dict):
+        self.__init__()
+        for libro in recorrer_libros(db.get("libros", [])):
+            self._agregar(libro)
+        self._ordenar_vocabulario()
+
+    def _ordenar_vocabulario(self):
+        # Timsort aprovecha que la lista ya estaba ordenada: O(n) más las nuevas
+        if self.nuevas:
+            self.vocabulario.extend(self.nuevas)
+            self.vocabulario.sort()
+            self.nuevas = []
+
+    # CONSULTAS
+    def _frecuencia(self, palabra: str) -> int:
+        return sum(len(_docs(postings.get(palabra))) for postings in self.postings.values())
+
+    def _expandir(self, prefijo: str) -> list:
+        """Palabras que empiezan con el prefijo: las MAX_EXPANSION más frecuentes"""
+        inicio = bisect.bisect_left(self.vocabulario, prefijo)
+        fin = bisect.bisect_left(self.vocabulario, prefijo + "\x7f", inicio)
+        rango = self.vocabulario[inicio:fin]
+        if len(rango) <= MAX_EXPANSION:
+            return rango
+        return heapq.nlargest(MAX_EXPANSION, rango, key=self._frecuencia)
+
+    def _listas(self, palabra: str, peso: float) -> list:
+        """(documentos, puntaje) de una palabra en cada campo donde aparece"""
+        listas = []
+        for campo, peso_campo in CAMPOS:
+            docs = _docs(self.postings[campo].get(palabra))
+            if docs:
+                idf = math.log(1 + max(1, self.vivos) / len(docs))
+                listas.append((docs, peso_campo * idf * peso))
+        return listas
+
+    def buscar(self, texto: str, limite: int = 10, prefijo: bool = True):
+        """
+        Devuelve ([(codigo, puntaje), ...] de mayor a menor, coincidencias, truncado).
+        Con una palabra, coincidencias es aproximado (suma de las listas). truncado:
+        había más de MAX_CANDIDATOS coincidencias y se puntuaron las de las mejores
+        listas del término más selectivo.
+        """
+        terminos = list(dict.fromkeys(palabras(texto)))  # sin repetidas, en orden
+        if not terminos:
+            return [], 0, False
+        self._ordenar_vocabulario()
+
+        # Por término: las listas que lo satisfacen (palabra exacta y, en el último, las del prefijo)
+        listas_termino = []
+        for i, termino in enumerate(terminos):
+            listas = self._listas(termino, 1.0)
+            if prefijo and i == len(terminos) - 1:
+                for palabra in self._expandir(termino):
+                    if palabra != termino:
+                        listas.extend(self._listas(palabra, PESO_PREFIJO))
+            if not listas:
+                return [], 0, False
+            listas_termino.append(listas)
+
+        listas_termino.sort(key=lambda listas: sum(len(docs) for docs, _ in listas))
+        if len(listas_termino) == 1:
+            # Una palabra: los primeros 'limite' libros vivos de sus listas, de la de más puntaje a la de menos
+            guia = listas_termino[0]
+            candidatos = {}
+            for docs, puntaje in sorted(guia, key=lambda lista: -lista[1]):
+                for doc in docs:
+                    if len(candidatos) >= limite:
+                        break
+                    if self.codigos[doc] is not None and doc not in candidatos:
+                        candidatos[doc] = puntaje
+            mejores = sorted(((puntaje, -doc) for doc, puntaje in candidatos.items()), reverse=True)
+            return [(self.codigos[-menos_doc], p) for p, menos_doc in mejores], sum(len(d) for d, _ in guia), False
+
+        # Varias palabras: AND con operaciones de conjuntos (recorren las listas en C),
+        # empezando por el término más selectivo
+        coincidencias = set().union(*(docs for docs, _ in listas_termino[0]))
+        for listas in listas_termino[1:]:
+            en_termino = set()
+            for docs, _ in listas:
+                en_termino |= coincidencias.intersection(docs)
+            coincidencias = en_termino
+            if not coincidencias:
+                return [], 0, False
+        if self.vivos != len(self.codigos):
+            coincidencias = {doc for doc in coincidencias if self.codigos[doc] is not None}
+        total = len(coincidencias)
+        truncado = total > MAX_CANDIDATOS
+        if truncado:
+            # Se puntúan solo los de las mejores listas del término más selectivo
+            elegidos = set()
+            for docs, _ in sorted(listas_termino[0], key=lambda lista: -lista[1]):
+                nuevos = coincidencias.intersection(docs) - elegidos
+                if len(elegidos) + len(nuevos) >= MAX_CANDIDATOS:
+                    elegidos.update(itertools.islice(nuevos, MAX_CANDIDATOS - len(elegidos)))
+                    break
+                elegidos |= nuevos
+            coincidencias = elegidos
+
+        # Puntaje: por término, la mejor lista (campo y palabra) que contiene al libro
+        puntajes = dict.fromkeys(coincidencias, 0.0)
+        for listas in listas_termino:
+            mejor = {}
+            for docs, puntaje in listas:
+                for doc in coincidencias.intersection(docs):
+                    if mejor.get(doc, 0) < puntaje:
+                        mejor[doc] = puntaje
+            for doc, puntaje in mejor.items():
+                puntajes[doc] += puntaje
+        mejores = heapq.nlargest(limite, ((puntaje, -doc) for doc, puntaje in puntajes.items()))
+        return [(self.codigos[-menos_doc], puntaje) for puntaje, menos_doc in mejores], total, truncado
+
+    def memoria(self) -> dict:
+        """Tamaño aproximado del índice (bytes de las listas de documentos)"""
+        listas = sum(p.buffer_info()[1] * p.itemsize for postings in self.postings.values()
+                     for p in postings.values() if not isinstance(p, int))
+        return {"documentos": len(self.codigos), "vivos": self.vivos, "palabras": len(self.vocabulario),
+                "bytes_listas": listas}
@@ -0,0 +1,345 @@
+# gestor_almacenamiento/cdc.py
+"""
+Flujo de cambios (CDC) del GA: un registro compacto por cada libro que cambia
+en la BD, así un consumidor (reportes, cachés, búsqueda) se mantiene al día
+leyendo solo los cambios y no el JSON completo.
+
+Registro: {"seq": 812, "version": 530, "codigo": "L0042", "disponibles": 1,
+           "totales": 3, "prestamos": 2}   (+ "nuevo": true si el libro es nuevo)
+- seq: posición en el flujo (un número por registro, nunca se repite)
+- version: versión de la BD que dejó el cambio (una importación o una fusión
+  entre sedes cambian varios libros en una sola versión)
+
+Salidas:
+- PUB "ga_cdc" (tópico CDC): {"sede": N, "cambios": [registro, ...]}
+- bd/cambios_sedeN.jsonl: el mismo flujo en disco. La primera línea es
+  {"inicio": true, "seq": S, "version": V}: el archivo tiene todos los cambios
+  posteriores a esa posición. Se rota al pasar CDC_MAX_REGISTROS y al arrancar
+  el GA si no coincide con la BD cargada (cola perdida en una caída).
+- Operación "cambios" del GA (REQ/REP): {"desde_seq": S} o {"desde_version": V}
+  devuelve lo que sigue a esa posición; si ya no está en el archivo responde
+  "reinicio": hay que releer el catálogo completo y seguir desde "base".
+
+Consumidor de ejemplo:
+  python -m gestor_almacenamiento.cdc --sede 1 --desde-version 0
+"""
+import argparse
+import bisect
+import json
+import os
+import threading
+from collections import deque
+from pathlib import Path
+import zmq
+from comun.config import SEDES, CDC_MEMORIA, CDC_MAX_REGISTROS, HEARTBEAT_TIMEOUT_SECONDS, endpoint_conexion
+from comun.zeromq_utils import bind_endpoints, create_req_socket, encode_message, decode_message
+
+TOPIC_CDC = b"CDC"
+MAX_REGISTROS_POR_MENSAJE = 500
+MAX_REGISTROS_POR_LECTURA = 1000
+INDICE_CADA = 1000  # una marca (seq, versión, posición en el archivo) cada tantos registros
+
+
+def registro_cambio(version: int, libro_antes: dict, libro_despues: dict) -> dict:
+    registro = {
+        "version": version,
+        "codigo": libro_despues["codigo"],
+        "disponibles": libro_despues.get("ejemplares_disponibles", 0),
+        "totales": libro_despues.get("ejemplares_totales", 0),
+        "prestamos": len(libro_despues.get("prestamos", [])),
+    }
+    if libro_antes is None:
+        registro["nuevo"] = True
+    return registro
+
+
+class FlujoCambios:
+    """
+    Se registra como índice del GA: registrar_cambio() solo arma el registro y
+    lo agrega a los pendientes (O(1) con db_lock). Un hilo propio los toma con
+    db_lock, así cada tanda trae completas las versiones (una importación no
+    queda partida entre dos escrituras), y los numera, escribe y publica.
+    Los últimos CDC_MEMORIA registros quedan también en memoria para responder
+    "cambios" sin leer el archivo.
+    """
+    def __init__(self, path, endpoint, sede: int, version_actual, db_lock):
+        self.path = Path(path)
+        self.anterior = self.path.with_suffix(".anterior.jsonl")
+        self.endpoint = endpoint
+        self.sede = sede
+        self.version_actual = version_actual
+        self.db_lock = db_lock
+        self.pendientes = []
+        self.hay_pendientes = threading.Event()
+        self.lock = threading.Lock()
+        self.recientes = deque(maxlen=CDC_MEMORIA)
+        self.archivo = None
+        self.base = {"seq": 0, "version": 0}
+        self.seq = 0        # último registro escrito
+        self.ultima = 0     # versión del último registro escrito
+        self.registros = 0  # registros en el archivo actual
+        self.tam = 0        # bytes ya escritos (lo que se puede leer)
+        self.marcas = {"seq": [], "version": [], "pos": []}
+
+    # ARCHIVO
+    def abrir(self, version_bd: int):
+        """Recorre el archivo al arrancar: arma las marcas y verifica que coincida con la BD cargada"""
+        base, seq_max, registros, pos = None, 0, 0, 0
+        marcas = {"seq": [], "version": [], "pos": []}
+        ultimo = None
+        if self.path.exists():
+            with open(self.path, "rb") as f:
+                for linea in f:
+                    try:
+                        if not linea.endswith(b"\n"):
+                            raise ValueError("línea cortada")
+                        r = json.loads(linea)
+                    except ValueError:
+                        break  # cola cortada por una caída
+                    seq_max = max(seq_max, r.get("seq", 0))
+                    if base is None:
+                        if not r.get("inicio"):
+                            break
+                        base = {"seq": r["seq"], "version": r["version"]}
+                    elif r["version"] > version_bd:
+                        break  # cambios que la BD cargada no tiene
+                    else:
+                        if registros % INDICE_CADA == 0:
+                            self._marcar(marcas, r, pos)
+                        registros += 1
+                        ultimo = r
+                    pos += len(linea)
+                # lo que quede después del corte (para no reutilizar sus seq)
+                for linea in f:
+                    try:
+                        seq_max = max(seq_max, json.loads(linea).get("seq", 0))
+                    except ValueError:
+                        pass
+
+        ultima = ultimo["version"] if ultimo else (base or {}).get("version", 0)
+        if base is None or base["version"] > version_bd or ultima != version_bd or seq_max != (ultimo or base)["seq"]:
+            # El archivo no refleja la BD cargada: se empieza uno nuevo desde su versión.
+            # Se salta un seq: quien haya leído lo que se perdió debe releer el catálogo.
+            if base is not None:
+                print(f"[CDC Sede {self.sede}] El flujo llegaba a v{ultima} y la BD está en v{version_bd}: "
+                      f"se inicia uno nuevo")
+            self._rotar(seq_max + 1 if self.path.exists() else 0, version_bd)
+            return self
+        if pos < self.path.stat().st_size:
+            os.truncate(self.path, pos)  # línea cortada al final
+        self.base = base
+        self.seq = (ultimo or base)["seq"]
+        self.ultima = ultima
+        self.registros = registros
+        self.tam = pos
+        self.marcas = marcas
+        self.archivo = open(self.path, "ab", buffering=0)
+        return self
+
+    @staticmethod
+    def _marcar(marcas: dict, registro: dict, pos: int):
+        marcas["seq"].append(registro["seq"])
+        marcas["version"].append(registro["version"])
+        marcas["pos"].append(pos)
+
+    def _rotar(self, seq: int, version: int):
+        """Empieza un archivo nuevo desde (seq, version); el actual queda como .anterior"""
+        if self.archivo is not None:
+            self.archivo.close()
+        if self.path.exists():
+            os.replace(self.path, self.anterior)
+        self.base = {"seq": seq, "version": version}
+        self.seq, self.ultima, self.registros = seq, version, 0
+        self.marcas = {"seq": [], "version": [], "pos": []}
+        self.recientes.clear()
+        linea = json.dumps(dict(inicio=True, **self.base)).encode("utf-8") + b"\n"
+        self.archivo = open(self.path, "wb", buffering=0)
+        self.archivo.write(linea)
+        self.tam = len(linea)
+
+    def _escribir(self, registros: list):
+        """Numera y agrega al archivo (llamar con self.lock desde el hilo escritor)"""
+        pendiente = []
+        pos = self.tam
+        for r in registros:
+            if self.registros >= CDC_MAX_REGISTROS and r["version"] != self.ultima:
+                # Solo entre versiones: el archivo nuevo tiene completas las posteriores a su base
+                self.archivo.write(b"".join(pendiente))
+                pendiente = []
+                self._rotar(self.seq, self.ultima)
+                pos = self.tam
+            self.seq += 1
+            r["seq"] = self.seq
+            linea = json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n"
+            if self.registros % INDICE_CADA == 0:
+                self._marcar(self.marcas, r, pos)
+            pendiente.append(linea)
+            pos += len(linea)
+            self.registros += 1
+            self.ultima = r["version"]
+            self.recientes.append(r)
+        # Sin buffer: cada tanda es una sola escritura
+        self.archivo.write(b"".join(pendiente))
+        self.tam = pos
+
+    # HILO ESCRITOR / PUBLICADOR
+    def start(self):
+        socket_pub = zmq.Context.instance().socket(zmq.PUB)
+        bind_endpoints(socket_pub, self.endpoint)
+
+        def run():
+            while True:
+                self.hay_pendientes.wait()
+                with self.db_lock:
+                    registros, self.pendientes = self.pendientes, []
+                    self.hay_pendientes.clear()
+                try:
+                    with self.lock:
+                        self._escribir(registros)
+                except Exception as e:
+                    print(f"[CDC Sede {self.sede}] Error escribiendo el flujo: {e}")
+                # Siempre después de escribir: lo publicado ya se puede pedir con "cambios"
+                for i in range(0, len(registros), MAX_REGISTROS_POR_MENSAJE):
+                    msg = {"sede": self.sede, "cambios": registros[i:i + MAX_REGISTROS_POR_MENSAJE]}
+                    socket_pub.send_multipart([TOPIC_CDC, json.dumps(msg, ensure_ascii=False).encode("utf-8")])
+
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+    # ÍNDICE DEL GA (con db_lock)
+    def registrar_cambio(self, libro_antes: dict, libro_despues: dict):
+        if libro_despues is not None:
+            self.pendientes.append(registro_cambio(self.version_actual(), libro_antes, libro_despues))
+            self.hay_pendientes.set()
+
+    def reconstruir(self, db: dict):
+        pass
+
+    # CONSULTA
+    def leer(self, desde_seq: int = None, desde_version: int = None, maximo: int = MAX_REGISTROS_POR_LECTURA) -> dict:
+        """Registros posteriores a una posición (seq o versión), de memoria si están, si no del archivo"""
+        clave, valor = ("seq", desde_seq) if desde_seq is not None else ("version", desde_version or 0)
+        maximo = max(1, min(int(maximo), MAX_REGISTROS_POR_LECTURA))
+        with self.lock:
+            respuesta = {"ok": True, "base": dict(self.base), "ultima_seq": self.seq, "ultima_version": self.ultima}
+            if valor < self.base[clave] or (clave == "seq" and valor > self.seq):
+                # Ya no está en el archivo (o el GA perdió lo que el consumidor vio):
+                # releer el catálogo y seguir desde la base
+                return dict(respuesta, reinicio=True, cambios=[])
+            if valor >= (self.seq if clave == "seq" else self.ultima):
+                return dict(respuesta, cambios=[])
+            if self.recientes and (self.recientes[0][clave] <= valor or len(self.recientes) == self.registros):
+                cambios = [r for r in self.recientes if r[clave] > valor][:maximo]
+                return dict(respuesta, cambios=cambios)
+            i = bisect.bisect_right(self.marcas[clave], valor) - 1
+            pos = self.marcas["pos"][i] if i >= 0 else 0
+            fin = self.tam
+            path = self.path
+        cambios = []
+        with open(path, "rb") as f:
+            f.seek(pos)
+            while pos < fin and len(cambios) < maximo:
+                linea = f.readline()
+                if not linea:
+                    break
+                pos += len(linea)
+                r = json.loads(linea)
+                if not r.get("inicio") and r[clave] > valor:
+                    cambios.append(r)
+        return dict(respuesta, cambios=cambios)
+
+
+class ConsumidorCambios:
+    """
+    Sigue el flujo de cambios de un GA desde una posición: se suscribe al PUB,
+    pide con "cambios" lo que falta hasta alcanzarlo y después aplica lo que
+    llega por PUB. Un salto en seq (mensajes PUB perdidos) o un rato sin
+    mensajes se reparan pidiendo otra vez desde el último seq aplicado.
+    al_cambio(registro); al_reinicio(base): la historia pedida ya no está,
+    hay que releer el catálogo completo (el flujo sigue desde base).
+    """
+    def __init__(self, sede: int, al_cambio, al_reinicio=None, timeout_ms: int = 3000):
+        self.sede = sede
+        self.al_cambio = al_cambio
+        self.al_reinicio = al_reinicio or (lambda base: None)
+        self.timeout_ms = timeout_ms
+        self.seq = None
+        self.ctx = zmq.Context.instance()
+        self.socket_req = None
+
+    def _pedir(self, msg: dict) -> dict:
+        if self.socket_req is None:
+            self.socket_req = create_req_socket(self.ctx, endpoint_conexion(self.sede, "ga"), self.timeout_ms)
+        try:
+            self.socket_req.send(encode_message({"operacion": "cambios", "payload": msg}))
+            return decode_message(self.socket_req.recv())
+        except zmq.Again:
+            # Lazy Pirate: el REQ queda inutilizable tras un timeout
+            self.socket_req.close(linger=0)
+            self.socket_req = None
+            raise
+
+    def alcanzar(self, desde_version: int = None):
+        """Pide cambios hasta estar al día (desde self.seq, o desde una versión al empezar)"""
+        while True:
+            if self.seq is None:
+                resp = self._pedir({"desde_version": desde_version or 0})
+            else:
+                resp = self._pedir({"desde_seq": self.seq})
+            if not resp.get("ok"):
+                raise RuntimeError(resp.get("mensaje", "GA rechazó la consulta de cambios"))
+            if resp.get("reinicio"):
+                self.al_reinicio(resp["base"])
+                self.seq = resp["base"]["seq"]
+                continue
+            for r in resp["cambios"]:
+                self.al_cambio(r)
+                self.seq = r["seq"]
+            if not resp["cambios"]:
+                if self.seq is None:
+                    self.seq = resp["ultima_seq"]
+                return
+
+    def seguir(self, desde_version: int = 0):
+        socket_sub = self.ctx.socket(zmq.SUB)
+        socket_sub.setsockopt(zmq.SUBSCRIBE, TOPIC_CDC)
+        socket_sub.connect(endpoint_conexion(self.sede, "ga_cdc"))
+        # Primero suscribirse, después alcanzar: lo que se publique mientras tanto no se pierde
+        espera_ms = int(HEARTBEAT_TIMEOUT_SECONDS * 1000)
+        al_dia = False
+        while True:
+            try:
+                if not al_dia:
+                    self.alcanzar(desde_version)
+                    al_dia = True
+                    continue
+                elif not socket_sub.poll(espera_ms):
+                    self.alcanzar()  # silencio: confirmar que no se perdió la cola del flujo
+                    continue
+                _, raw = socket_sub.recv_multipart()
+                for r in json.loads(raw.decode("utf-8"))["cambios"]:
+                    if r["seq"] <= self.seq:
+                        continue
+                    if r["seq"] != self.seq + 1:
+                        self.alcanzar()  # se perdieron mensajes PUB
+                        if r["seq"] <= self.seq:
+                            continue
+                    self.al_cambio(r)
+                    self.seq = r["seq"]
+            except zmq.Again:
+                print(f"[CDC] GA Sede {self.sede} no responde, reintentando...")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sigue el flujo de cambios (CDC) del GA de una sede")
+    parser.add_argument("--sede", type=int, choices=SEDES, required=True)
+    parser.add_argument("--desde-version", type=int, default=0)
+    args = parser.parse_args()
+
+    def mostrar(r):
+        print(json.dumps(r, ensure_ascii=False))
+
+    def reinicio(base):
+        print(f"[CDC] Los cambios anteriores a v{base['version']} ya no están: releer el catálogo completo")
+
+    ConsumidorCambios(args.sede, mostrar, reinicio).seguir(args.desde_version)
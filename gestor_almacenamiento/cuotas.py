@@ -0,0 +1,93 @@
+# gestor_almacenamiento/cuotas.py
+from collections import Counter
+
+# CUPOS POR SEDE
+# Los ejemplares de cada libro se reparten entre las sedes ("cuota_inicial").
+# Cada sede presta localmente, sin consultar a las demás, mientras le quede
+# cupo: cupo = cuota inicial + lo recibido - lo cedido - sus préstamos activos.
+# Un préstamo es "de" la sede que lo creó (su dot); los anteriores a la
+# replicación cuentan para la primera sede.
+#
+# Las cesiones ("cuota_transf": {origen: {destino: n}}) solo las incrementa la
+# sede de origen, así que al fusionar dos versiones basta con el máximo de cada
+# contador. Con esto la suma de préstamos nunca supera los ejemplares aunque
+# dos sedes presten a la vez.
+#
+# Si una sede está caída no puede ceder: la que la respalda toma el cupo libre
+# de la caída al prestar ("cuota_tomada": {tomador: {dueño: n}}, solo lo
+# incrementa el tomador, se fusiona igual que las cesiones). Al volver, la
+# sede caída ve lo tomado al fusionar y presta con lo que le queda. Si en
+# realidad seguía viva (partición) y también prestó, su disponible local queda
+# negativo y no presta hasta que haya devoluciones.
+
+
+def reparto_inicial(libro: dict, sedes) -> dict:
+    """Reparto parejo de los ejemplares entre las sedes (las primeras se llevan el resto)"""
+    total = libro.get("base_disponibles")
+    if total is None:
+        total = libro.get("ejemplares_disponibles", 0) + len(libro.get("prestamos", []))
+    sedes = sorted(sedes)
+    q, r = divmod(max(total, 0), len(sedes))
+    return {str(s): q + (1 if i < r else 0) for i, s in enumerate(sedes)}
+
+
+def _inicial(libro: dict, sedes) -> dict:
+    return libro.get("cuota_inicial") or reparto_inicial(libro, sedes)
+
+
+def cupo(libro: dict, sede: int, sedes) -> int:
+    s = str(sede)
+    transf = libro.get("cuota_transf", {})
+    recibido = sum(destinos.get(s, 0) for destinos in transf.values())
+    cedido = sum(transf.get(s, {}).values())
+    tomada = libro.get("cuota_tomada", {})
+    tomado = sum(tomada.get(s, {}).values())
+    perdido = sum(duenos.get(s, 0) for duenos in tomada.values())
+    return _inicial(libro, sedes).get(s, 0) + recibido - cedido + tomado - perdido
+
+
+def en_prestamo(libro: dict, sede: int, sedes) -> int:
+    primera = min(int(s) for s in _inicial(libro, sedes))
+    return sum(1 for p in libro.get("prestamos", [])
+               if (p["dot"][0] if p.get("dot") else primera) == sede)
+
+
+def disponible_local(libro: dict, sede: int, sedes) -> int:
+    return cupo(libro, sede, sedes) - en_prestamo(libro, sede, sedes)
+
+
+def tomar_cupo(libro: dict, tomador: int, dueno: int, cantidad: int = 1):
+    """Pasa cupo de una sede caída a la que presta por ella (libro: copia recién creada, se modifica en sitio)"""
+    tomada = {t: dict(d) for t, d in libro.get("cuota_tomada", {}).items()}
+    duenos = tomada.setdefault(str(tomador), {})
+    duenos[str(dueno)] = duenos.get(str(dueno), 0) + cantidad
+    libro["cuota_tomada"] = tomada
+
+
+def fusionar_transferencias(a: dict, b: dict) -> dict:
+    """Máximo por (origen, destino): cada contador solo crece y solo lo toca su origen (o su tomador)"""
+    resultado = {}
+    for origen in set(a) | set(b):
+        da, db_ = a.get(origen, {}), b.get(origen, {})
+        resultado[origen] = {d: max(da.get(d, 0), db_.get(d, 0)) for d in set(da) | set(db_)}
+    return resultado
+
+
+class DemandaCupos:
+    """Demanda observada por libro en la sede durante la ventana actual (usar con db_lock)"""
+    def __init__(self):
+        self.rechazos = Counter()  # préstamos rechazados por falta de cupo local
+        self.prestados = Counter()
+
+    def registrar_rechazo(self, codigo: str):
+        self.rechazos[codigo] += 1
+
+    def registrar_prestamo(self, codigo: str):
+        self.prestados[codigo] += 1
+
+    def tomar(self) -> dict:
+        """Devuelve los rechazos de la ventana y empieza una nueva"""
+        rechazos = dict(self.rechazos)
+        self.rechazos.clear()
+        self.prestados.clear()
+        return rechazos
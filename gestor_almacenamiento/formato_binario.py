@@ -0,0 +1,307 @@
+# gestor_almacenamiento/formato_binario.py
+import json
+import mmap
+import struct
+import zlib
+from pathlib import Path
+from gestor_almacenamiento.persistencia import ruta_temporal, sincronizar, reemplazar, version_json
+
+# FORMATO DEL SNAPSHOT BINARIO
+# [cabecera][registros JSON compactos][tabla de offsets][índice por código][extra JSON]
+#
+# cabecera: magic, version BD, n_libros, offset tabla, offset índice, offset extra,
+#           crc32 de la cabecera y de tabla + índice + extra (se verifica al abrir)
+# tabla:    n x (offset, largo, codigo, totales, disponibles, n_prestamos, crc32) del
+#           registro i (orden original de la lista); los tres enteros permiten armar
+#           la tabla de disponibilidad sin decodificar ningún registro
+# índice:   n x (codigo, i) ordenado por código -> búsqueda binaria sin parsear nada
+# extra:    resto de claves de primer nivel de la BD (todo menos version y libros)
+#
+# Cada registro se verifica con su crc32 al decodificarlo: abrir el snapshot no
+# recorre los registros y el arranque sigue siendo perezoso.
+
+MAGIC = b"BIBSNAP3"  # formatos anteriores: el GA arranca del JSON y lo reescribe
+CABECERA = struct.Struct("<8sqIQQQI")
+ENTRADA_TABLA = struct.Struct("<QI16siiiI")
+ENTRADA_INDICE = struct.Struct("<16sI")
+LARGO_CODIGO = 16
+
+
+def _codificar_codigo(codigo: str) -> bytes:
+    raw = codigo.encode("utf-8")
+    if len(raw) > LARGO_CODIGO:
+        raise ValueError(f"Código de libro demasiado largo para el snapshot: {codigo}")
+    return raw.ljust(LARGO_CODIGO, b"\0")
+
+
+def valores_disponibilidad(libro: dict) -> tuple:
+    """(totales, disponibles, n_prestamos) de un libro, lo que guarda la tabla de disponibilidad"""
+    return (libro.get("ejemplares_totales", 0), libro.get("ejemplares_disponibles", 0),
+            len(libro.get("prestamos", [])))
+
+
+class EscritorSnapshotBinario:
+    """
+    Escribe un snapshot registro a registro, sin tener la BD en memoria (solo
+    la tabla de offsets y las claves del índice): agregar() por cada libro y
+    al final cerrar(). Archivo temporal + fsync + rename: no rompe mmaps
+    abiertos y una caída deja el snapshot anterior entero.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.tmp = ruta_temporal(self.path)
+        self.f = open(self.tmp, "wb", buffering=1 << 20)
+        self.f.write(b"\0" * CABECERA.size)
+        self.tabla = bytearray()
+        self.claves = []
+        self.offset = CABECERA.size
+
+    def agregar(self, codigo: str, raw: bytes, valores: tuple):
+        """raw: registro JSON compacto (bytes UTF-8); valores: ver valores_disponibilidad"""
+        self.f.write(raw)
+        clave = _codificar_codigo(codigo)
+        self.tabla += ENTRADA_TABLA.pack(self.offset, len(raw), clave, *valores, zlib.crc32(raw))
+        self.claves.append(clave)
+        self.offset += len(raw)
+
+    def copiar(self, snap_bin: "SnapshotBinario", i: int):
+        """
+        Copia el registro i de otro snapshot sin decodificarlo. Conserva su suma:
+        un registro dañado sigue detectándose en el snapshot nuevo.
+        """
+        offset, largo, clave, totales, disponibles, prestamos, crc = snap_bin._entrada(i)
+        self.f.write(snap_bin.mm[offset:offset + largo])
+        self.tabla += ENTRADA_TABLA.pack(self.offset, largo, clave, totales, disponibles, prestamos, crc)
+        self.claves.append(clave)
+        self.offset += largo
+
+    def cerrar(self, version: int, extra: dict):
+        off_tabla = self.offset
+        orden = sorted(range(len(self.claves)), key=self.claves.__getitem__)
+        indice = b"".join(ENTRADA_INDICE.pack(self.claves[i], i) for i in orden)
+        off_indice = off_tabla + len(self.tabla)
+        off_extra = off_indice + len(indice)
+        extra = json.dumps(extra, ensure_ascii=False, default=a_json).encode("utf-8")
+        cabecera = CABECERA.pack(MAGIC, version, len(self.claves), off_tabla, off_indice, off_extra, 0)
+        crc = zlib.crc32(cabecera[:-4])
+        for datos in (self.tabla, indice, extra):
+            crc = zlib.crc32(datos, crc)
+            self.f.write(datos)
+
+        self.f.seek(0)
+        self.f.write(cabecera[:-4] + struct.pack("<I", crc))
+        sincronizar(self.f)
+        self.f.close()
+        reemplazar(self.tmp, self.path)
+
+
+def registro_json(libro: dict) -> bytes:
+    return json.dumps(libro, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def escribir_snapshot_binario(path: Path, db: dict):
+    """Escribe la BD en formato binario"""
+    libros = db.get("libros", [])
+    extra = {k: v for k, v in db.items() if k not in ("version", "libros")}
+    sin_tocar = getattr(libros, "sin_tocar", None)
+
+    escritor = EscritorSnapshotBinario(path)
+    for i in range(len(libros)):
+        # Registros sin tocar se copian tal cual del snapshot anterior
+        if sin_tocar and sin_tocar(i):
+            escritor.copiar(libros.snap_bin, i)
+        else:
+            libro = libros[i]
+            escritor.agregar(libro["codigo"], registro_json(libro), valores_disponibilidad(libro))
+    escritor.cerrar(db.get("version", 0), extra)
+
+
+class SnapshotBinario:
+    """
+    Archivo de snapshot mapeado en memoria. Solo lectura. Al abrir se verifican
+    cabecera, tabla, índice y extra; cada registro al decodificarlo (ValueError
+    si algo está dañado).
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) < CABECERA.size or self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} no es un snapshot binario válido (o es de un formato anterior)")
+        _, self.version, self.n, self.off_tabla, self.off_indice, self.off_extra, crc = \
+            CABECERA.unpack_from(self.mm, 0)
+        # Sin los registros: abrir no depende del tamaño del catálogo
+        suma = zlib.crc32(memoryview(self.mm)[self.off_tabla:], zlib.crc32(self.mm[:CABECERA.size - 4]))
+        if suma != crc:
+            raise ValueError(f"{self.path}: suma crc32 incorrecta ({suma:08x}, la cabecera dice {crc:08x})")
+
+    def extra(self) -> dict:
+        return json.loads(self.mm[self.off_extra:].decode("utf-8") or "{}")
+
+    def _entrada(self, i: int) -> tuple:
+        return ENTRADA_TABLA.unpack_from(self.mm, self.off_tabla + i * ENTRADA_TABLA.size)
+
+    def crudo(self, i: int) -> bytes:
+        offset, largo = self._entrada(i)[:2]
+        return self.mm[offset:offset + largo]
+
+    def registro(self, i: int) -> dict:
+        offset, largo, _, _, _, _, crc = self._entrada(i)
+        raw = self.mm[offset:offset + largo]
+        if zlib.crc32(raw) != crc:
+            raise ValueError(f"{self.path}: registro {i} dañado (suma crc32 incorrecta)")
+        return json.loads(raw.decode("utf-8"))
+
+    def codigo(self, i: int) -> str:
+        return self._entrada(i)[2].rstrip(b"\0").decode("utf-8")
+
+    def disponibilidad(self, i: int) -> tuple:
+        """(totales, disponibles, n_prestamos) del registro i, sin decodificarlo"""
+        return self._entrada(i)[3:6]
+
+    def buscar(self, codigo: str) -> int:
+        """Búsqueda binaria en el índice ordenado: devuelve la posición del libro o -1"""
+        clave = _codificar_codigo(codigo)
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            c, i = ENTRADA_INDICE.unpack_from(self.mm, self.off_indice + mid * ENTRADA_INDICE.size)
+            if c < clave:
+                lo = mid + 1
+            elif c > clave:
+                hi = mid
+            else:
+                return i
+        return -1
+
+
+class LibrosPerezosos:
+    """
+    Sustituto de la lista db["libros"] respaldado por un SnapshotBinario.
+    Los registros se decodifican del mmap la primera vez que se piden
+    ("fault in") y las versiones nuevas quedan en un overlay en memoria.
+    """
+    def __init__(self, snap_bin: SnapshotBinario, overlay=None, nuevos=None):
+        self.snap_bin = snap_bin
+        self.overlay = overlay if overlay is not None else {}
+        self.nuevos = nuevos if nuevos is not None else {}  # codigo -> idx de libros agregados
+        self.n = snap_bin.n + len(self.nuevos)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, idx: int) -> dict:
+        if idx < 0:
+            idx += self.n
+        libro = self.overlay.get(idx)
+        if libro is None:
+            if not 0 <= idx < self.snap_bin.n:
+                raise IndexError(idx)
+            libro = self.snap_bin.registro(idx)
+            self.overlay[idx] = libro
+        return libro
+
+    def __setitem__(self, idx: int, libro: dict):
+        if idx < 0:
+            idx += self.n
+        self.overlay[idx] = libro
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    def recorrer(self, solo_con_prestamos: bool = False):
+        """
+        Recorre los libros sin guardarlos en el overlay (reconstrucción de
+        índices al arrancar): lo que no se tocó se decodifica y se descarta.
+        solo_con_prestamos salta, sin decodificarlos, los que no tienen préstamos.
+        """
+        for i in range(self.n):
+            libro = self.overlay.get(i)
+            if libro is not None:
+                if not solo_con_prestamos or libro.get("prestamos"):
+                    yield libro
+            elif not solo_con_prestamos or self.snap_bin.disponibilidad(i)[2]:
+                yield self.snap_bin.registro(i)
+
+    def append(self, libro: dict):
+        self.nuevos[libro["codigo"]] = self.n
+        self.overlay[self.n] = libro
+        self.n += 1
+
+    def indice_de(self, codigo: str) -> int:
+        idx = self.nuevos.get(codigo)
+        if idx is not None:
+            return idx
+        return self.snap_bin.buscar(codigo)
+
+    def sin_tocar(self, i: int) -> bool:
+        """El registro i sigue igual que en el snapshot (se copia sin serializarlo)"""
+        return i < self.snap_bin.n and i not in self.overlay
+
+    def codigo(self, i: int) -> str:
+        return self[i]["codigo"] if i in self.overlay else self.snap_bin.codigo(i)
+
+    def disponibilidad(self, i: int) -> tuple:
+        libro = self.overlay.get(i)
+        return self.snap_bin.disponibilidad(i) if libro is None else valores_disponibilidad(libro)
+
+    def copiar(self):
+        """Copia O(registros tocados) para snapshots: comparte el mmap"""
+        return LibrosPerezosos(self.snap_bin, dict(self.overlay), dict(self.nuevos))
+
+
+def recorrer_libros(libros, solo_con_prestamos: bool = False):
+    """Libros de la BD para reconstruir un índice, sin dejar decodificado el catálogo perezoso"""
+    if isinstance(libros, LibrosPerezosos):
+        return libros.recorrer(solo_con_prestamos)
+    return (libro for libro in libros if not solo_con_prestamos or libro.get("prestamos"))
+
+
+def cargar_snapshot_binario(path: Path) -> dict:
+    """Abre un snapshot binario sin decodificar ningún libro"""
+    snap_bin = SnapshotBinario(path)
+    db = {"version": snap_bin.version}  # primera clave: ver persistencia.version_json
+    db.update(snap_bin.extra())
+    db["libros"] = LibrosPerezosos(snap_bin)
+    return db
+
+
+def version_snapshot(path: Path):
+    """Versión de la BD en la cabecera del snapshot (None si no es del formato actual)"""
+    with open(path, "rb") as f:
+        cabecera = f.read(CABECERA.size)
+    if len(cabecera) < CABECERA.size or cabecera[:len(MAGIC)] != MAGIC:
+        return None
+    return CABECERA.unpack(cabecera)[1]
+
+
+def snapshot_vigente(snapshot_path: Path, primaria_path: Path) -> bool:
+    """
+    El snapshot binario sirve para arrancar si su versión es al menos la de la
+    primaria JSON. Se comparan las versiones guardadas, no las fechas de los
+    archivos (una copia restaurada o tocada después no cambia nada). Con la
+    primaria ilegible vale el snapshot: igual se verifica al abrirlo.
+    """
+    snapshot_path, primaria_path = Path(snapshot_path), Path(primaria_path)
+    if not snapshot_path.exists():
+        return False
+    version = version_snapshot(snapshot_path)
+    if version is None:
+        return False
+    if not primaria_path.exists():
+        return True
+    try:
+        return version >= version_json(primaria_path)
+    except ValueError:
+        return True
+
+
+def a_json(obj):
+    """Hook 'default' de json.dump: LibrosPerezosos como lista, tablas con como_dict() como dict"""
+    if isinstance(obj, LibrosPerezosos):
+        return list(obj.recorrer())
+    if hasattr(obj, "como_dict"):
+        return obj.como_dict()
+    raise TypeError(f"Objeto no serializable: {type(obj).__name__}")
@@ -1,26 +1,68 @@
 # gestor_almacenamiento/ga.py
 import argparse
 import json
+import os
 import random
 import threading
 import time
 import zmq
-import shutil  # Para copiar archivos
+from collections import Counter
 from datetime import datetime, timedelta
 from pathlib import Path
 from comun.config import (
     get_bd_paths_for_sede,
-    GA_SEDE1_ENDPOINT,
-    GA_SEDE2_ENDPOINT,
-    GA_SEDE1_HEARTBEAT_ENDPOINT,
-    GA_SEDE2_HEARTBEAT_ENDPOINT,
+    get_peers,
+    endpoints_bind,
+    endpoint_conexion,
+    SEDES,
     HEARTBEAT_INTERVAL_SECONDS,
+    HEARTBEAT_TIMEOUT_SECONDS,
+    GA_INTERVALO_VENCIMIENTOS_S,
+    GA_INTERVALO_REBALANCEO_S,
+    GA_LOG_VERSIONES,
+    TOPIC_VENCIDO,
+    MEMBRESIA_HABILITADA,
+    ZMQ_HWM_REPLICACION,
+    CATALOGO_INICIAL,
+    OPERACIONES_CONSULTA,
 )
 from gestor_almacenamiento.heartbeat import start_ga_heartbeat
+from gestor_almacenamiento.snapshot import (
+    copiar_libro,
+    reemplazar_libro,
+    tomar_snapshot,
+    EscritorSnapshots,
+)
+from gestor_almacenamiento.formato_binario import (
+    escribir_snapshot_binario,
+    cargar_snapshot_binario,
+    snapshot_vigente,
+    a_json,
+)
+from gestor_almacenamiento.persistencia import escribir_json, leer_json
+from gestor_almacenamiento.tabla_disponibilidad import TablaDisponibilidad, respuesta_disponibilidad
+from gestor_almacenamiento.vencimientos import IndiceVencimientos, start_barrido_vencimientos
+from gestor_almacenamiento.importacion import normalizar_fila, libro_nuevo, actualizar_libro, importar_offline
+from gestor_almacenamiento.idempotencia import tabla_de, respuesta_registrada, registrar_respuesta
+from gestor_almacenamiento.cdc import FlujoCambios
+from gestor_almacenamiento.busqueda import IndiceBusqueda
+from gestor_almacenamiento.usuarios import IndicePrestamosUsuario
+from gestor_almacenamiento.cuotas import disponible_local, tomar_cupo, DemandaCupos
+from gestor_almacenamiento.replicacion import (
+    TOPIC_LIBROS,
+    TOPIC_DEMANDA,
+    Replicador,
+    SeguimientoPeer,
+    sellar_cambio,
+    fusionar_libro,
+)
+from comun.membresia import iniciar_reporte_membresia, MedidorCarga
+from comun.perfilado import temporizadores, instalar_senal_perfil
+from comun.administracion import Ajustes, ServidorAdmin
 from comun.zeromq_utils import (
     create_context,
     create_rep_socket,
-    create_sub_socket,  # Necesario para escuchar al otro GA
+    create_req_socket,
     encode_message,
     decode_message,
 )
@@ -29,35 +71,152 @@ from comun.zeromq_utils import (
 db_lock = threading.Lock()
 db_in_memory = {}
 
+# Lock de la replicación entrante (fusión de cada mensaje y su seguimiento):
+# al terminar, el GA lo toma para que el relevo diga exactamente hasta dónde llegó
+replicacion_lock = threading.Lock()
+
+# Lock del archivo primario: se escribe FUERA de db_lock a partir de un snapshot
+primaria_lock = threading.Lock()
+version_primaria = -1
+
+# Tabla mapeada en memoria con la disponibilidad por libro (se escribe con db_lock)
+tabla_disponibilidad = None
+
+# Sede de este GA: sella los cambios locales para la replicación multi-maestro
+# y presta solo dentro de su cupo de cada libro
+sede_local = None
+demanda_cupos = DemandaCupos()
+# Último heartbeat de cada sede vecina (monotonic): si está caída, esta sede
+# presta con su cupo libre en vez de rechazar con SIN_CUPO (ver cuotas.py)
+ultimo_hb_peer = {}
+cupos_tomados = Counter()  # por sede caída
+
+# Índices derivados de la BD: se actualizan con cada cambio de libro y se
+# reconstruyen al cargar o sincronizar. Interfaz: registrar_cambio(antes, despues)
+# y reconstruir(db). Se modifican solo con db_lock.
+indice_vencimientos = IndiceVencimientos()
+indice_busqueda = IndiceBusqueda()
+indice_usuarios = IndicePrestamosUsuario()
+indices = [indice_vencimientos, indice_busqueda, indice_usuarios]
+
+# Solicitudes repetidas (por operación) respondidas con la respuesta original
+repetidas = Counter()
+
+# Posición de cada código en el catálogo JSON (lista de dicts), para no recorrerlo
+_posiciones = {"lista": None, "tam": 0, "idx": {}}
+
 
 # UTILIDADES BD
+@temporizadores.medir("load_db")
 def load_db(path: Path) -> dict:
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-        # Asegurar que existe el campo version
-        if "version" not in data:
-            data["version"] = 0
-        return data
+    """Lee la BD verificando su suma (ValueError si el archivo está dañado)"""
+    data = leer_json(path)
+    # Asegurar que existe el campo version
+    if "version" not in data:
+        data["version"] = 0
+    return data
 
 
+@temporizadores.medir("save_db")
 def save_db(path: Path, db: dict):
-    path.parent.mkdir(exist_ok=True, parents=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(db, f, ensure_ascii=False, indent=2)
+    """Escritura atómica con suma: una caída deja el archivo anterior entero"""
+    # "version" primero: snapshot_vigente la lee sin parsear el archivo
+    escribir_json(path, {"version": db.get("version", 0), **db}, indent=2, default=a_json)
+
+
+def guardar_primaria(path: Path, snap: dict):
+    """Persiste un snapshot en la primaria sin bloquear db_lock, ignorando snapshots viejos"""
+    global version_primaria
+    with primaria_lock:
+        if snap.get("version", 0) < version_primaria:
+            return
+        save_db(path, snap)
+        version_primaria = snap.get("version", 0)
+
+
+def escribir_relevo(path: Path, version: int, replicador, seguimiento: dict):
+    """
+    Relevo en caliente: al terminar drenado, el GA deja su sesión y secuencia de
+    replicación y hasta dónde recibió de cada sede. El GA que lo reemplaza las
+    retoma: las demás sedes no ven una sesión nueva (no fusionan su archivo
+    completo) y él pide a cada sede solo lo que se publicó mientras tanto.
+    """
+    relevo = {"version": version, "sesion": replicador.sesion, "seq": replicador.seq,
+              "peers": {str(p): {"sesion": s.sesion, "continuo": s.continuo}
+                        for p, s in seguimiento.items() if s.continuo is not None}}
+    escribir_json(path, relevo)
+
 
+def tomar_relevo(path: Path, version: int):
+    """Relevo del GA anterior si corresponde a la BD cargada; se usa una sola vez"""
+    if not path.exists():
+        return None
+    try:
+        relevo = leer_json(path)
+    except ValueError:
+        relevo = None
+    path.unlink()
+    if not relevo or relevo.get("version") != version:
+        return None
+    return relevo
+
+
+def cargar_bd_local(sede: int, primaria: Path, replica: Path, snapshot_bin: Path):
+    """
+    BD desde las copias locales verificadas: el snapshot binario si está al día,
+    si no la primaria. Si la primaria está dañada, la más reciente entre la
+    réplica y el snapshot binario (lo que le falte llega de las demás sedes).
+    Devuelve (db, origen) o (None, None) si ninguna copia sirve.
+    """
+    vigente = snapshot_vigente(snapshot_bin, primaria)
+    intentos = [("snapshot binario", snapshot_bin, cargar_snapshot_binario)] if vigente else []
+    intentos.append(("JSON", primaria, load_db))
+    respaldos = [("réplica JSON", replica, load_db)]
+    if not vigente:
+        respaldos.append(("snapshot binario anterior", snapshot_bin, cargar_snapshot_binario))
+
+    def cargar(nombre, path, funcion):
+        if not path.exists():
+            return None
+        try:
+            return funcion(path)
+        except Exception as e:
+            print(f"[GA Sede {sede}] {nombre} ({path.name}) dañado: {e}")
+            return None
+
+    for nombre, path, funcion in intentos:
+        db = cargar(nombre, path, funcion)
+        if db is not None:
+            return db, nombre
+    mejor, origen = None, None
+    for nombre, path, funcion in respaldos:
+        db = cargar(nombre, path, funcion)
+        if db is not None and (mejor is None or db.get("version", 0) > mejor.get("version", 0)):
+            mejor, origen = db, nombre
+    return mejor, origen
 
-def ensure_initial_data(primaria_path: Path):
-    if primaria_path.exists():
+
+def ensure_initial_data(primaria_path: Path, snapshot_path: Path = None, peers_paths=()):
+    if primaria_path.exists() or (snapshot_path and snapshot_path.exists()):
         return
+    # Sede nueva: parte de la BD de una sede existente (la replicación solo
+    # fusiona libros que cambian, no iguala catálogos iniciales distintos)
+    for peer_path in peers_paths:
+        if Path(peer_path).exists():
+            print(f"[GA] Inicializando BD en {primaria_path} desde {peer_path} ...")
+            save_db(primaria_path, load_db(peer_path))
+            return
     print(f"[GA] Generando BD inicial en {primaria_path} ...")
+    # Semilla fija: ambas sedes generan el mismo catálogo
+    rng = random.Random(1000)
     libros = []
     for i in range(1, 1001):
         libros.append({
             "codigo": f"L{i:04d}",
             "titulo": f"Libro {i}",
             "autor": f"Autor {((i - 1) % 50) + 1}",
-            "ejemplares_totales": random.randint(1, 4),
-            "ejemplares_disponibles": random.randint(1, 4),
+            "ejemplares_totales": rng.randint(1, 4),
+            "ejemplares_disponibles": rng.randint(1, 4),
             "prestamos": []
         })
     # Iniciar versión en 0
@@ -66,192 +225,703 @@ def ensure_initial_data(primaria_path: Path):
 
 
 # OPERACIONES (Modifican la versión)
+def _fijar_log_versiones(valor: bool):
+    global GA_LOG_VERSIONES
+    GA_LOG_VERSIONES = valor
+
+
 def incrementar_version(db: dict):
     db["version"] = db.get("version", 0) + 1
-    print(f"[GA] BD actualizada a versión {db['version']}")
+    if GA_LOG_VERSIONES:
+        print(f"[GA] BD actualizada a versión {db['version']}")
 
 
 def find_libro(db: dict, codigo: str):
-    for libro in db.get("libros", []):
-        if libro["codigo"] == codigo:
-            return libro
-    return None
+    _, libro = find_libro_idx(db, codigo)
+    return libro
 
 
+def find_libro_idx(db: dict, codigo: str):
+    libros = db.get("libros", [])
+    if hasattr(libros, "indice_de"):
+        # Catálogo cargado del snapshot binario: búsqueda en el índice, sin recorrer
+        idx = libros.indice_de(codigo)
+        return (idx, libros[idx]) if idx >= 0 else (-1, None)
+    # Las posiciones no cambian (los libros se reemplazan en su lugar); solo se
+    # recalculan si cambia la lista (recarga por sync). Los libros agregados al
+    # final (fusión, importación) se indexan sin recorrer el resto
+    if _posiciones["lista"] is not libros or _posiciones["tam"] > len(libros):
+        _posiciones.update(lista=libros, tam=0, idx={})
+    if _posiciones["tam"] < len(libros):
+        posiciones = _posiciones["idx"]
+        for idx in range(_posiciones["tam"], len(libros)):
+            posiciones.setdefault(libros[idx]["codigo"], idx)
+        _posiciones["tam"] = len(libros)
+    idx = _posiciones["idx"].get(codigo, -1)
+    if idx >= 0 and libros[idx]["codigo"] == codigo:
+        return idx, libros[idx]
+    return -1, None
+
+
+@temporizadores.medir("op_prestamo")
 def op_prestamo(db: dict, payload: dict):
     codigo = payload.get("libro_codigo")
     usuario_id = payload.get("usuario_id")
     fecha_actual = payload.get("fecha_actual")
 
-    libro = find_libro(db, codigo)
+    idx, libro = find_libro_idx(db, codigo)
     if not libro:
         return db, {"ok": False, "mensaje": "Libro no existe"}
     if libro["ejemplares_disponibles"] <= 0:
         return db, {"ok": False, "mensaje": "Sin ejemplares"}
 
-    # Lógica simple préstamo
+    # Lógica simple préstamo (copy-on-write del libro)
+    libro = copiar_libro(libro)
     libro["ejemplares_disponibles"] -= 1
     libro["prestamos"].append({
         "usuario_id": usuario_id,
         "fecha_entrega": str(datetime.fromisoformat(fecha_actual).date() + timedelta(days=14)),
         "renovaciones": 0
     })
+    reemplazar_libro(db, idx, libro)
 
     incrementar_version(db)  # IMPORTANTE
     return db, {"ok": True, "mensaje": "Prestamo exitoso", "version_bd": db["version"]}
 
 
+@temporizadores.medir("op_devolucion")
 def op_devolucion(db: dict, payload: dict):
     codigo = payload.get("libro_codigo")
     usuario_id = payload.get("usuario_id")
-    libro = find_libro(db, codigo)
+    idx, libro = find_libro_idx(db, codigo)
     if not libro: return db, {"ok": False, "mensaje": "No existe"}
 
     for i, p in enumerate(libro["prestamos"]):
         if p["usuario_id"] == usuario_id:
+            libro = copiar_libro(libro)
             libro["prestamos"].pop(i)
             libro["ejemplares_disponibles"] += 1
+            reemplazar_libro(db, idx, libro)
             incrementar_version(db)  # IMPORTANTE
             return db, {"ok": True, "mensaje": "Devolucion exitosa", "version_bd": db["version"]}
 
     return db, {"ok": False, "mensaje": "No tiene prestamo"}
 
 
+@temporizadores.medir("op_renovacion")
 def op_renovacion(db: dict, payload: dict):
     codigo = payload.get("libro_codigo")
     usuario_id = payload.get("usuario_id")
-    libro = find_libro(db, codigo)
+    idx, libro = find_libro_idx(db, codigo)
     if not libro: return db, {"ok": False}
 
-    for p in libro["prestamos"]:
+    for i, p in enumerate(libro["prestamos"]):
         if p["usuario_id"] == usuario_id:
             if p["renovaciones"] >= 2:
                 return db, {"ok": False, "mensaje": "Max renovaciones"}
-            p["renovaciones"] += 1
+            libro = copiar_libro(libro)
+            libro["prestamos"][i]["renovaciones"] += 1
+            reemplazar_libro(db, idx, libro)
             incrementar_version(db)  # IMPORTANTE
             return db, {"ok": True, "mensaje": "Renovado"}
 
     return db, {"ok": False}
 
 
+@temporizadores.medir("op_ceder_cupo")
+def op_ceder_cupo(db: dict, payload: dict):
+    """Cede parte del cupo de un libro de la sede de origen a otra (rebalanceo entre sedes)"""
+    codigo = payload.get("libro_codigo")
+    origen = payload.get("sede_origen")
+    destino = payload.get("sede_destino")
+    idx, libro = find_libro_idx(db, codigo)
+    if not libro:
+        return db, {"ok": False, "mensaje": "No existe"}
+
+    cantidad = min(payload.get("cantidad", 1), disponible_local(libro, origen, SEDES))
+    if cantidad <= 0:
+        return db, {"ok": False, "mensaje": "Sin cupo para ceder"}
+
+    libro = copiar_libro(libro)
+    transf = {o: dict(d) for o, d in libro.get("cuota_transf", {}).items()}
+    destinos = transf.setdefault(str(origen), {})
+    destinos[str(destino)] = destinos.get(str(destino), 0) + cantidad
+    libro["cuota_transf"] = transf
+    reemplazar_libro(db, idx, libro)
+    incrementar_version(db)
+    return db, {"ok": True, "mensaje": "Cupo cedido", "cantidad": cantidad}
+
+
 # SINCRONIZACIÓN ENTRE SEDES
-def monitor_peer_and_sync(local_sede: int, local_bd_path: Path, peer_bd_path: Path):
+def fusionar_libros_remotos(libros) -> int:
     """
-    Hilo que escucha el heartbeat de la OTRA sede.
-    Si peer.version > local.version -> COPIAR BD del peer a local.
+    Fusiona libros de otra sede en la BD local (llamar con db_lock).
+    Solo toca los libros que traen algo nuevo; devuelve cuántos cambiaron.
     """
-    global db_in_memory
+    cambios = []
+    propio = str(sede_local)
+    vv_bd = db_in_memory.setdefault("vv", {})
+    for remoto in libros:
+        idx, local = find_libro_idx(db_in_memory, remoto["codigo"])
+        nuevo = fusionar_libro(local, remoto)
+        if nuevo is local:
+            continue
+        if local is None:
+            db_in_memory["libros"].append(nuevo)
+        else:
+            reemplazar_libro(db_in_memory, idx, nuevo)
+        # Nunca reutilizar un contador propio que otra sede ya conoce
+        vv_bd[propio] = max(vv_bd.get(propio, 0), nuevo.get("vv", {}).get(propio, 0))
+        cambios.append((local, nuevo))
+    if not cambios:
+        return 0
+    # Primero la versión: los índices (flujo de cambios) registran la versión que deja la fusión
+    incrementar_version(db_in_memory)
+    for local, nuevo in cambios:
+        if tabla_disponibilidad is not None:
+            tabla_disponibilidad.escribir(nuevo)
+        for indice in indices:
+            # El replicador no reenvía lo que llega de otra sede (volvería como eco)
+            if not getattr(indice, "solo_cambios_locales", False):
+                indice.registrar_cambio(local, nuevo)
+    if tabla_disponibilidad is not None:
+        tabla_disponibilidad.marcar_version(db_in_memory["version"])
+    return len(cambios)
 
-    peer_sede = 2 if local_sede == 1 else 1
-    if local_sede == 1:
-        peer_hb_endpoint = GA_SEDE2_HEARTBEAT_ENDPOINT
-    else:
-        peer_hb_endpoint = GA_SEDE1_HEARTBEAT_ENDPOINT
 
-    print(f"[Sync] Monitoreando a Sede {peer_sede} en {peer_hb_endpoint}")
+def recuperar_mensajes(peer_sede: int, seguimiento: SeguimientoPeer, fusionar):
+    """
+    Pide a la sede (op "replicacion") los mensajes publicados desde
+    seguimiento.continuo hasta el atraso detectado y los fusiona.
+    Devuelve la última secuencia fusionada, o None si la sede ya no los tiene.
+    """
+    desde = seguimiento.continuo
+    socket_req = create_req_socket(create_context(), endpoint_conexion(peer_sede, "ga"))
+    try:
+        recuperados = 0
+        while desde < seguimiento.atrasado:
+            socket_req.send(encode_message({"operacion": "replicacion", "payload": {
+                "sesion": seguimiento.sesion, "desde_seq": desde}}))
+            resp = decode_message(socket_req.recv())
+            if not resp.get("ok") or not resp.get("mensajes"):
+                return None
+            fusionar([libro for m in resp["mensajes"] for libro in m["libros"]], f"Sede {peer_sede} (recuperados)")
+            desde = resp["mensajes"][-1]["seq"]
+            recuperados += len(resp["mensajes"])
+        print(f"[Sync] {recuperados} mensajes perdidos de Sede {peer_sede} recuperados de su memoria")
+        return desde
+    except zmq.ZMQError as e:
+        print(f"[Sync] Sede {peer_sede} no respondió la recuperación ({e})")
+        return None
+    finally:
+        socket_req.close(linger=0)
+
 
+def monitor_peer_and_sync(local_sede: int, peers, persistir, seguimiento=None):
+    """
+    Hilo de replicación con las DEMÁS sedes:
+    - Recibe (SUB) los libros que cambian en cada sede y los fusiona libro a libro
+    - Escucha sus heartbeats: si se perdieron mensajes, se los pide a esa sede
+      (recuperar_mensajes) o, si ya no los tiene o recién arrancamos, fusiona
+      su archivo completo (la fusión es idempotente, nunca se pisa la BD local)
+    - Atiende sus pedidos de cupo cediendo lo que esta sede no está usando
+    persistir(snap): guarda el snapshot tras una fusión o una cesión.
+    seguimiento: {sede: SeguimientoPeer}, retomado del relevo si lo hubo.
+    """
     ctx = zmq.Context()
-    sub = create_sub_socket(ctx, peer_hb_endpoint, b"HEARTBEAT")
+    sub_hb = ctx.socket(zmq.SUB)
+    sub_hb.setsockopt(zmq.SUBSCRIBE, b"HEARTBEAT")
+    sub_libros = ctx.socket(zmq.SUB)
+    sub_libros.setsockopt(zmq.RCVHWM, ZMQ_HWM_REPLICACION)
+    sub_libros.setsockopt(zmq.SUBSCRIBE, TOPIC_LIBROS)
+    sub_libros.setsockopt(zmq.SUBSCRIBE, TOPIC_DEMANDA)
+    for peer_sede in peers:
+        endpoint_hb = endpoint_conexion(peer_sede, "ga_heartbeat")
+        endpoint_replicacion = endpoint_conexion(peer_sede, "ga_replicacion")
+        print(f"[Sync] Monitoreando a Sede {peer_sede} en {endpoint_hb} / {endpoint_replicacion}")
+        sub_hb.connect(endpoint_hb)
+        sub_libros.connect(endpoint_replicacion)
+    if not peers:
+        return  # sede única: no hay con quién sincronizar
 
-    while True:
-        try:
-            # Escuchamos heartbeat
-            _, raw = sub.recv_multipart()
-            msg = json.loads(raw.decode())
+    if seguimiento is None:
+        seguimiento = {peer_sede: SeguimientoPeer() for peer_sede in peers}
+    for peer_sede in peers:
+        ultimo_hb_peer[peer_sede] = time.monotonic()  # plazo de gracia al arrancar
+    poller = zmq.Poller()
+    poller.register(sub_hb, zmq.POLLIN)
+    poller.register(sub_libros, zmq.POLLIN)
 
-            peer_version = msg.get("version", -1)
+    def fusionar(libros, origen: str):
+        with db_lock:
+            cambiados = fusionar_libros_remotos(libros)
+            snap = tomar_snapshot(db_in_memory) if cambiados else None
+        if snap is not None:
+            print(f"[Sync] {cambiados} libros fusionados desde {origen}. Version local: {snap['version']}")
+            persistir(snap)
 
-            # Chequeo seguro con Lock
-            with db_lock:
-                local_version = db_in_memory.get("version", 0)
+    def ceder(peer_sede: int, pedidos: dict):
+        global db_in_memory
+        cedidos = 0
+        with db_lock:
+            for codigo, pedido in pedidos.items():
+                libro = find_libro(db_in_memory, codigo)
+                if libro is None:
+                    continue
+                # Se guarda un ejemplar si esta sede también lo está prestando
+                sobrante = disponible_local(libro, local_sede, SEDES) - (1 if demanda_cupos.prestados[codigo] else 0)
+                if sobrante <= 0:
+                    continue
+                db_in_memory, resp = aplicar_operacion(db_in_memory, tabla_disponibilidad, "ceder_cupo", {
+                    "libro_codigo": codigo, "sede_origen": local_sede, "sede_destino": peer_sede,
+                    "cantidad": min(sobrante, pedido)}, indices)
+                cedidos += resp.get("cantidad", 0)
+            snap = tomar_snapshot(db_in_memory) if cedidos else None
+        if snap is not None:
+            print(f"[Cupos] {cedidos} ejemplares de cupo cedidos a Sede {peer_sede}")
+            persistir(snap)
 
-            if peer_version > local_version:
-                print(
-                    f"[Sync] ALERTA: Mi version ({local_version}) es menor a Sede {peer_sede} ({peer_version}). Sincronizando...")
+    while True:
+        try:
+            eventos = dict(poller.poll())
 
-                # 1. Bloquear DB local
-                with db_lock:
-                    # 2. Copiar archivo físico de la otra sede a la mía
-                    # (En un sistema real esto sería transferencia de archivo por red,
-                    # aquí aprovechamos que están en el mismo FS).
-                    try:
-                        shutil.copy2(peer_bd_path, local_bd_path)
-                        print(f"[Sync] Archivo copiado de {peer_bd_path} a {local_bd_path}")
-
-                        # 3. Recargar en memoria
-                        db_in_memory = load_db(local_bd_path)
-                        print(f"[Sync] BD Recargada. Nueva version local: {db_in_memory['version']}")
-                    except Exception as e:
-                        print(f"[Sync] ERROR CRÍTICO al copiar BD: {e}")
+            with replicacion_lock:
+                if sub_libros in eventos:
+                    topic, raw = sub_libros.recv_multipart()
+                    msg = json.loads(raw.decode("utf-8"))
+                    peer_sede = msg.get("sede")
+                    if topic == TOPIC_DEMANDA:
+                        if peer_sede in seguimiento:
+                            ceder(peer_sede, msg.get("libros", {}))
+                    elif peer_sede in seguimiento:
+                        fusionar(msg.get("libros", []), f"Sede {peer_sede}")
+                        seguimiento[peer_sede].mensaje(msg.get("sesion"), msg.get("seq", 0))
 
+                if sub_hb in eventos:
+                    _, raw = sub_hb.recv_multipart()
+                    msg = json.loads(raw.decode("utf-8"))
+                    peer_sede = msg.get("sede")
+                    if peer_sede in ultimo_hb_peer:
+                        ultimo_hb_peer[peer_sede] = time.monotonic()
+                    s = seguimiento.get(peer_sede)
+                    if s is not None and s.heartbeat(msg.get("sesion"), msg.get("seq_replicacion", 0)):
+                        # Se perdieron cambios: se piden a la sede desde donde se recibió todo
+                        hasta = recuperar_mensajes(peer_sede, s, fusionar) if s.continuo is not None else None
+                        if hasta is None:
+                            # Recién arrancamos o ya no los tiene: fusión completa desde su archivo
+                            # (lo publicado hasta 'atrasado' ya está en él)
+                            hasta = s.atrasado
+                            peer_bd_path = Path(get_bd_paths_for_sede(peer_sede)["primaria"])
+                            if peer_bd_path.exists():
+                                peer_db = load_db(peer_bd_path)
+                                fusionar(peer_db.get("libros", []), f"archivo de Sede {peer_sede}")
+                        s.recuperado(hasta)
         except Exception as e:
-            # print(f"[Sync] Esperando peer... ({e})")
+            print(f"[Sync] ERROR en replicación: {e}")
             time.sleep(1)
 
+@temporizadores.medir("buscar")
+def buscar_libros(db: dict, texto: str, limite: int = 10) -> dict:
+    """Búsqueda por título/autor en el índice (llamar con db_lock). No modifica la BD"""
+    limite = max(1, min(100, int(limite)))
+    encontrados, total, truncado = indice_busqueda.buscar(str(texto or ""), limite)
+    resultados = []
+    for codigo, puntaje in encontrados:
+        libro = find_libro(db, codigo)
+        if libro:
+            resultados.append({"codigo": codigo, "titulo": libro.get("titulo"), "autor": libro.get("autor"),
+                               "disponibles": libro.get("ejemplares_disponibles", 0), "puntaje": round(puntaje, 3)})
+    return {"ok": True, "resultados": resultados, "total": total, "truncado": truncado,
+            "version_bd": db.get("version", 0)}
+
+
+def sede_caida_con_cupo(libro: dict):
+    """Sede vecina sin heartbeat reciente a la que le queda cupo libre del libro, o None"""
+    ahora = time.monotonic()
+    for peer_sede, visto in ultimo_hb_peer.items():
+        if ahora - visto > HEARTBEAT_TIMEOUT_SECONDS and disponible_local(libro, peer_sede, SEDES) > 0:
+            return peer_sede
+    return None
 
-def async_save_replica(replica_path: Path, db: dict):
-    try:
-        db_copy = json.loads(json.dumps(db))
-        t = threading.Thread(target=save_db, args=(replica_path, db_copy), daemon=True)
-        t.start()
-    except:
-        pass
+
+@temporizadores.medir("prestamos_usuario")
+def prestamos_usuario(db: dict, usuario_id: str) -> dict:
+    """Préstamos activos de un usuario desde el índice por usuario (llamar con db_lock)"""
+    prestamos = []
+    for codigo in dict.fromkeys(indice_usuarios.codigos(usuario_id)):
+        libro = find_libro(db, codigo)
+        for p in (libro or {}).get("prestamos", []):
+            if p["usuario_id"] == usuario_id:
+                prestamos.append({"libro_codigo": codigo, "titulo": libro.get("titulo"),
+                                  "fecha_entrega": p["fecha_entrega"], "renovaciones": p["renovaciones"]})
+    return {"ok": True, "usuario_id": usuario_id, "cantidad": indice_usuarios.cantidad(usuario_id),
+            "limite": indice_usuarios.limite, "prestamos": prestamos, "version_bd": db.get("version", 0)}
 
 
 # LOOP PRINCIPAL
+def actualizar_disponibilidad(tabla: TablaDisponibilidad, db: dict, codigo: str):
+    """Refleja en la tabla mapeada el libro que acaba de cambiar (llamar con db_lock)"""
+    libro = find_libro(db, codigo)
+    if libro:
+        tabla.escribir(libro)
+    tabla.marcar_version(db.get("version", 0))
+
+
+def aplicar_operacion(db: dict, tabla: TablaDisponibilidad, operacion: str, payload: dict, indices=(),
+                      id_solicitud: str = None):
+    """
+    Aplica una operación y refleja el cambio en la tabla de disponibilidad y
+    en los índices derivados (llamar con db_lock).
+    Con id_solicitud la operación se aplica una sola vez: un reintento con el
+    mismo id recibe la respuesta original (ver idempotencia.py).
+    """
+    version_antes = db.get("version", 0)
+    codigo = payload.get("libro_codigo")
+
+    if id_solicitud:
+        # Antes del rechazo rápido: el reintento de un préstamo del último ejemplar debe ver su éxito
+        original = respuesta_registrada(db, id_solicitud, find_libro(db, codigo) if operacion == "prestamo" else None)
+        if original is not None:
+            repetidas[operacion] += 1
+            return db, original
+
+    if operacion == "prestamo" and tabla.disponibles(codigo) == 0:
+        # Rechazo rápido: lectura directa de la tabla, sin buscar el libro
+        return db, {"ok": False, "mensaje": "Sin ejemplares"}
+
+    if operacion == "prestamo":
+        # Límite por usuario: cuenta en el índice por usuario (incluye lo replicado de otras sedes)
+        rechazo = indice_usuarios.rechazo(payload.get("usuario_id"))
+        if rechazo is not None:
+            return db, rechazo
+
+    # Copy-on-write: la versión anterior del libro sigue intacta tras la operación
+    libro_antes = find_libro(db, codigo) if indices or sede_local is not None else None
+
+    caida = None
+    if operacion == "prestamo" and sede_local is not None and libro_antes \
+            and disponible_local(libro_antes, sede_local, SEDES) <= 0:
+        # Quedan ejemplares, pero en el cupo de otra sede. Si esa sede está
+        # caída (no puede cederlo) se presta con su cupo; si no, se pide en el
+        # próximo rebalanceo
+        caida = sede_caida_con_cupo(libro_antes)
+        if caida is None:
+            demanda_cupos.registrar_rechazo(codigo)
+            return db, {"ok": False, "razon": "SIN_CUPO", "mensaje": "Sin cupo local, reintente en unos segundos",
+                        "reintentar_en_ms": int(GA_INTERVALO_REBALANCEO_S * 1000)}
+    if operacion == "prestamo":
+        db, respuesta = op_prestamo(db, payload)
+        if respuesta.get("ok"):
+            demanda_cupos.registrar_prestamo(codigo)
+            if caida is not None:
+                tomar_cupo(find_libro(db, codigo), sede_local, caida)  # copia recién creada
+                cupos_tomados[caida] += 1
+    elif operacion == "devolucion":
+        db, respuesta = op_devolucion(db, payload)
+    elif operacion == "renovacion":
+        db, respuesta = op_renovacion(db, payload)
+    elif operacion == "ceder_cupo":
+        db, respuesta = op_ceder_cupo(db, payload)
+    else:
+        return db, {"ok": False, "mensaje": "Op desconocida"}
+
+    if db.get("version", 0) != version_antes:
+        libro_despues = find_libro(db, codigo)
+        if id_solicitud:
+            registrar_respuesta(db, id_solicitud, respuesta)
+            if operacion == "prestamo":
+                libro_despues["prestamos"][-1]["id_solicitud"] = id_solicitud  # copia recién creada
+        if sede_local is not None:
+            sellar_cambio(db, sede_local, libro_antes, libro_despues)
+        actualizar_disponibilidad(tabla, db, codigo)
+        for indice in indices:
+            indice.registrar_cambio(libro_antes, libro_despues)
+    return db, respuesta
+
+
+def aplicar_importacion(db: dict, tabla: TablaDisponibilidad, filas: list, indices=(), id_solicitud: str = None):
+    """
+    Upsert de un bloque del catálogo (importacion.py --en-vivo), llamar con db_lock.
+    Todo el bloque queda en una sola versión nueva; cada libro que cambia se
+    sella y se replica como cualquier otro cambio local.
+    """
+    if id_solicitud:
+        original = respuesta_registrada(db, id_solicitud)
+        if original is not None:
+            repetidas["importar"] += 1
+            return db, original
+
+    contadores = Counter()
+    cambios = []
+    vistos = set()
+    for fila in filas:
+        try:
+            fila = normalizar_fila(fila)
+        except (ValueError, TypeError, AttributeError):
+            contadores["invalidas"] += 1
+            continue
+        if fila["codigo"] in vistos:
+            contadores["repetidos"] += 1
+            continue
+        vistos.add(fila["codigo"])
+        idx, libro = find_libro_idx(db, fila["codigo"])
+        if libro is None:
+            nuevo = libro_nuevo(fila)
+            db["libros"].append(nuevo)
+            contadores["insertados"] += 1
+        else:
+            nuevo = actualizar_libro(libro, fila)
+            if nuevo is libro:
+                contadores["sin_cambios"] += 1
+                continue
+            reemplazar_libro(db, idx, nuevo)
+            contadores["actualizados"] += 1
+        cambios.append((libro, nuevo))
+
+    if cambios:
+        incrementar_version(db)
+        for libro_antes, libro_despues in cambios:
+            if sede_local is not None:
+                sellar_cambio(db, sede_local, libro_antes, libro_despues)
+            tabla.escribir(libro_despues)
+            for indice in indices:
+                indice.registrar_cambio(libro_antes, libro_despues)
+        tabla.marcar_version(db["version"])
+    respuesta = dict(contadores, ok=True, version_bd=db.get("version", 0))
+    if cambios and id_solicitud:
+        registrar_respuesta(db, id_solicitud, respuesta)
+    return db, respuesta
+
+
+def cargar_estado(sede: int, paths: dict, peers=()) -> str:
+    """
+    Carga la BD local, la tabla de disponibilidad y los índices derivados
+    (estado global del GA). Devuelve el origen de la BD cargada.
+    """
+    global db_in_memory, tabla_disponibilidad
+    primaria = Path(paths["primaria"])
+    replica = Path(paths["replica"])
+    snapshot_bin = Path(paths["snapshot"])
+
+    # Cargar BD inicial: snapshot binario (perezoso) si está al día, si no JSON;
+    # cada copia se verifica con su suma y una dañada se salta
+    with db_lock:
+        db_in_memory, origen = cargar_bd_local(sede, primaria, replica, snapshot_bin)
+        if db_in_memory is None:
+            # Ninguna copia local sirve: se apartan y se parte de una sede vecina (o del catálogo generado)
+            print(f"[GA Sede {sede}] Sin copias locales válidas: se inicializa como sede nueva")
+            for path in (primaria, replica, snapshot_bin):
+                if path.exists():
+                    path.replace(path.with_name(path.name + ".danado"))
+            ensure_initial_data(primaria, snapshot_bin, [get_bd_paths_for_sede(p)["primaria"] for p in peers])
+            db_in_memory, origen = load_db(primaria), "JSON"
+        elif origen not in ("JSON", "snapshot binario"):
+            save_db(primaria, db_in_memory)  # la primaria dañada se reemplaza por la copia usada
+
+    # Tabla de disponibilidad: se reutiliza si refleja la misma versión de la BD
+    with db_lock:
+        tabla_disponibilidad = TablaDisponibilidad(paths["disponibilidad"])
+        if tabla_disponibilidad.version != db_in_memory.get("version", 0):
+            tabla_disponibilidad.reconstruir(db_in_memory)
+
+    # Índices derivados (vencimientos, ...) se arman en memoria a partir de la BD
+    with db_lock:
+        for indice in indices:
+            indice.reconstruir(db_in_memory)
+        indice_vencimientos.cargar_notificados(paths["vencimientos"])
+        # Respuestas de solicitudes ya aplicadas (persistidas con la BD)
+        tabla_de(db_in_memory)
+    return origen
+
+
 def run_ga(sede: int):
-    global db_in_memory
+    global db_in_memory, tabla_disponibilidad, sede_local
+    sede_local = sede
+    muestreador = instalar_senal_perfil(f"ga-sede{sede}")
 
     paths = get_bd_paths_for_sede(sede)
     primaria = Path(paths["primaria"])
     replica = Path(paths["replica"])
+    snapshot_bin = Path(paths["snapshot"])
 
-    # Rutas para sincronización (necesitamos saber donde está la BD del vecino)
-    other_sede = 2 if sede == 1 else 1
-    other_paths = get_bd_paths_for_sede(other_sede)
-    peer_primaria = Path(other_paths["primaria"])
+    # Sedes vecinas para sincronización (sus BD se ubican con get_bd_paths_for_sede)
+    peers = get_peers(sede)
 
-    ensure_initial_data(primaria)
+    if CATALOGO_INICIAL and not primaria.exists() and not snapshot_bin.exists():
+        print(f"[GA Sede {sede}] Importando catálogo inicial desde {CATALOGO_INICIAL} ...")
+        importar_offline(sede, Path(CATALOGO_INICIAL))
+    ensure_initial_data(primaria, snapshot_bin, [get_bd_paths_for_sede(p)["primaria"] for p in peers])
 
-    # Cargar BD inicial
-    with db_lock:
-        try:
-            db_in_memory = load_db(primaria)
-        except:
-            db_in_memory = load_db(replica)
-            save_db(primaria, db_in_memory)
+    t_carga = time.time()
+    origen = cargar_estado(sede, paths, peers)
+    desde_binario = origen.startswith("snapshot binario")
+    print(f"[GA Sede {sede}] BD Cargada desde {origen} en {(time.time() - t_carga) * 1000:.1f} ms. "
+          f"Version: {db_in_memory.get('version', 0)}")
 
-    print(f"[GA Sede {sede}] BD Cargada. Version: {db_in_memory.get('version', 0)}")
+    # Configurar endpoints (TCP de la topología + ipc/inproc según TRANSPORTE)
+    endpoint = endpoints_bind(sede, "ga")
+    hb_endpoint = endpoints_bind(sede, "ga_heartbeat")
+    vencimientos_endpoint = endpoints_bind(sede, "ga_vencimientos")
 
-    # Configurar endpoints
-    if sede == 1:
-        endpoint = GA_SEDE1_ENDPOINT
-        hb_endpoint = GA_SEDE1_HEARTBEAT_ENDPOINT
-    else:
-        endpoint = GA_SEDE2_ENDPOINT
-        hb_endpoint = GA_SEDE2_HEARTBEAT_ENDPOINT
+    # Relevo en caliente del GA anterior (terminó drenado con esta misma versión)
+    relevo = tomar_relevo(Path(paths["relevo"]), db_in_memory.get("version", 0))
+    seguimiento = {peer_sede: SeguimientoPeer() for peer_sede in peers}
 
-    # Callback para el Heartbeat: entregar versión actual
+    # Replicación: publica cada libro que cambia (se registra como un índice más)
+    replicador = Replicador(endpoints_bind(sede, "ga_replicacion"), sede)
+    if relevo:
+        replicador.sesion, replicador.seq = relevo["sesion"], relevo["seq"]
+        for peer, estado in relevo["peers"].items():
+            if int(peer) in seguimiento:
+                seguimiento[int(peer)].retomar(estado["sesion"], estado["continuo"])
+        print(f"[GA Sede {sede}] Relevo en caliente: replicación retomada en seq {replicador.seq}, "
+              f"{len(relevo['peers'])} sedes sin fusión completa")
+    indices.append(replicador.start())
+
+    # Flujo de cambios (CDC): un registro por libro que cambia, por PUB y en bd/cambios_sedeN.jsonl
+    flujo_cambios = FlujoCambios(paths["cambios"], endpoints_bind(sede, "ga_cdc"), sede,
+                                 lambda: db_in_memory.get("version", 0), db_lock)
+    with db_lock:
+        flujo_cambios.abrir(db_in_memory.get("version", 0))
+    indices.append(flujo_cambios.start())
+
+    # Callback para el Heartbeat: entregar versión actual y última secuencia de replicación
     def get_ga_status():
         with db_lock:
             v = db_in_memory.get("version", 0)
-        return {"version": v, "estado": "OK"}
+        # "DRENANDO": el GC y los actores pasan los préstamos al respaldo sin esperar timeouts
+        return {"version": v, "estado": "DRENANDO" if drenando.is_set() else "OK",
+                "sesion": replicador.sesion, "seq_replicacion": replicador.seq}
 
     # 1. Iniciar Heartbeat Emisor (dice "estoy vivo y esta es mi version")
-    start_ga_heartbeat(hb_endpoint, sede, get_ga_status, interval=1.0)
+    # Ajustes en caliente (socket de administración, ver comun/administracion.py)
+    ajustes = Ajustes(
+        intervalo_heartbeat_s=1.0,
+        intervalo_rebalanceo_s=GA_INTERVALO_REBALANCEO_S,
+        intervalo_vencimientos_s=GA_INTERVALO_VENCIMIENTOS_S,
+    )
+    ajustes.definir("log_versiones", GA_LOG_VERSIONES, al_cambiar=_fijar_log_versiones)
+    ajustes.definir("max_prestamos_usuario", indice_usuarios.limite,
+                    al_cambiar=lambda v: setattr(indice_usuarios, "limite", v))
+    pausado = threading.Event()
+    drenando = threading.Event()
+
+    start_ga_heartbeat(hb_endpoint, sede, get_ga_status, interval=lambda: ajustes["intervalo_heartbeat_s"])
+
+    # 1b. Reporte al servicio de membresía (vida, versión y carga en una sola vista)
+    medidor = MedidorCarga()
+    if MEMBRESIA_HABILITADA:
+        iniciar_reporte_membresia("ga", sede, lambda: dict(get_ga_status(), carga=medidor.tasa()))
+
+    # 1c. Rebalanceo de cupos: pedir a las demás sedes cupo para los libros que faltó
+    def pedir_cupos():
+        while True:
+            time.sleep(ajustes["intervalo_rebalanceo_s"])
+            with db_lock:
+                rechazos = demanda_cupos.tomar()
+            if rechazos:
+                replicador.enviar_demanda(rechazos)
+
+    threading.Thread(target=pedir_cupos, daemon=True).start()
 
-    # 2. Iniciar Monitor de Sincronización (escucha al vecino y se actualiza si es necesario)
+    # 2. Barrido periódico de préstamos vencidos (reporte incremental + notificaciones PUB)
+    start_barrido_vencimientos(indice_vencimientos, db_lock, paths["vencimientos"],
+                               vencimientos_endpoint, TOPIC_VENCIDO, lambda: ajustes["intervalo_vencimientos_s"])
+
+    # 3. Escritor de réplica en segundo plano (recibe snapshots, no copias profundas)
+    escritor_replica = EscritorSnapshots(replica, save_db)
+    escritor_replica.start()
+    escritor_binario = EscritorSnapshots(snapshot_bin, escribir_snapshot_binario)
+    escritor_binario.start()
+    if not desde_binario:
+        with db_lock:
+            escritor_binario.entregar(tomar_snapshot(db_in_memory))
+
+    def persistir(snap: dict):
+        guardar_primaria(primaria, snap)
+        escritor_replica.entregar(snap)
+        escritor_binario.entregar(snap)
+
+    # 3b. Replicación con las demás sedes (fusiona libro a libro lo que cambia en ellas)
     t_sync = threading.Thread(
         target=monitor_peer_and_sync,
-        args=(sede, primaria, peer_primaria),
+        args=(sede, peers, persistir, seguimiento),
         daemon=True
     )
     t_sync.start()
 
-    # 3. Iniciar Servidor de Peticiones (REQ/REP)
+    # 3c. Administración: estado, ajustes y órdenes sin reiniciar
+    def estado_admin():
+        with db_lock:
+            estado = {"version": db_in_memory.get("version", 0), "libros": len(db_in_memory.get("libros", [])),
+                      "vencidos": indice_vencimientos.total_vencidos(),
+                      "busqueda": indice_busqueda.memoria(), "prestamos_usuario": indice_usuarios.memoria(),
+                      "solicitudes_recordadas": len(tabla_de(db_in_memory)), "repetidas": dict(repetidas),
+                      "cupos_tomados": dict(cupos_tomados)}
+        estado.update(pausado=pausado.is_set(), drenando=drenando.is_set(), drenado=drenado(),
+                      operaciones=medidor.total,
+                      seq_replicacion=replicador.seq, cola_replicacion=replicador.cola.qsize(),
+                      seq_cdc=flujo_cambios.seq, cola_cdc=len(flujo_cambios.pendientes))
+        return estado
+
+    def forzar_snapshot(msg):
+        with db_lock:
+            snap = tomar_snapshot(db_in_memory)
+        persistir(snap)
+        return {"version": snap.get("version", 0)}
+
+    def pausar(msg):
+        pausado.set()
+        return {"pausado": True}
+
+    def reanudar(msg):
+        pausado.clear()
+        drenando.clear()
+        return {"pausado": False}
+
+    # Drenaje (reinicio sin corte, ver comun/despliegue.py): no se acepta nada
+    # nuevo, lo que está en curso termina y se persiste todo; después "terminar"
+    def drenado() -> bool:
+        with db_lock:
+            version = db_in_memory.get("version", 0)
+            cdc_pendiente = bool(flujo_cambios.pendientes)
+        return (drenando.is_set() and version_primaria >= version and escritor_replica.al_dia(version)
+                and escritor_binario.al_dia(version) and replicador.cola.empty() and not cdc_pendiente)
+
+    def drenar(msg):
+        drenando.set()
+        # Se reescriben primaria, réplica y snapshot binario con la versión actual
+        return forzar_snapshot(msg)
+
+    def terminar(msg):
+        if not drenado() and not msg.get("forzar"):
+            raise ValueError("El GA no está drenado: 'drenar' y esperar 'drenado' en estado")
+        # No se fusiona nada más de las otras sedes (el lock no se suelta: el proceso
+        # termina); lo que publiquen desde aquí el GA nuevo se lo pide con el relevo
+        replicacion_lock.acquire()
+        relevar = False
+        for _ in range(50 if drenando.is_set() else 0):
+            relevar = drenado()  # la última fusión puede estar escribiéndose todavía
+            if relevar:
+                break
+            time.sleep(0.1)
+        with db_lock:
+            version = db_in_memory.get("version", 0)
+        if relevar:
+            escribir_relevo(Path(paths["relevo"]), version, replicador, seguimiento)
+        print(f"[GA Sede {sede}] Terminando (versión {version})")
+        # Un segundo para responder y que ZMQ entregue lo último publicado
+        threading.Timer(1.0, os._exit, (0,)).start()
+        return {"version": version}
+
+    ServidorAdmin("ga", sede, ajustes, estado_admin, muestreador) \
+        .comando("snapshot", forzar_snapshot).comando("pausar", pausar).comando("reanudar", reanudar) \
+        .comando("drenar", drenar).comando("terminar", terminar).start()
+
+    # 4. Iniciar Servidor de Peticiones (REQ/REP)
     context = create_context()
     socket_rep = create_rep_socket(context, endpoint)
-    print(f"[GA Sede {sede}] Listo para peticiones en {endpoint}")
+    print(f"[GA Sede {sede}] Listo para peticiones en {', '.join(endpoint)}")
 
     while True:
         raw = socket_rep.recv()
@@ -259,6 +929,55 @@ def run_ga(sede: int):
 
         operacion = msg.get("operacion")
         payload = msg.get("payload", {}) or {}
+        id_solicitud = msg.get("id_solicitud")
+        medidor.registrar()
+
+        if operacion == "replicacion":
+            # Mensajes de replicación que otra sede perdió (recuperar_mensajes): no toca la BD
+            try:
+                respuesta = replicador.leer(payload.get("sesion"), int(payload.get("desde_seq", 0)),
+                                            int(payload.get("maximo", 50)))
+            except (ValueError, TypeError) as e:
+                respuesta = {"ok": False, "mensaje": f"Consulta de replicación inválida: {e}"}
+            socket_rep.send(encode_message(respuesta))
+            continue
+
+        if operacion == "cambios":
+            # Lectura del flujo de cambios (cdc.py): no toca la BD, se atiende también en pausa
+            try:
+                respuesta = flujo_cambios.leer(payload.get("desde_seq"), payload.get("desde_version"),
+                                               payload.get("maximo", 1000))
+            except (ValueError, TypeError) as e:
+                respuesta = {"ok": False, "mensaje": f"Consulta de cambios inválida: {e}"}
+            socket_rep.send(encode_message(respuesta))
+            continue
+
+        if operacion in OPERACIONES_CONSULTA:
+            # Consultas (búsqueda, préstamos de un usuario, disponibilidad): solo lectura, se atienden también en pausa
+            try:
+                with db_lock:
+                    if operacion == "buscar":
+                        respuesta = buscar_libros(db_in_memory, payload.get("texto"), payload.get("limite", 10))
+                    elif operacion == "disponibilidad":
+                        respuesta = respuesta_disponibilidad(tabla_disponibilidad, payload.get("libro_codigo"))
+                    else:
+                        respuesta = prestamos_usuario(db_in_memory, payload.get("usuario_id"))
+            except (ValueError, TypeError) as e:
+                respuesta = {"ok": False, "mensaje": f"Consulta inválida: {e}"}
+            socket_rep.send(encode_message(respuesta))
+            continue
+
+        if drenando.is_set():
+            # Drenando: el actor de préstamos pasa al respaldo, los de devolución/renovación reintentan
+            socket_rep.send(encode_message({"ok": False, "razon": "DRENANDO", "mensaje": "GA en drenaje",
+                                            "reintentar_en_ms": 1000}))
+            continue
+
+        if pausado.is_set():
+            # En pausa no se aplica nada: el cliente reintenta (PS: razón OCUPADO)
+            socket_rep.send(encode_message({"ok": False, "razon": "OCUPADO", "mensaje": "GA en pausa",
+                                            "reintentar_en_ms": 500}))
+            continue
 
         respuesta = {}
 
@@ -266,25 +985,40 @@ def run_ga(sede: int):
         with db_lock:
             # Si estamos muy desactualizados, podríamos rechazar peticiones,
             # pero el hilo de sync lo arreglará rápido.
+            version_antes = db_in_memory.get("version", 0)
 
-            if operacion == "prestamo":
-                db_in_memory, respuesta = op_prestamo(db_in_memory, payload)
-            elif operacion == "devolucion":
-                db_in_memory, respuesta = op_devolucion(db_in_memory, payload)
-            elif operacion == "renovacion":
-                db_in_memory, respuesta = op_renovacion(db_in_memory, payload)
+            if operacion == "lote":
+                # Varias operaciones bajo un solo lock y una sola escritura a disco
+                resultados = []
+                for item in payload.get("items", []):
+                    db_in_memory, r = aplicar_operacion(
+                        db_in_memory, tabla_disponibilidad, item.get("operacion"), item.get("payload", {}) or {},
+                        indices, item.get("id_solicitud"))
+                    resultados.append(r)
+                respuesta = {"ok": True, "resultados": resultados}
+            elif operacion == "importar":
+                # Bloque de una importación de catálogo en vivo (importacion.py --en-vivo)
+                db_in_memory, respuesta = aplicar_importacion(db_in_memory, tabla_disponibilidad,
+                                                              payload.get("libros", []), indices, id_solicitud)
             else:
-                respuesta = {"ok": False, "mensaje": "Op desconocida"}
+                db_in_memory, respuesta = aplicar_operacion(db_in_memory, tabla_disponibilidad, operacion, payload,
+                                                            indices, id_solicitud)
+
+            snap = None
+            if db_in_memory.get("version", 0) != version_antes:
+                # Snapshot O(raíz): los libros se comparten, no se copian
+                snap = tomar_snapshot(db_in_memory)
 
-            # Guardar cambios
-            save_db(primaria, db_in_memory)
-            async_save_replica(replica, db_in_memory)
+        # Guardar cambios fuera del lock: heartbeat y sync no esperan la serialización.
+        # Si la operación no modificó la BD no hay nada que persistir.
+        if snap is not None:
+            persistir(snap)
 
         socket_rep.send(encode_message(respuesta))
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--sede", type=int, required=True)
+    parser.add_argument("--sede", type=int, choices=SEDES, required=True)
     args = parser.parse_args()
     run_ga(args.sede)
\ No newline at end of file
@@ -3,16 +3,18 @@ import time
 import json
 import threading
 import zmq
+from comun.zeromq_utils import bind_endpoints
 
 
-def start_ga_heartbeat(endpoint: str, sede: int, data_callback, interval: float = 1.0):
+def start_ga_heartbeat(endpoint, sede: int, data_callback, interval=1.0):
     """
     Inicia un hilo que publica heartbeats.
     data_callback: función que debe devolver un dict con {'version': int, 'estado': str}
+    interval: segundos, o función que los devuelve (ajustable en caliente)
     """
-    ctx = zmq.Context()
+    ctx = zmq.Context.instance()
     socket_pub = ctx.socket(zmq.PUB)
-    socket_pub.bind(endpoint)
+    bind_endpoints(socket_pub, endpoint)
 
     def run():
         while True:
@@ -33,7 +35,7 @@ def start_ga_heartbeat(endpoint: str, sede: int, data_callback, interval: float
             except Exception as e:
                 print(f"[Heartbeat] Error enviando: {e}")
 
-            time.sleep(interval)
+            time.sleep(interval() if callable(interval) else interval)
 
     hilo = threading.Thread(target=run, daemon=True)
     hilo.start()
\ No newline at end of file
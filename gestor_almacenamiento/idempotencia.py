@@ -0,0 +1,91 @@
+# gestor_almacenamiento/idempotencia.py
+from comun.config import GA_MAX_SOLICITUDES
+
+# OPERACIONES EXACTAMENTE UNA VEZ
+# Cada solicitud lleva un "id_solicitud" (lo pone el PS, o el GC si el cliente
+# no lo manda) que se repite igual en todos los reintentos: reconexión del PS,
+# Lazy Pirate del GC, paso del actor al GA de respaldo y reintento infinito de
+# los actores de devolución/renovación.
+# El GA guarda en db["solicitudes"] la respuesta de las últimas
+# GA_MAX_SOLICITUDES operaciones que cambiaron la BD (se persiste con ella):
+# un id repetido recibe la respuesta original sin aplicar nada otra vez.
+# Cada préstamo guarda además su id en el registro del préstamo, que viaja con
+# la replicación: el GA de respaldo reconoce un préstamo que ya aplicó otra sede.
+
+TAM_BLOQUE = 256
+
+
+class TablaSolicitudes:
+    """
+    id_solicitud -> respuesta, acotada: al pasarse del máximo se descartan las
+    más viejas (por bloques). Los bloques llenos no se modifican más, así una
+    copia para snapshot comparte casi todo (ver tomar_snapshot).
+    """
+    def __init__(self, entradas=None, maximo: int = GA_MAX_SOLICITUDES):
+        self.maximo = maximo
+        self.bloques = []  # dicts llenos (inmutables), del más viejo al más nuevo
+        self.actual = {}
+        self.total = 0
+        for id_solicitud, respuesta in (entradas or {}).items():
+            self.registrar(id_solicitud, respuesta)
+
+    def __len__(self):
+        return self.total
+
+    def obtener(self, id_solicitud: str):
+        respuesta = self.actual.get(id_solicitud)
+        if respuesta is not None:
+            return respuesta
+        for bloque in reversed(self.bloques):
+            respuesta = bloque.get(id_solicitud)
+            if respuesta is not None:
+                return respuesta
+        return None
+
+    def registrar(self, id_solicitud: str, respuesta: dict):
+        self.actual[id_solicitud] = respuesta
+        self.total += 1
+        if len(self.actual) >= TAM_BLOQUE:
+            self.bloques.append(self.actual)
+            self.actual = {}
+        while self.bloques and self.total - len(self.bloques[0]) >= self.maximo:
+            self.total -= len(self.bloques.pop(0))
+
+    def copiar(self):
+        """Copia O(bloques) para snapshots: los bloques llenos se comparten"""
+        copia = TablaSolicitudes(maximo=self.maximo)
+        copia.bloques = list(self.bloques)
+        copia.actual = dict(self.actual)
+        copia.total = self.total
+        return copia
+
+    def como_dict(self) -> dict:
+        """Forma serializable (JSON): del más viejo al más nuevo"""
+        entradas = {}
+        for bloque in self.bloques:
+            entradas.update(bloque)
+        entradas.update(self.actual)
+        return entradas
+
+
+def tabla_de(db: dict) -> TablaSolicitudes:
+    """Tabla de solicitudes de la BD; la crea a partir de lo persistido (dict) si hace falta"""
+    tabla = db.get("solicitudes")
+    if not isinstance(tabla, TablaSolicitudes):
+        tabla = db["solicitudes"] = TablaSolicitudes(tabla)
+    return tabla
+
+
+def respuesta_registrada(db: dict, id_solicitud: str, libro: dict = None):
+    """Respuesta original de una solicitud ya aplicada, o None si es nueva"""
+    respuesta = tabla_de(db).obtener(id_solicitud)
+    if respuesta is not None:
+        return respuesta
+    # Préstamo aplicado en otra sede (failover del actor) que llegó por replicación
+    if libro is not None and any(p.get("id_solicitud") == id_solicitud for p in libro.get("prestamos", [])):
+        return {"ok": True, "mensaje": "Prestamo exitoso", "version_bd": db.get("version", 0)}
+    return None
+
+
+def registrar_respuesta(db: dict, id_solicitud: str, respuesta: dict):
+    tabla_de(db).registrar(id_solicitud, respuesta)
@@ -0,0 +1,336 @@
+# gestor_almacenamiento/importacion.py
+"""
+Importación de catálogos grandes (CSV o JSON-lines) en streaming.
+
+Columnas/campos: codigo, titulo, autor, ejemplares_totales y opcionalmente
+ejemplares_disponibles (por defecto = totales). Un código que ya existe se
+actualiza conservando sus préstamos; uno nuevo se agrega.
+
+- Con el GA detenido: arma directamente la BD de la sede (JSON primaria y
+  réplica, snapshot binario y tabla de disponibilidad) fila a fila, sin
+  cargar el catálogo en memoria: solo se guardan offsets y claves.
+- Con el GA en marcha (--en-vivo): envía bloques de filas al GA (operación
+  "importar"); cada bloque se aplica bajo un solo lock y una sola versión, y
+  lleva id_solicitud: reenviarlo tras un timeout no lo aplica dos veces.
+
+Uso:
+  python -m gestor_almacenamiento.importacion --sede 1 --archivo catalogo.csv
+  python -m gestor_almacenamiento.importacion --sede 1 --archivo cambios.jsonl --en-vivo --bloque 500
+"""
+import argparse
+import csv
+import json
+import time
+import zmq
+from collections import Counter
+from pathlib import Path
+
+from comun.config import SEDES, get_bd_paths_for_sede, endpoint_conexion, PS_TIMEOUT_LOTE_MS
+from comun.zeromq_utils import create_context, create_req_socket, encode_message, safe_recv, GeneradorIds
+from comun.administracion import enviar_comando
+from gestor_almacenamiento.cuotas import reparto_inicial
+from gestor_almacenamiento.snapshot import copiar_libro
+from gestor_almacenamiento.replicacion import sellar_cambio
+from gestor_almacenamiento.tabla_disponibilidad import TablaDisponibilidad
+from gestor_almacenamiento.persistencia import (
+    cerrar_json,
+    leer_json,
+    ruta_temporal,
+    sincronizar,
+    reemplazar,
+    copiar_atomico,
+)
+from gestor_almacenamiento.formato_binario import (
+    EscritorSnapshotBinario,
+    SnapshotBinario,
+    LARGO_CODIGO,
+    registro_json,
+    valores_disponibilidad,
+    snapshot_vigente,
+    a_json,
+)
+
+TAM_BLOQUE = 10000
+TAM_BLOQUE_EN_VIVO = 1000
+MAX_REINTENTOS = 5
+
+
+# FILAS DEL CATÁLOGO
+def normalizar_fila(fila: dict) -> dict:
+    """Fila validada con los tipos del GA; ValueError si no sirve"""
+    codigo = str(fila.get("codigo") or "").strip()
+    if not codigo or len(codigo.encode("utf-8")) > LARGO_CODIGO:
+        raise ValueError(f"Código inválido: {codigo!r}")
+    totales = int(fila.get("ejemplares_totales") or 0)
+    if totales < 0:
+        raise ValueError(f"Ejemplares negativos en {codigo}")
+    disponibles = fila.get("ejemplares_disponibles")
+    return {
+        "codigo": codigo,
+        "titulo": str(fila.get("titulo") or "").strip(),
+        "autor": str(fila.get("autor") or "").strip(),
+        "ejemplares_totales": totales,
+        "ejemplares_disponibles": totales if disponibles in (None, "") else int(disponibles),
+    }
+
+
+def leer_catalogo(path: Path, formato: str = None, contadores: Counter = None):
+    """Genera las filas válidas de un CSV o JSON-lines, una a una (cuenta las inválidas)"""
+    path = Path(path)
+    formato = formato or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+    contadores = contadores if contadores is not None else Counter()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        filas = csv.DictReader(f) if formato == "csv" else (json.loads(l) for l in f if l.strip())
+        while True:
+            try:
+                fila = next(filas)
+            except StopIteration:
+                return
+            except ValueError:
+                contadores["invalidas"] += 1  # línea JSON rota
+                continue
+            try:
+                yield normalizar_fila(fila)
+            except (ValueError, TypeError, AttributeError):
+                contadores["invalidas"] += 1
+
+
+def en_bloques(filas, tam: int):
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= tam:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def libro_nuevo(fila: dict) -> dict:
+    return {
+        "codigo": fila["codigo"],
+        "titulo": fila["titulo"],
+        "autor": fila["autor"],
+        "ejemplares_totales": fila["ejemplares_totales"],
+        "ejemplares_disponibles": fila["ejemplares_disponibles"],
+        "prestamos": [],
+    }
+
+
+def actualizar_libro(libro: dict, fila: dict) -> dict:
+    """
+    Nueva versión (copy-on-write) de un libro existente con los datos de la fila,
+    o el mismo libro si no cambia nada. Los préstamos se conservan: un cambio de
+    ejemplares_totales mueve los disponibles (y el reparto de cupos) en la diferencia.
+    """
+    delta = fila["ejemplares_totales"] - libro.get("ejemplares_totales", 0)
+    if not delta and libro.get("titulo") == fila["titulo"] and libro.get("autor") == fila["autor"]:
+        return libro
+    nuevo = copiar_libro(libro)
+    nuevo["titulo"] = fila["titulo"]
+    nuevo["autor"] = fila["autor"]
+    if delta:
+        nuevo["ejemplares_totales"] = fila["ejemplares_totales"]
+        nuevo["ejemplares_disponibles"] = nuevo.get("ejemplares_disponibles", 0) + delta
+        if "base_disponibles" in nuevo:
+            nuevo["base_disponibles"] += delta
+        if "cuota_inicial" in nuevo:
+            nuevo["cuota_inicial"] = reparto_inicial(nuevo, SEDES)
+    return nuevo
+
+
+def reportar(etiqueta: str, contadores: Counter, t0: float):
+    filas = contadores["insertados"] + contadores["actualizados"] + contadores["sin_cambios"]
+    duracion = time.perf_counter() - t0
+    print(f"[Importación] {etiqueta}: {filas} filas en {duracion:.1f} s ({filas / max(duracion, 1e-9):,.0f} filas/s)"
+          f" | nuevos {contadores['insertados']} | actualizados {contadores['actualizados']}"
+          f" | sin cambios {contadores['sin_cambios']} | repetidos {contadores['repetidos']}"
+          f" | inválidas {contadores['invalidas']}")
+
+
+# IMPORTACIÓN CON EL GA DETENIDO
+class _CatalogoJSON:
+    """Catálogo existente en JSON con la interfaz de lectura de SnapshotBinario"""
+    def __init__(self, db: dict):
+        self.db = db
+        self.libros = db.get("libros", [])
+        self.version = db.get("version", 0)
+        self.n = len(self.libros)
+        self.posiciones = {libro["codigo"]: i for i, libro in enumerate(self.libros)}
+
+    def extra(self) -> dict:
+        return {k: v for k, v in self.db.items() if k not in ("version", "libros")}
+
+    def buscar(self, codigo: str) -> int:
+        return self.posiciones.get(codigo, -1)
+
+    def registro(self, i: int) -> dict:
+        return self.libros[i]
+
+    def crudo(self, i: int) -> bytes:
+        return registro_json(self.libros[i])
+
+
+def _abrir_existente(paths: dict):
+    """Catálogo actual de la sede: snapshot binario (sin decodificar nada) si está al día, si no JSON"""
+    if snapshot_vigente(paths["snapshot"], paths["primaria"]):
+        return SnapshotBinario(paths["snapshot"])
+    for path in (paths["primaria"], paths["replica"]):
+        if not Path(path).exists():
+            continue
+        try:
+            return _CatalogoJSON(leer_json(path))
+        except ValueError as e:
+            print(f"[Importación] {path} ilegible ({e}), probando el siguiente")
+    if Path(paths["snapshot"]).exists():
+        return SnapshotBinario(paths["snapshot"])
+    return _CatalogoJSON({"version": 0, "libros": []})
+
+
+def importar_offline(sede: int, archivo: Path, formato: str = None, tam_bloque: int = TAM_BLOQUE) -> Counter:
+    """
+    Fusiona el archivo con el catálogo de la sede y reescribe su BD (el GA debe
+    estar detenido). Primero las filas importadas y luego los libros que no
+    venían en el archivo, copiados tal cual.
+    """
+    paths = get_bd_paths_for_sede(sede)
+    primaria, snapshot = Path(paths["primaria"]), Path(paths["snapshot"])
+    existente = _abrir_existente(paths)
+    extra = existente.extra()
+    version = existente.version + 1
+    contadores = Counter()
+    visto = bytearray(existente.n)
+    nuevos = set()  # códigos nuevos ya escritos (para ignorar repetidos del archivo)
+    t0 = time.perf_counter()
+
+    escritor = EscritorSnapshotBinario(snapshot)
+    tabla_tmp = Path(str(paths["disponibilidad"]) + ".tmp")
+    tabla_tmp.unlink(missing_ok=True)
+    tabla = TablaDisponibilidad(tabla_tmp)
+    json_tmp = ruta_temporal(primaria)
+    primaria.parent.mkdir(exist_ok=True, parents=True)
+    f_json = open(json_tmp, "wb", buffering=1 << 20)
+    # La versión primero (ver persistencia.version_json) y luego los libros:
+    # las demás claves (vv, ...) cambian durante la importación
+    f_json.write(f'{{"version": {version}, "libros": [\n'.encode("ascii"))
+    estado = {"primero": True}
+
+    def emitir(codigo: str, raw: bytes, libro: dict):
+        escritor.agregar(codigo, raw, valores_disponibilidad(libro))
+        tabla.escribir(libro)
+        f_json.write(raw if estado["primero"] else b",\n" + raw)
+        estado["primero"] = False
+
+    try:
+        for bloque in en_bloques(leer_catalogo(archivo, formato, contadores), tam_bloque):
+            for fila in bloque:
+                codigo = fila["codigo"]
+                idx = existente.buscar(codigo)
+                if (idx >= 0 and visto[idx]) or codigo in nuevos:
+                    contadores["repetidos"] += 1  # vale la primera aparición
+                    continue
+                if idx >= 0:
+                    visto[idx] = 1
+                    antes = existente.registro(idx)
+                    libro = actualizar_libro(antes, fila)
+                    if libro is antes:
+                        contadores["sin_cambios"] += 1
+                        emitir(codigo, existente.crudo(idx), libro)
+                        continue
+                    contadores["actualizados"] += 1
+                else:
+                    antes = None
+                    nuevos.add(codigo)
+                    libro = libro_nuevo(fila)
+                    contadores["insertados"] += 1
+                # Sellado como cambio de esta sede: las demás lo toman al fusionar su archivo
+                sellar_cambio(extra, sede, antes, libro)
+                emitir(codigo, registro_json(libro), libro)
+            reportar("en curso", contadores, t0)
+
+        for idx in range(existente.n):
+            if not visto[idx]:
+                libro = existente.registro(idx)
+                emitir(libro["codigo"], existente.crudo(idx), libro)
+
+        resto = json.dumps(extra, ensure_ascii=False, default=a_json)
+        f_json.write(b"\n], " + resto[1:].encode("utf-8") if extra else b"\n]}")
+        cerrar_json(f_json)  # suma de verificación (persistencia.py)
+        sincronizar(f_json)
+        f_json.close()
+    except BaseException:
+        f_json.close()
+        json_tmp.unlink(missing_ok=True)
+        raise
+    # JSON primero y snapshot después: el GA arranca del binario si es al menos igual de reciente
+    reemplazar(json_tmp, primaria)
+    copiar_atomico(primaria, paths["replica"])
+
+    tabla.marcar_version(version)
+    tabla.mm.flush()
+    reemplazar(tabla_tmp, Path(paths["disponibilidad"]))
+    escritor.cerrar(version, extra)
+    reportar(f"catálogo de la Sede {sede} (versión {version})", contadores, t0)
+    return contadores
+
+
+# IMPORTACIÓN CON EL GA EN MARCHA
+def importar_en_vivo(sede: int, archivo: Path, formato: str = None, tam_bloque: int = TAM_BLOQUE_EN_VIVO,
+                     timeout_ms: int = PS_TIMEOUT_LOTE_MS) -> Counter:
+    """Envía el archivo al GA de la sede en bloques (upserts mientras sigue atendiendo)"""
+    endpoint = endpoint_conexion(sede, "ga")
+    context = create_context()
+    socket_req = create_req_socket(context, endpoint, timeout_ms)
+    ids = GeneradorIds(f"importacion-sede{sede}")
+    contadores = Counter()
+    t0 = time.perf_counter()
+    print(f"[Importación] Enviando {archivo} al GA en {endpoint} (bloques de {tam_bloque})")
+
+    for bloque in en_bloques(leer_catalogo(archivo, formato, contadores), tam_bloque):
+        msg = {"operacion": "importar", "payload": {"libros": bloque}, "id_solicitud": ids.nuevo()}
+        resp = None
+        for _ in range(MAX_REINTENTOS):
+            socket_req.send(encode_message(msg))
+            resp = safe_recv(socket_req)
+            if resp is None:
+                # Lazy Pirate: mismo id_solicitud, el GA no aplica dos veces un bloque
+                print("[Importación] El GA no respondió. Reintentando el bloque...")
+                socket_req.close()
+                socket_req = create_req_socket(context, endpoint, timeout_ms)
+                continue
+            if resp.get("razon") == "OCUPADO":
+                time.sleep(resp.get("reintentar_en_ms", 500) / 1000)
+                continue
+            break
+        if resp is None or not resp.get("ok"):
+            socket_req.close()
+            raise RuntimeError(f"El GA no aceptó el bloque: {resp}")
+        for clave in ("insertados", "actualizados", "sin_cambios", "repetidos", "invalidas"):
+            contadores[clave] += resp.get(clave, 0)
+        reportar(f"versión {resp.get('version_bd')}", contadores, t0)
+
+    socket_req.close()
+    reportar(f"catálogo de la Sede {sede}", contadores, t0)
+    return contadores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importación de catálogos (CSV / JSON-lines) en streaming")
+    parser.add_argument("--sede", type=int, choices=SEDES, required=True)
+    parser.add_argument("--archivo", type=str, required=True)
+    parser.add_argument("--formato", choices=["csv", "jsonl"], default=None, help="Por defecto según la extensión")
+    parser.add_argument("--bloque", type=int, default=None, help="Filas por bloque")
+    parser.add_argument("--en-vivo", action="store_true", help="Upserts contra el GA en marcha")
+    args = parser.parse_args()
+
+    if not args.en_vivo:
+        try:
+            enviar_comando("ga", args.sede, {"comando": "estado"}, timeout_ms=300)
+            parser.exit(1, f"El GA de la Sede {args.sede} está en marcha: deténgalo o use --en-vivo\n")
+        except zmq.ZMQError:
+            pass  # no responde: se puede reescribir su BD
+
+    if args.en_vivo:
+        importar_en_vivo(args.sede, Path(args.archivo), args.formato, args.bloque or TAM_BLOQUE_EN_VIVO)
+    else:
+        importar_offline(args.sede, Path(args.archivo), args.formato, args.bloque or TAM_BLOQUE)
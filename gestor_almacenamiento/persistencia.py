@@ -0,0 +1,146 @@
+# gestor_almacenamiento/persistencia.py
+import io
+import json
+import os
+import re
+import shutil
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from comun.config import BD_FSYNC
+
+# PERSISTENCIA A PRUEBA DE CAÍDAS
+# Cada archivo de la BD se escribe aparte (<archivo>.tmp), se sincroniza
+# (fsync) y reemplaza al anterior con os.replace + fsync del directorio: tras
+# una caída queda el archivo viejo completo o el nuevo completo, nunca uno a
+# medias.
+# Los JSON terminan con la clave "crc32": suma de todos los bytes anteriores
+# a ella. Al leerlos se verifica antes de parsear; si no coincide, el GA pasa a
+# la copia siguiente (réplica, snapshot binario) sin pedir nada a otra sede.
+# Un JSON sin la clave (escrito antes de este formato) vale si se puede parsear.
+
+CLAVE_SUMA = "crc32"
+_PIE = re.compile(rb'(?:,|(?<={))\n  "crc32": "([0-9a-f]{8})"\n}\n?$')  # sin coma si el objeto estaba vacío
+TAM_TANDA = 1 << 20
+
+
+def cerrar_json(f):
+    """
+    Termina un objeto JSON recién escrito en f (binario, abierto para escribir):
+    reemplaza su '}' final por la clave con la suma de todo lo anterior. La suma
+    se calcula releyendo el archivo (queda en caché), no al escribir: json.dump
+    conserva su camino rápido. Un objeto vacío ('{}') queda sin coma.
+    """
+    f.flush()
+    fin = f.tell()
+    crc = 0
+    vacio = fin == 2  # '{}' (json.dump escribe así el objeto vacío, con o sin indent)
+    with open(f.name, "rb") as lector:
+        pendiente = fin - 1
+        while pendiente > 0:
+            bloque = lector.read(min(TAM_TANDA, pendiente))
+            if not bloque:
+                break
+            crc = zlib.crc32(bloque, crc)
+            pendiente -= len(bloque)
+        if lector.read(1) != b"}":
+            raise ValueError(f"{f.name} no termina en un objeto JSON")
+    f.seek(fin - 1)
+    f.truncate()
+    separador = "" if vacio else ","
+    f.write(f'{separador}\n  "{CLAVE_SUMA}": "{crc:08x}"\n}}\n'.encode("ascii"))
+
+
+def sincronizar(f):
+    """Vacía el buffer y, con BD_FSYNC, espera a que el archivo esté en disco"""
+    f.flush()
+    if BD_FSYNC:
+        os.fsync(f.fileno())
+
+
+def reemplazar(tmp: Path, path: Path):
+    """os.replace atómico; el fsync del directorio hace durable el cambio de nombre"""
+    os.replace(tmp, path)
+    if BD_FSYNC and hasattr(os, "O_DIRECTORY"):
+        fd = os.open(Path(path).parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def ruta_temporal(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".tmp")
+
+
+@contextmanager
+def archivo_atomico(path: Path):
+    """Escribe en <path>.tmp (binario) y al salir sin error lo instala en path"""
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    tmp = ruta_temporal(path)
+    f = open(tmp, "wb", buffering=TAM_TANDA)
+    try:
+        yield f
+        sincronizar(f)
+        f.close()
+        reemplazar(tmp, path)
+    except BaseException:
+        f.close()
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def escribir_json(path: Path, obj: dict, indent=None, default=None):
+    """Escritura atómica de un objeto JSON con su suma"""
+    with archivo_atomico(path) as f:
+        texto = io.TextIOWrapper(f, encoding="utf-8")
+        json.dump(obj, texto, ensure_ascii=False, indent=indent, default=default)
+        texto.detach()  # vacía el texto pendiente sin cerrar el archivo
+        cerrar_json(f)
+
+
+def verificar_json(datos: bytes) -> bool:
+    """True si la suma coincide, False si no tiene suma; ValueError si no coincide"""
+    pie = _PIE.search(datos, max(0, len(datos) - 64))
+    if pie is None:
+        return False
+    suma = zlib.crc32(memoryview(datos)[:pie.start()])
+    if f"{suma:08x}" != pie.group(1).decode("ascii"):
+        raise ValueError(f"suma crc32 incorrecta ({suma:08x}, el archivo dice {pie.group(1).decode('ascii')})")
+    return True
+
+
+def leer_json(path: Path) -> dict:
+    """Lee un JSON escrito por escribir_json verificando su suma (ValueError si está dañado)"""
+    datos = Path(path).read_bytes()
+    verificar_json(datos)
+    obj = json.loads(datos)
+    obj.pop(CLAVE_SUMA, None)
+    return obj
+
+
+_VERSION = re.compile(rb'\A\{\s*"version":\s*(-?\d+)')
+
+
+def version_json(path: Path) -> int:
+    """
+    Versión de una BD JSON sin parsearla entera: el GA y la importación
+    escriben "version" como primera clave. Si no está ahí (archivo de otro
+    origen) se lee completo. ValueError si el archivo está dañado.
+    """
+    with open(path, "rb") as f:
+        inicio = _VERSION.match(f.read(256))
+    if inicio is not None:
+        return int(inicio.group(1))
+    return leer_json(path).get("version", 0)
+
+
+def copiar_atomico(origen: Path, destino: Path):
+    """Copia un archivo (la suma viaja con él) sin dejar el destino a medias"""
+    tmp = ruta_temporal(destino)
+    with open(origen, "rb") as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst, TAM_TANDA)
+        sincronizar(dst)
+    reemplazar(tmp, Path(destino))
@@ -0,0 +1,247 @@
+# gestor_almacenamiento/replicacion.py
+import json
+import queue
+import threading
+import time
+from collections import deque
+import zmq
+from comun.config import SEDES, ZMQ_HWM_REPLICACION, REPLICACION_MEMORIA
+from comun.zeromq_utils import bind_endpoints
+from gestor_almacenamiento.cuotas import reparto_inicial, fusionar_transferencias
+
+# REPLICACIÓN MULTI-MAESTRO POR LIBRO
+# Cada sede acepta escrituras. Cada libro lleva un vector de versiones "vv"
+# ({sede: contador}) y cada préstamo el "dot" [sede, contador] del evento que
+# lo creó. El contador de cada sede está en db["vv"][sede] y solo lo avanza
+# esa sede (sellar_cambio).
+#
+# Al recibir un libro de otra sede:
+# - si su vv ya está cubierto por el local, se ignora
+# - si cubre al local, se toma tal cual
+# - si son concurrentes se fusionan: un préstamo que falta de un lado se
+#   conserva solo si ese lado no había visto su creación (si la vio y no lo
+#   tiene, es que lo devolvió). Renovaciones: el máximo.
+# ejemplares_disponibles = base_disponibles - préstamos activos, así ambas
+# sedes llegan al mismo valor sin copiar la BD entera.
+
+TOPIC_LIBROS = b"LIBROS"
+TOPIC_DEMANDA = b"DEMANDA"  # pedidos de cupo entre sedes (ver cuotas.py)
+MAX_LIBROS_POR_MENSAJE = 200
+
+
+def domina(a: dict, b: dict) -> bool:
+    """a ha visto todo lo que vio b"""
+    return all(a.get(k, 0) >= v for k, v in b.items())
+
+
+def _visto(vv: dict, prestamo: dict) -> bool:
+    dot = prestamo.get("dot")
+    if dot is None:
+        return True  # préstamo anterior a la replicación: todas las sedes lo conocen
+    return vv.get(str(dot[0]), 0) >= dot[1]
+
+
+def _claves_prestamos(libro: dict) -> dict:
+    """Identidad de cada préstamo: su dot, o (usuario, fecha, n) para los anteriores a la replicación"""
+    claves = {}
+    repetidos = {}
+    for p in libro.get("prestamos", []):
+        if p.get("dot") is not None:
+            clave = tuple(p["dot"])
+        else:
+            base = (p["usuario_id"], p["fecha_entrega"])
+            repetidos[base] = repetidos.get(base, 0) + 1
+            clave = base + (repetidos[base],)
+        claves[clave] = p
+    return claves
+
+
+def sellar_cambio(db: dict, sede: int, libro_antes: dict, libro_despues: dict):
+    """
+    Marca un cambio local: avanza el contador de la sede y lo registra en el vv
+    del libro y en el dot de los préstamos nuevos. libro_despues es la copia
+    recién creada por la operación (aún no compartida), se modifica en sitio.
+    """
+    vv_bd = db.setdefault("vv", {})
+    s = str(sede)
+    vv_bd[s] = vv_bd.get(s, 0) + 1
+    contador = vv_bd[s]
+
+    if "base_disponibles" not in libro_despues:
+        antes = libro_antes or libro_despues
+        libro_despues["base_disponibles"] = antes["ejemplares_disponibles"] + len(antes.get("prestamos", []))
+    if "cuota_inicial" not in libro_despues:
+        libro_despues["cuota_inicial"] = reparto_inicial(libro_despues, SEDES)
+    libro_despues["vv"] = dict(libro_despues.get("vv", {}), **{s: contador})
+
+    n_antes = len(libro_antes.get("prestamos", [])) if libro_antes else 0
+    for p in libro_despues["prestamos"][n_antes:]:
+        if p.get("dot") is None:
+            p["dot"] = [sede, contador]
+
+
+def fusionar_libro(local: dict, remoto: dict) -> dict:
+    """Devuelve la versión fusionada (local si no hay nada nuevo, remoto si lo cubre)"""
+    if local is None:
+        return remoto
+    vl, vr = local.get("vv", {}), remoto.get("vv", {})
+    if domina(vl, vr):
+        return local
+    if domina(vr, vl):
+        return remoto
+
+    # Concurrentes: unión de préstamos sin resucitar los devueltos
+    pl, pr = _claves_prestamos(local), _claves_prestamos(remoto)
+    prestamos = []
+    for clave, p in pl.items():
+        if clave in pr:
+            prestamos.append(dict(p, renovaciones=max(p.get("renovaciones", 0), pr[clave].get("renovaciones", 0))))
+        elif not _visto(vr, p):
+            prestamos.append(dict(p))
+    for clave, p in pr.items():
+        if clave not in pl and not _visto(vl, p):
+            prestamos.append(dict(p))
+
+    nuevo = dict(local)
+    nuevo["prestamos"] = prestamos
+    nuevo["vv"] = {k: max(vl.get(k, 0), vr.get(k, 0)) for k in set(vl) | set(vr)}
+    if "cuota_inicial" not in nuevo and "cuota_inicial" in remoto:
+        nuevo["cuota_inicial"] = remoto["cuota_inicial"]
+    transf = fusionar_transferencias(local.get("cuota_transf", {}), remoto.get("cuota_transf", {}))
+    if transf:
+        nuevo["cuota_transf"] = transf
+    tomada = fusionar_transferencias(local.get("cuota_tomada", {}), remoto.get("cuota_tomada", {}))
+    if tomada:
+        nuevo["cuota_tomada"] = tomada
+    base = local.get("base_disponibles", remoto.get("base_disponibles"))
+    if base is not None:
+        nuevo["base_disponibles"] = base
+        nuevo["ejemplares_disponibles"] = base - len(prestamos)
+    return nuevo
+
+
+class Replicador:
+    """
+    Publica (PUB) los libros que cambian, en lotes y desde su propio hilo.
+    Se registra como índice del GA: registrar_cambio() solo encola (O(1) con db_lock).
+    Cada mensaje de libros lleva un número de secuencia: quien detecta un salto
+    pide lo que le falta (leer, los últimos mensajes se guardan en memoria) o,
+    si ya no está, fusiona el archivo completo de la sede.
+    Por el mismo socket salen los pedidos de cupo (enviar_demanda).
+    """
+    # Solo publica cambios hechos en esta sede: lo fusionado de otra sede ya
+    # lo publicó su dueño (cada sede se suscribe a todas las demás)
+    solo_cambios_locales = True
+
+    def __init__(self, endpoint, sede: int):
+        self.endpoint = endpoint
+        self.sede = sede
+        self.cola = queue.Queue()
+        self.seq = 0
+        self.sesion = time.time()  # cambia al reiniciar el GA: la secuencia vuelve a 0
+        self.recientes = deque(maxlen=REPLICACION_MEMORIA)
+
+    def start(self):
+        ctx = zmq.Context.instance()
+        socket_pub = ctx.socket(zmq.PUB)
+        socket_pub.setsockopt(zmq.SNDHWM, ZMQ_HWM_REPLICACION)
+        bind_endpoints(socket_pub, self.endpoint)
+
+        def run():
+            while True:
+                topic, data = self.cola.get()
+                if topic != TOPIC_LIBROS:
+                    socket_pub.send_multipart([topic, json.dumps(data).encode("utf-8")])
+                    continue
+                libros = [data]
+                while len(libros) < MAX_LIBROS_POR_MENSAJE:
+                    try:
+                        topic, data = self.cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if topic != TOPIC_LIBROS:
+                        socket_pub.send_multipart([topic, json.dumps(data).encode("utf-8")])
+                        continue
+                    libros.append(data)
+                msg = {"sede": self.sede, "sesion": self.sesion, "seq": self.seq + 1, "libros": libros}
+                self.recientes.append(msg)
+                self.seq = msg["seq"]
+                socket_pub.send_multipart([TOPIC_LIBROS, json.dumps(msg, ensure_ascii=False).encode("utf-8")])
+
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+    def registrar_cambio(self, libro_antes: dict, libro_despues: dict):
+        if libro_despues is not None:
+            self.cola.put((TOPIC_LIBROS, libro_despues))
+
+    def enviar_demanda(self, rechazos: dict):
+        """Pide cupo a las demás sedes para los libros con préstamos rechazados"""
+        self.cola.put((TOPIC_DEMANDA, {"sede": self.sede, "libros": rechazos}))
+
+    def reconstruir(self, db: dict):
+        pass
+
+    def leer(self, sesion, desde_seq: int, maximo: int = 50) -> dict:
+        """
+        Mensajes de libros publicados después de desde_seq (op "replicacion" del
+        GA), para una sede que los perdió. ok False si ya no están en memoria.
+        """
+        recientes = list(self.recientes)
+        if sesion != self.sesion:
+            return {"ok": False, "razon": "OTRA_SESION", "mensaje": "La secuencia es de otra sesión"}
+        if desde_seq < self.seq and (not recientes or recientes[0]["seq"] > desde_seq + 1):
+            return {"ok": False, "razon": "FUERA_DE_MEMORIA",
+                    "mensaje": f"Solo quedan en memoria los últimos {len(recientes)} mensajes"}
+        mensajes = [m for m in recientes if m["seq"] > desde_seq][:max(1, maximo)]
+        return {"ok": True, "mensajes": mensajes, "seq": self.seq}
+
+
+class SeguimientoPeer:
+    """
+    Detecta mensajes de replicación perdidos de una sede vecina (PUB/SUB no
+    reenvía lo que se publicó sin suscriptor o con la cola llena).
+    El heartbeat de la sede trae su última secuencia publicada: si seguimos
+    atrasados dos heartbeats seguidos, o hubo un salto, toca recuperar desde
+    'continuo' (o fusionar su archivo si no se sabe desde dónde).
+    """
+    def __init__(self):
+        self.sesion = None
+        self.visto = 0
+        self.continuo = None  # recibido todo hasta aquí (None: al arrancar no sabemos qué nos perdimos)
+        self.atrasado = None
+
+    def retomar(self, sesion, continuo: int):
+        """Posición del GA anterior (relevo en caliente)"""
+        self.sesion, self.visto, self.continuo = sesion, continuo, continuo
+
+    def _verificar_sesion(self, sesion):
+        if sesion != self.sesion:
+            # La sede reinició sin relevo: lo de su sesión anterior solo está en su archivo
+            self.sesion = sesion
+            self.visto = 0
+            self.continuo = None
+
+    def mensaje(self, sesion, seq: int):
+        self._verificar_sesion(sesion)
+        if self.continuo is not None and seq == self.continuo + 1:
+            self.continuo = seq
+        self.visto = max(self.visto, seq)
+
+    def heartbeat(self, sesion, seq: int) -> bool:
+        """True si hay que recuperar lo perdido (hasta 'atrasado') y después llamar a recuperado()"""
+        self._verificar_sesion(sesion)
+        if self.continuo is not None and seq <= self.continuo:
+            self.atrasado = None
+            return False
+        if self.atrasado is None:
+            # Puede ser un mensaje en camino: se espera un heartbeat más
+            self.atrasado = seq
+            return False
+        return True
+
+    def recuperado(self, hasta: int):
+        """Ya está fusionado todo lo publicado hasta 'hasta' (mensajes recuperados o archivo)"""
+        self.continuo = max(self.continuo or 0, hasta)
+        self.visto = max(self.visto, self.continuo)
+        self.atrasado = None
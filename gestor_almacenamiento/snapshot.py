@@ -0,0 +1,84 @@
+# gestor_almacenamiento/snapshot.py
+import threading
+
+
+# Convención copy-on-write:
+# Los registros de libro (y sus préstamos) NUNCA se modifican en sitio.
+# Las operaciones crean una copia del libro, la modifican y la colocan en la
+# lista con reemplazar_libro(). Así un snapshot solo necesita copiar la raíz
+# (punteros a los registros), nunca los registros en sí.
+
+def copiar_libro(libro: dict) -> dict:
+    """Copia superficial de un libro con su lista de préstamos lista para modificar"""
+    nuevo = dict(libro)
+    nuevo["prestamos"] = [dict(p) for p in libro.get("prestamos", [])]
+    return nuevo
+
+
+def reemplazar_libro(db: dict, idx: int, libro: dict):
+    """Coloca la nueva versión de un libro en la raíz de la BD"""
+    db["libros"][idx] = libro
+
+
+def tomar_snapshot(db: dict) -> dict:
+    """
+    Vista consistente de la BD en un instante dado.
+    Solo copia la raíz (listas y dicts de primer nivel); los registros se
+    comparten con la BD viva porque nadie los modifica en sitio.
+    Debe llamarse con db_lock tomado; después puede usarse sin lock.
+    """
+    snap = {}
+    for clave, valor in db.items():
+        if hasattr(valor, "copiar"):
+            snap[clave] = valor.copiar()  # ej. LibrosPerezosos (comparte el mmap)
+        elif isinstance(valor, list):
+            snap[clave] = list(valor)
+        elif isinstance(valor, dict):
+            snap[clave] = dict(valor)
+        else:
+            snap[clave] = valor
+    return snap
+
+
+class EscritorSnapshots:
+    """
+    Hilo de fondo que persiste snapshots en un archivo.
+    Si llegan varios snapshots mientras se escribe, solo se guarda el último
+    (los intermedios ya quedan cubiertos por él).
+    """
+    def __init__(self, path, guardar):
+        self.path = path
+        self.guardar = guardar  # función (path, db) que escribe el archivo
+        self.pendiente = None
+        self.version_escrita = -1
+        self.cond = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def entregar(self, snap: dict):
+        """Encola un snapshot para escritura (O(1), no bloquea al escritor)"""
+        with self.cond:
+            self.pendiente = snap
+            self.cond.notify()
+
+    def al_dia(self, version: int) -> bool:
+        """True si no hay nada por escribir y lo último escrito cubre 'version' (drenaje)"""
+        with self.cond:
+            return self.pendiente is None and self.version_escrita >= version
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.pendiente is None:
+                    self.cond.wait()
+                snap = self.pendiente
+                self.pendiente = None
+
+            if snap.get("version", 0) < self.version_escrita:
+                continue
+            try:
+                self.guardar(self.path, snap)
+                self.version_escrita = snap.get("version", 0)
+            except Exception as e:
+                print(f"[Snapshot] Error guardando {self.path}: {e}")
@@ -0,0 +1,172 @@
+# gestor_almacenamiento/tabla_disponibilidad.py
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+# TABLA DE DISPONIBILIDAD (registros de ancho fijo, mapeada en memoria)
+# [cabecera 32 B][registro 0][registro 1]...
+#
+# cabecera: magic, version BD reflejada, n registros
+# registro: seq, codigo, ejemplares_totales, ejemplares_disponibles, n_prestamos
+#
+# Un único escritor (el GA, con db_lock tomado) actualiza los registros en sitio.
+# Cada registro lleva un contador 'seq' tipo seqlock: impar = escritura en curso.
+# Los lectores (otros hilos u otros procesos locales) reintentan si ven seq
+# impar o si cambió durante la lectura, así nunca leen un registro a medias.
+# El GC de la sede la abre en solo lectura para responder "disponibilidad"
+# sin pasar por el GA.
+
+MAGIC = b"BIBDISP1"
+CABECERA = struct.Struct("<8sqI")
+TAM_CABECERA = 32
+REGISTRO = struct.Struct("<I16siii")
+SEQ = struct.Struct("<I")
+VALORES = struct.Struct("<iii")
+OFF_VALORES = 20  # seq (4) + codigo (16)
+LARGO_CODIGO = 16
+CAPACIDAD_INICIAL = 1024
+
+
+class TablaDisponibilidad:
+    def __init__(self, path: Path, solo_lectura: bool = False):
+        self.path = Path(path)
+        self.solo_lectura = solo_lectura
+        self.slots = {}
+        self.n = 0
+        self.mm = None
+        self.f = None
+        self._abrir()
+
+    # APERTURA
+    def _abrir(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.f.close()
+        if not self.path.exists():
+            if self.solo_lectura:
+                raise FileNotFoundError(self.path)
+            self._crear(CAPACIDAD_INICIAL)
+
+        self.f = open(self.path, "rb" if self.solo_lectura else "r+b")
+        acceso = mmap.ACCESS_READ if self.solo_lectura else mmap.ACCESS_WRITE
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=acceso)
+        magic, _, self.n = CABECERA.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} no es una tabla de disponibilidad válida")
+        self.inodo = os.fstat(self.f.fileno()).st_ino
+        self.capacidad = (len(self.mm) - TAM_CABECERA) // REGISTRO.size
+
+        self.slots = {}
+        for i in range(self.n):
+            _, codigo, _, _, _ = REGISTRO.unpack_from(self.mm, self._offset(i))
+            self.slots[codigo.rstrip(b"\0").decode("utf-8")] = i
+
+    def _crear(self, capacidad: int):
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        with open(self.path, "wb") as f:
+            f.write(CABECERA.pack(MAGIC, -1, 0).ljust(TAM_CABECERA, b"\0"))
+            f.truncate(TAM_CABECERA + capacidad * REGISTRO.size)
+
+    @staticmethod
+    def _offset(slot: int) -> int:
+        return TAM_CABECERA + slot * REGISTRO.size
+
+    # LECTURA (cualquier hilo o proceso)
+    @property
+    def version(self) -> int:
+        return CABECERA.unpack_from(self.mm, 0)[1]
+
+    def consultar(self, codigo: str):
+        """Devuelve (totales, disponibles, prestamos) o None si el libro no está en la tabla"""
+        slot = self.slots.get(codigo)
+        if slot is None and self.solo_lectura and CABECERA.unpack_from(self.mm, 0)[2] != self.n:
+            self._abrir()  # el GA agregó libros: remapear
+            slot = self.slots.get(codigo)
+        if slot is None:
+            return None
+        off = self._offset(slot)
+        while True:
+            s1 = SEQ.unpack_from(self.mm, off)[0]
+            if s1 & 1:
+                time.sleep(0)
+                continue
+            valores = VALORES.unpack_from(self.mm, off + OFF_VALORES)
+            if SEQ.unpack_from(self.mm, off)[0] == s1:
+                return valores
+
+    def disponibles(self, codigo: str):
+        valores = self.consultar(codigo)
+        return None if valores is None else valores[1]
+
+    def renovar(self):
+        """Lectores: vuelve a mapear si el archivo fue reemplazado (importación de catálogo)"""
+        if os.stat(self.path).st_ino != self.inodo:
+            self._abrir()
+
+    # ESCRITURA (solo el GA, con db_lock)
+    def escribir(self, libro: dict):
+        self.escribir_valores(libro["codigo"], libro.get("ejemplares_totales", 0),
+                              libro.get("ejemplares_disponibles", 0), len(libro.get("prestamos", [])))
+
+    def escribir_valores(self, codigo: str, totales: int, disponibles: int, prestamos: int):
+        slot = self.slots.get(codigo)
+        if slot is None:
+            slot = self._agregar(codigo)
+        off = self._offset(slot)
+        seq = SEQ.unpack_from(self.mm, off)[0]
+        SEQ.pack_into(self.mm, off, (seq + 1) & 0xFFFFFFFF)
+        VALORES.pack_into(self.mm, off + OFF_VALORES, totales, disponibles, prestamos)
+        SEQ.pack_into(self.mm, off, (seq + 2) & 0xFFFFFFFF)
+
+    def marcar_version(self, version: int):
+        struct.pack_into("<q", self.mm, 8, version)
+
+    def _agregar(self, codigo: str) -> int:
+        raw = codigo.encode("utf-8")
+        if len(raw) > LARGO_CODIGO:
+            # struct.pack("16s") truncaría en silencio y dos códigos compartirían registro
+            raise ValueError(f"Código de libro demasiado largo para la tabla de disponibilidad: {codigo}")
+        if self.n == self.capacidad:
+            self._crecer(self.capacidad * 2)
+        slot = self.n
+        REGISTRO.pack_into(self.mm, self._offset(slot), 0, raw, 0, 0, 0)
+        self.n += 1
+        self.slots[codigo] = slot
+        struct.pack_into("<I", self.mm, 16, self.n)
+        return slot
+
+    def _crecer(self, capacidad: int):
+        self.mm.flush()
+        self.mm.close()
+        self.f.truncate(TAM_CABECERA + capacidad * REGISTRO.size)
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_WRITE)
+        self.capacidad = capacidad
+
+    def reconstruir(self, db: dict):
+        """
+        Vuelca la BD completa en la tabla (arranque desfasado o tras sincronizar).
+        Se hace en sitio, registro a registro: los lectores de otros procesos
+        nunca ven el archivo truncado.
+        Con la BD cargada del snapshot binario (LibrosPerezosos) los valores
+        salen de su tabla de registros: no se decodifica ningún libro.
+        """
+        libros = db.get("libros", [])
+        if hasattr(libros, "disponibilidad"):
+            for i in range(len(libros)):
+                self.escribir_valores(libros.codigo(i), *libros.disponibilidad(i))
+        else:
+            for libro in libros:
+                self.escribir(libro)
+        self.marcar_version(db.get("version", 0))
+
+
+def respuesta_disponibilidad(tabla: TablaDisponibilidad, codigo: str) -> dict:
+    """Respuesta a la consulta "disponibilidad" (la dan igual el GA y el GC leyendo la tabla)"""
+    valores = tabla.consultar(str(codigo or ""))
+    if valores is None:
+        return {"ok": False, "codigo": codigo, "mensaje": "Libro no existe", "version_bd": tabla.version}
+    totales, disponibles, prestamos = valores
+    return {"ok": True, "codigo": codigo, "totales": totales, "disponibles": disponibles,
+            "prestamos": prestamos, "version_bd": tabla.version}
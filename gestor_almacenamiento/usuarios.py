@@ -0,0 +1,116 @@
+# gestor_almacenamiento/usuarios.py
+import sys
+from collections import Counter
+from comun.config import GA_MAX_PRESTAMOS_USUARIO
+from gestor_almacenamiento.formato_binario import recorrer_libros
+
+# PRÉSTAMOS POR USUARIO
+# Los préstamos viven en la lista "prestamos" de cada libro; este índice guarda
+# la vista inversa usuario -> libros que tiene prestados, así contar los
+# préstamos de un usuario (límite en el préstamo) o listarlos no recorre el
+# catálogo.
+# Casi todos los usuarios tienen un solo préstamo: se guarda el código solo
+# (str) y pasa a lista recién con el segundo. Los códigos y los ids de usuario
+# son los mismos objetos str de los libros: el índice no los duplica.
+
+
+def _usuarios_de(libro: dict) -> list:
+    """Usuarios con préstamo de un libro, en el orden de sus préstamos"""
+    if not libro:
+        return []
+    return [p["usuario_id"] for p in libro.get("prestamos", [])]
+
+
+class IndicePrestamosUsuario:
+    """
+    usuario -> código (un préstamo) o lista de códigos (varios; un código se
+    repite si tiene más de un ejemplar del mismo libro).
+    Índice derivado del GA: registrar_cambio(antes, despues) y reconstruir(db),
+    con db_lock como los demás.
+    """
+    def __init__(self, limite: int = GA_MAX_PRESTAMOS_USUARIO):
+        self.limite = limite  # préstamos activos por usuario (0 = sin límite)
+        self.usuarios = {}
+        self.total = 0
+
+    # MANTENIMIENTO (con db_lock)
+    def agregar(self, usuario: str, codigo: str):
+        actual = self.usuarios.get(usuario)
+        if actual is None:
+            self.usuarios[usuario] = codigo
+        elif isinstance(actual, str):
+            self.usuarios[usuario] = [actual, codigo]
+        else:
+            actual.append(codigo)
+        self.total += 1
+
+    def quitar(self, usuario: str, codigo: str):
+        actual = self.usuarios.get(usuario)
+        if actual is None:
+            return
+        if isinstance(actual, str):
+            if actual == codigo:
+                del self.usuarios[usuario]
+                self.total -= 1
+        elif codigo in actual:
+            actual.remove(codigo)
+            self.total -= 1
+            if len(actual) == 1:
+                self.usuarios[usuario] = actual[0]
+
+    def registrar_cambio(self, libro_antes: dict, libro_despues: dict):
+        """Diferencia de préstamos entre dos versiones de un libro (una renovación no cambia nada)"""
+        codigo = (libro_despues or libro_antes)["codigo"]
+        antes, despues = _usuarios_de(libro_antes), _usuarios_de(libro_despues)
+        if antes == despues:
+            return
+        # Casos de una operación: préstamo (uno más al final) y devolución (uno menos)
+        if len(despues) == len(antes) + 1 and despues[:-1] == antes:
+            self.agregar(despues[-1], codigo)
+            return
+        if len(antes) == len(despues) + 1:
+            i = next((i for i, (a, d) in enumerate(zip(antes, despues)) if a != d), len(despues))
+            if antes[i + 1:] == despues[i:]:
+                self.quitar(antes[i], codigo)
+                return
+        antes, despues = Counter(antes), Counter(despues)
+        for usuario, n in (despues - antes).items():
+            for _ in range(n):
+                self.agregar(usuario, codigo)
+        for usuario, n in (antes - despues).items():
+            for _ in range(n):
+                self.quitar(usuario, codigo)
+
+    def reconstruir(self, db: dict):
+        """Recorre el catálogo una vez (al cargar o tras sincronizar); conserva el límite"""
+        self.__init__(self.limite)
+        for libro in recorrer_libros(db.get("libros", []), solo_con_prestamos=True):
+            for p in libro["prestamos"]:
+                self.agregar(p["usuario_id"], libro["codigo"])
+
+    # CONSULTAS (O(1) salvo la lista de códigos, proporcional a los préstamos del usuario)
+    def cantidad(self, usuario: str) -> int:
+        actual = self.usuarios.get(usuario)
+        if actual is None:
+            return 0
+        return 1 if isinstance(actual, str) else len(actual)
+
+    def codigos(self, usuario: str) -> list:
+        actual = self.usuarios.get(usuario)
+        if actual is None:
+            return []
+        return [actual] if isinstance(actual, str) else list(actual)
+
+    def rechazo(self, usuario: str):
+        """None si el usuario puede pedir otro préstamo, o la respuesta de rechazo"""
+        n = self.cantidad(usuario)
+        if self.limite <= 0 or n < self.limite:
+            return None
+        return {"ok": False, "razon": "LIMITE_USUARIO",
+                "mensaje": f"El usuario {usuario} ya tiene {n} préstamos (máximo {self.limite})"}
+
+    def memoria(self) -> dict:
+        """Bytes propios del índice: el dict y las listas (los str son los de los libros)"""
+        listas = sum(sys.getsizeof(v) for v in self.usuarios.values() if not isinstance(v, str))
+        return {"usuarios": len(self.usuarios), "prestamos": self.total,
+                "bytes": sys.getsizeof(self.usuarios) + listas}
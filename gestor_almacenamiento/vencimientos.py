@@ -0,0 +1,143 @@
+# gestor_almacenamiento/vencimientos.py
+import heapq
+import json
+import threading
+import time
+import zmq
+from collections import Counter
+from datetime import date
+from pathlib import Path
+from comun.zeromq_utils import bind_endpoints
+from gestor_almacenamiento.formato_binario import recorrer_libros
+
+
+def _prestamos_de(libro: dict) -> Counter:
+    """Multiconjunto de (usuario, fecha_entrega) de un libro"""
+    if not libro:
+        return Counter()
+    return Counter((p["usuario_id"], p["fecha_entrega"]) for p in libro.get("prestamos", []))
+
+
+class IndiceVencimientos:
+    """
+    Calendario de préstamos por día de entrega.
+    - dias: fecha_entrega -> Counter{(codigo, usuario): n}
+    - heap: días aún no revisados por el barrido (orden cronológico)
+    El barrido solo toca los días que vencieron desde la última vez, así el
+    costo es proporcional a los préstamos que vencen y no al catálogo.
+    """
+    def __init__(self):
+        self.dias = {}
+        self.heap = []
+        self.en_heap = set()
+        self.notificados = set()  # (codigo, usuario, fecha) ya reportados como vencidos
+
+    # MANTENIMIENTO (con db_lock)
+    def agregar(self, codigo: str, usuario: str, fecha: str):
+        self.dias.setdefault(fecha, Counter())[(codigo, usuario)] += 1
+        if fecha not in self.en_heap:
+            heapq.heappush(self.heap, fecha)
+            self.en_heap.add(fecha)
+
+    def quitar(self, codigo: str, usuario: str, fecha: str):
+        bucket = self.dias.get(fecha)
+        if not bucket or not bucket[(codigo, usuario)]:
+            return
+        bucket[(codigo, usuario)] -= 1
+        if bucket[(codigo, usuario)] <= 0:
+            del bucket[(codigo, usuario)]
+            self.notificados.discard((codigo, usuario, fecha))
+        if not bucket:
+            del self.dias[fecha]
+
+    def registrar_cambio(self, libro_antes: dict, libro_despues: dict):
+        """Actualiza el índice con la diferencia de préstamos entre dos versiones de un libro"""
+        codigo = (libro_despues or libro_antes)["codigo"]
+        antes, despues = _prestamos_de(libro_antes), _prestamos_de(libro_despues)
+        for (usuario, fecha), n in (despues - antes).items():
+            for _ in range(n):
+                self.agregar(codigo, usuario, fecha)
+        for (usuario, fecha), n in (antes - despues).items():
+            for _ in range(n):
+                self.quitar(codigo, usuario, fecha)
+
+    def reconstruir(self, db: dict):
+        """Recorre el catálogo una vez (al cargar o tras sincronizar); conserva lo ya notificado"""
+        notificados = self.notificados
+        self.__init__()
+        for libro in recorrer_libros(db.get("libros", []), solo_con_prestamos=True):
+            for p in libro["prestamos"]:
+                self.agregar(libro["codigo"], p["usuario_id"], p["fecha_entrega"])
+        self.notificados = {n for n in notificados if self.dias.get(n[2], {}).get((n[0], n[1]))}
+
+    def cargar_notificados(self, reporte_path: Path):
+        """Marca como notificados los vencidos que ya están en el reporte (tras reiniciar el GA)"""
+        if not Path(reporte_path).exists():
+            return
+        with open(reporte_path, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    r = json.loads(linea)
+                except ValueError:
+                    continue
+                clave = (r["libro_codigo"], r["usuario_id"], r["fecha_entrega"])
+                if self.dias.get(clave[2], {}).get(clave[:2]):
+                    self.notificados.add(clave)
+
+    # CONSULTAS
+    def barrer(self, hoy: str):
+        """Devuelve los préstamos que vencieron hasta 'hoy' y aún no se habían notificado"""
+        nuevos = []
+        while self.heap and self.heap[0] < hoy:
+            fecha = heapq.heappop(self.heap)
+            self.en_heap.discard(fecha)
+            for (codigo, usuario) in self.dias.get(fecha, {}):
+                if (codigo, usuario, fecha) not in self.notificados:
+                    self.notificados.add((codigo, usuario, fecha))
+                    nuevos.append({"libro_codigo": codigo, "usuario_id": usuario, "fecha_entrega": fecha})
+        return nuevos
+
+    def proximos(self, desde: str, hasta: str):
+        """Préstamos que vencen entre 'desde' y 'hasta' (inclusive), recorriendo solo esos días"""
+        inicio, fin = date.fromisoformat(desde), date.fromisoformat(hasta)
+        resultado = []
+        for n in range((fin - inicio).days + 1):
+            fecha = date.fromordinal(inicio.toordinal() + n).isoformat()
+            for (codigo, usuario), cantidad in self.dias.get(fecha, {}).items():
+                resultado.extend([{"libro_codigo": codigo, "usuario_id": usuario, "fecha_entrega": fecha}] * cantidad)
+        return resultado
+
+    def total_vencidos(self) -> int:
+        return len(self.notificados)
+
+
+def start_barrido_vencimientos(indice: IndiceVencimientos, lock, reporte_path: Path,
+                               endpoint, topic: bytes, interval):
+    """
+    Hilo que cada 'interval' segundos barre los préstamos vencidos:
+    los agrega al reporte (JSON lines, solo lo nuevo) y publica una
+    notificación por préstamo vencido en 'endpoint' (PUB).
+    interval puede ser una función (ajustable en caliente).
+    """
+    ctx = zmq.Context.instance()
+    socket_pub = ctx.socket(zmq.PUB)
+    bind_endpoints(socket_pub, endpoint)
+
+    def run():
+        while True:
+            hoy = date.today().isoformat()
+            with lock:
+                nuevos = indice.barrer(hoy)
+            if nuevos:
+                print(f"[Vencimientos] {len(nuevos)} préstamos vencidos nuevos (total {indice.total_vencidos()})")
+                try:
+                    with open(reporte_path, "a", encoding="utf-8") as f:
+                        for registro in nuevos:
+                            registro["detectado"] = hoy
+                            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                            socket_pub.send_multipart([topic, json.dumps(registro).encode("utf-8")])
+                except Exception as e:
+                    print(f"[Vencimientos] Error escribiendo reporte: {e}")
+            time.sleep(interval() if callable(interval) else interval)
+
+    threading.Thread(target=run, daemon=True).start()
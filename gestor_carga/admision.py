@@ -0,0 +1,117 @@
+#gestor_carga/admision.py
+import time
+from comun.config import (
+    GC_MAX_COLA_PRESTAMOS,
+    GC_MAX_COLA_EVENTOS,
+    GC_PLAZO_RESPUESTA_MS,
+    GC_TASA_POR_PS,
+    GC_RAFAGA_POR_PS,
+    OPERACIONES_CONSULTA,
+)
+
+# Estimación de latencia de un préstamo sin historia, y vida media con la que
+# vuelve a ella mientras no hay préstamos en curso (los timeouts de una caída
+# del GA no quedan en la EWMA para siempre)
+LATENCIA_BASE_MS = 50.0
+VIDA_MEDIA_LATENCIA_S = 2.0
+
+
+class TokenBucket:
+    """Limitador de tasa: 'tasa' fichas por segundo con ráfagas de hasta 'capacidad'"""
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.fichas = capacidad
+        self.ultimo = time.monotonic()
+
+    def consumir(self) -> bool:
+        ahora = time.monotonic()
+        self.fichas = min(self.capacidad, self.fichas + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+        if self.fichas >= 1:
+            self.fichas -= 1
+            return True
+        return False
+
+    def espera_ms(self) -> int:
+        """Tiempo hasta que haya una ficha disponible"""
+        return int(max(0.0, 1 - self.fichas) / self.tasa * 1000) + 1
+
+
+class ControlAdmision:
+    """
+    Decide si el GC acepta una solicitud o responde rápido 'ocupado, reintente en X ms'.
+    - Límite por PS con token buckets
+    - Préstamos: profundidad de cola y latencia estimada (EWMA) contra el plazo del
+      cliente; con la cola vacía siempre pasa uno (sondeo)
+    - Devoluciones/renovaciones: profundidad de la cola de eventos pendientes
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.en_cola = 0          # préstamos aceptados y aún sin respuesta
+        self.latencia_ms = LATENCIA_BASE_MS  # EWMA de la latencia de un préstamo en el actor
+        self.ultima_actividad = time.monotonic()
+        self.rechazos = 0
+        self.pausado = False      # en pausa se rechaza todo (socket de administración)
+        # Límites (ajustables en caliente)
+        self.max_cola_prestamos = GC_MAX_COLA_PRESTAMOS
+        self.max_cola_eventos = GC_MAX_COLA_EVENTOS
+        self.plazo_respuesta_ms = GC_PLAZO_RESPUESTA_MS
+        self.tasa_por_ps = GC_TASA_POR_PS
+        self.rafaga_por_ps = GC_RAFAGA_POR_PS
+
+    def fijar_tasa(self, tasa: float = None, rafaga: float = None):
+        """Cambia el límite por PS, también para los PS ya conocidos"""
+        self.tasa_por_ps = tasa if tasa is not None else self.tasa_por_ps
+        self.rafaga_por_ps = rafaga if rafaga is not None else self.rafaga_por_ps
+        for bucket in self.buckets.values():
+            bucket.tasa, bucket.capacidad = self.tasa_por_ps, self.rafaga_por_ps
+
+    def _rechazo(self, razon: str, espera_ms: int, mensaje: str):
+        self.rechazos += 1
+        return {
+            "ok": False,
+            "razon": razon,
+            "mensaje": mensaje,
+            "reintentar_en_ms": espera_ms,
+        }
+
+    def admitir(self, ps_id: str, operacion: str, eventos_pendientes: int):
+        """Devuelve None si se admite, o la respuesta de rechazo a enviar al PS"""
+        if self.pausado:
+            return self._rechazo("OCUPADO", 1000, "GC en pausa.")
+        bucket = self.buckets.get(ps_id)
+        if bucket is None:
+            bucket = self.buckets[ps_id] = TokenBucket(self.tasa_por_ps, self.rafaga_por_ps)
+        if not bucket.consumir():
+            return self._rechazo("LIMITE_TASA", bucket.espera_ms(),
+                                 f"El PS '{ps_id}' supera su tasa permitida.")
+
+        if operacion in OPERACIONES_CONSULTA:
+            return None  # solo lectura: la acota la cola hacia el GA (GC_MAX_CONSULTAS)
+        if operacion == "prestamo":
+            self._decaer()
+            espera_estimada = (self.en_cola + 1) * self.latencia_ms
+            # Solo los admitidos corrigen la EWMA: sin el sondeo con la cola vacía,
+            # una estimación por encima del plazo rechazaría préstamos para siempre
+            if self.en_cola > 0 and (self.en_cola >= self.max_cola_prestamos
+                                     or espera_estimada > self.plazo_respuesta_ms):
+                return self._rechazo("OCUPADO", int(espera_estimada),
+                                     "GC ocupado: demasiados préstamos en cola.")
+        elif eventos_pendientes >= self.max_cola_eventos:
+            return self._rechazo("OCUPADO", int(self.latencia_ms * eventos_pendientes / 10) + 1,
+                                 "GC ocupado: demasiados eventos pendientes.")
+        return None
+
+    def _decaer(self):
+        """Sin préstamos en curso, la estimación vuelve hacia LATENCIA_BASE_MS"""
+        ahora = time.monotonic()
+        if self.en_cola == 0 and self.latencia_ms > LATENCIA_BASE_MS:
+            factor = 0.5 ** ((ahora - self.ultima_actividad) / VIDA_MEDIA_LATENCIA_S)
+            self.latencia_ms = LATENCIA_BASE_MS + (self.latencia_ms - LATENCIA_BASE_MS) * factor
+        self.ultima_actividad = ahora
+
+    def registrar_fin(self, latencia_ms: float):
+        self.en_cola -= 1
+        self.latencia_ms = 0.8 * self.latencia_ms + 0.2 * latencia_ms
+        self.ultima_actividad = time.monotonic()
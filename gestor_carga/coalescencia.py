@@ -0,0 +1,80 @@
+#gestor_carga/coalescencia.py
+import time
+from collections import OrderedDict
+from comun.config import GC_TTL_RECIENTES_S, GC_MAX_RECIENTES
+
+# Respuestas que indican un fallo de infraestructura: no se guardan, el PS debe poder reintentar
+RAZONES_TRANSITORIAS = ("ERROR_ACTOR_PRESTAMOS", "GA_CRASH", "OCUPADO", "LIMITE_TASA", "SIN_CUPO")
+
+
+def clave_operacion(operacion: str, payload: dict) -> str:
+    """Clave para unir solicitudes idénticas en curso: (operacion, libro, usuario)"""
+    return f"{operacion}|{payload.get('libro_codigo')}|{payload.get('usuario_id')}"
+
+
+def clave_idempotencia(msg: dict):
+    """
+    Clave de reintento: el id de solicitud que manda el cliente, o None sin él.
+    Por contenido no se puede distinguir un reintento de una operación repetida
+    a propósito (dos renovaciones seguidas del mismo libro): sin id no se
+    reconocen reintentos, solo se unen préstamos idénticos en curso (EnVuelo).
+    """
+    if msg.get("id_solicitud"):
+        return str(msg["id_solicitud"])
+    return None
+
+
+class EnVuelo:
+    """Solicitudes idénticas en curso comparten una sola llamada al actor"""
+    def __init__(self):
+        self.esperando = {}  # clave_operacion -> [(sobre, clave_idempotencia o None), ...]
+        self.unidas = 0
+
+    def agregar(self, clave: str, sobre: list, idem: str) -> bool:
+        """Registra al solicitante; devuelve True si hay que hacer la llamada (es el primero)"""
+        lista = self.esperando.get(clave)
+        if lista is not None:
+            lista.append((sobre, idem))
+            self.unidas += 1
+            return False
+        self.esperando[clave] = [(sobre, idem)]
+        return True
+
+    def completar(self, clave: str):
+        """Devuelve todos los solicitantes que esperaban el resultado de 'clave'"""
+        return self.esperando.pop(clave, [])
+
+
+class CacheRecientes:
+    """Resultados recién completados por clave de idempotencia, con TTL corto (sin clave no se guarda nada)"""
+    def __init__(self, ttl: float = GC_TTL_RECIENTES_S, maximo: int = GC_MAX_RECIENTES):
+        self.ttl = ttl
+        self.maximo = maximo
+        self.entradas = OrderedDict()  # clave -> (expira, respuesta)
+        self.aciertos = 0
+
+    def obtener(self, clave: str):
+        if clave is None:
+            return None
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            return None
+        expira, resp = entrada
+        if expira < time.monotonic():
+            del self.entradas[clave]
+            return None
+        self.aciertos += 1
+        return resp
+
+    def guardar(self, clave: str, resp: dict):
+        if clave is None or resp.get("razon") in RAZONES_TRANSITORIAS:
+            return
+        self.entradas[clave] = (time.monotonic() + self.ttl, resp)
+        self.entradas.move_to_end(clave)
+        # Las entradas se insertan en orden de expiración: se purgan por el frente
+        ahora = time.monotonic()
+        while self.entradas:
+            clave_vieja, (expira, _) = next(iter(self.entradas.items()))
+            if expira >= ahora and len(self.entradas) <= self.maximo:
+                break
+            del self.entradas[clave_vieja]
@@ -1,168 +1,534 @@
 # gestor_carga/gc.py
 
 import argparse
-from gestor_carga.heartbeat_monitor import HeartbeatMonitor
-from comun.config import (
-    GA_SEDE1_HEARTBEAT_ENDPOINT,
-    GA_SEDE2_HEARTBEAT_ENDPOINT,
+import itertools
+import os
+import queue
+import threading
+import time
+import zmq
+from collections import Counter, deque
+from gestor_carga.heartbeat_monitor import HeartbeatMonitor, MonitorMembresia
+from comun.membresia import iniciar_reporte_membresia, MedidorCarga
+from comun.perfilado import instalar_senal_perfil
+from comun.administracion import Ajustes, ServidorAdmin
+from gestor_carga.admision import ControlAdmision
+from gestor_carga.coalescencia import (
+    EnVuelo,
+    CacheRecientes,
+    clave_operacion,
+    clave_idempotencia,
 )
+from gestor_almacenamiento.tabla_disponibilidad import TablaDisponibilidad, respuesta_disponibilidad
 from comun.config import (
-    GC_SEDE1_ENDPOINT_REQREP,
-    GC_SEDE2_ENDPOINT_REQREP,
-    GC_SEDE1_ENDPOINT_PUB,
-    GC_SEDE2_ENDPOINT_PUB,
-    ACTOR_PRESTAMOS_SEDE1_ENDPOINT,
-    ACTOR_PRESTAMOS_SEDE2_ENDPOINT,
+    SEDES,
+    get_bd_paths_for_sede,
+    rol_en_este_host,
+    get_peers,
+    endpoints_bind,
+    endpoint_conexion,
     TOPIC_DEVOLUCION,
     TOPIC_RENOVACION,
+    GC_LOTE_EVENTOS,
+    GC_MAX_CONSULTAS,
+    OPERACIONES_CONSULTA,
+    MEMBRESIA_HABILITADA,
+    REQ_TIMEOUT_MS,
+    ZMQ_HWM_EVENTOS,
 )
 from comun.zeromq_utils import (
     create_context,
-    create_rep_socket,
+    create_router_socket,
     create_req_socket,
-    create_pub_socket,
+    create_xpub_socket,
     encode_message,
     decode_message,
+    split_envelope,
+    ContadoresFlujo,
+    GeneradorIds,
 )
 
 
+# Canal interno trabajador de préstamos -> loop principal
+ENDPOINT_RESULTADOS = "inproc://gc-resultados-prestamos"
+
+
 def get_endpoints_for_sede(sede: int):
-    """Devuelve los endpoints del GC (REQ/REP,PUB) y del actor de prestamos para una sede"""
-    if sede == 1:
-        return {
-            "gc_reqrep": GC_SEDE1_ENDPOINT_REQREP,
-            "gc_pub": GC_SEDE1_ENDPOINT_PUB,
-            "actor_prestamos": ACTOR_PRESTAMOS_SEDE1_ENDPOINT,
-        }
-    elif sede == 2:
-        return {
-            "gc_reqrep": GC_SEDE2_ENDPOINT_REQREP,
-            "gc_pub": GC_SEDE2_ENDPOINT_PUB,
-            "actor_prestamos": ACTOR_PRESTAMOS_SEDE2_ENDPOINT,
+    """Devuelve los endpoints del GC (REQ/REP,PUB: listas para bind), del actor de prestamos y del heartbeat del GA para una sede"""
+    return {
+        "gc_reqrep": endpoints_bind(sede, "gc_reqrep"),
+        "gc_pub": endpoints_bind(sede, "gc_pub"),
+        "actor_prestamos": endpoint_conexion(sede, "actor_prestamos"),
+        "ga_heartbeat": endpoint_conexion(sede, "ga_heartbeat"),
+    }
+
+
+def trabajador_prestamos(context, actor_prestamos_endpoint: str, monitor, cola: queue.Queue, ajustes: Ajustes):
+    """
+    Hilo que atiende los préstamos en orden de llegada contra el Actor de préstamos.
+    Devuelve cada resultado al loop principal por inproc (los sockets ZMQ no se
+    comparten entre hilos), etiquetado con la clave de la operación para que el
+    loop responda a todos los PS que esperaban esa misma operación.
+    """
+    socket_req_actor = create_req_socket(context, actor_prestamos_endpoint, ajustes["timeout_actor_ms"])
+    socket_resultados = context.socket(zmq.PUSH)
+    socket_resultados.connect(ENDPOINT_RESULTADOS)
+    version_ajustes = ajustes.version
+
+    while True:
+        clave, operacion, payload, id_solicitud = cola.get()
+        t_inicio = time.time()
+        if ajustes.version != version_ajustes:
+            # El timeout se aplica en este hilo, dueño del socket
+            version_ajustes = ajustes.version
+            socket_req_actor.setsockopt(zmq.RCVTIMEO, ajustes["timeout_actor_ms"])
+            socket_req_actor.setsockopt(zmq.SNDTIMEO, ajustes["timeout_actor_ms"])
+
+        usar_backup = False
+        if not monitor.ga_vivo:
+            usar_backup = True
+            print("[GC] Detectado GA muerto (Heartbeat). Solicitando backup.")
+
+        # Prestamo (o lote de préstamos) -> llamada síncrona al actor de prestamos
+        msg_actor = {
+            "operacion": operacion,
+            "payload": payload,
+            "usar_backup": usar_backup,
+            "id_solicitud": id_solicitud,
         }
-    else:
-        raise ValueError("La sede debe ser 1 o 2")
+        try:
+            socket_req_actor.send(encode_message(msg_actor))
+            raw_resp = socket_req_actor.recv()
+            resp_actor = decode_message(raw_resp)
+        except Exception as e:
+            print(f"[GC] Error/Timeout con Actor Prestamos: {e}")
+            print("[GC] Reiniciando conexión con Actor...")
+            # LAZY PIRATE: Cerramos y reabrimos socket para limpiar estado ZMQ
+            socket_req_actor.close()
+            socket_req_actor = create_req_socket(context, actor_prestamos_endpoint, ajustes["timeout_actor_ms"])
+
+            resp_actor = {
+                "ok": False,
+                "razon": "ERROR_ACTOR_PRESTAMOS",
+                "mensaje": f"El Actor de Préstamos no responde (posible fallo de GA). Reintente.",
+            }
+
+        latencia_ms = (time.time() - t_inicio) * 1000
+        socket_resultados.send_multipart([clave.encode(), encode_message(resp_actor), str(latencia_ms).encode()])
+
+
+def abrir_tabla_disponibilidad(sede: int):
+    """
+    Tabla de disponibilidad del GA de la sede en solo lectura (mmap), o None si
+    no está en esta máquina o el GA aún no la creó: entonces se consulta al GA.
+    """
+    if not rol_en_este_host(sede, "ga"):
+        return None
+    try:
+        return TablaDisponibilidad(get_bd_paths_for_sede(sede)["disponibilidad"], solo_lectura=True)
+    except (OSError, ValueError):
+        return None
+
+
+def crear_socket_consultas(context, endpoint: str):
+    """
+    DEALER hacia el REP de un GA para las consultas de solo lectura
+    (búsqueda, préstamos de un usuario; disponibilidad si la tabla no está en este host).
+    El mensaje lleva el sobre del PS: el REP lo devuelve con la respuesta y el
+    GC la reenvía tal cual al ROUTER, sin esperar ni guardar estado por consulta.
+    """
+    socket = context.socket(zmq.DEALER)
+    socket.setsockopt(zmq.SNDHWM, GC_MAX_CONSULTAS)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.IMMEDIATE, 1)  # sin GA conectado el envío falla (OCUPADO) en vez de encolarse
+    socket.connect(endpoint)
+    return socket
+
+
+def responder(socket_router, sobre: list, data: dict):
+    """Responde a un PS (REQ o DEALER asíncrono) a través del ROUTER, con su sobre original"""
+    socket_router.send_multipart(sobre + [encode_message(data)])
+
+
+def registrar_suscripciones(socket_pub, suscriptores: Counter):
+    """Lee las (des)suscripciones que entrega el XPUB: 1/0 + tópico"""
+    while True:
+        try:
+            frame = socket_pub.recv(zmq.NOBLOCK)
+        except zmq.Again:
+            return
+        if frame:
+            suscriptores[frame[1:]] += 1 if frame[0] == 1 else -1
+
+
+def publicar_eventos(socket_pub, eventos_pendientes: deque, lote: int, suscriptores: Counter,
+                     contadores: ContadoresFlujo, seq: Counter) -> bool:
+    """
+    Publica hasta 'lote' eventos sin descartar ninguno: si un tópico no tiene
+    suscriptores o la cola de su actor está llena (HWM), sus eventos se retienen
+    en orden y se sigue con los demás tópicos. Cada evento lleva una secuencia
+    por tópico para que el actor cuente pérdidas.
+    Devuelve True si quedó algún tópico retenido.
+    """
+    retenidos = deque()
+    detenidos = set()
+    publicados = 0
+    while eventos_pendientes and publicados < lote:
+        topic, evento = eventos_pendientes.popleft()
+        if topic in detenidos or not any(n > 0 and topic.startswith(t) for t, n in suscriptores.items()):
+            detenidos.add(topic)
+            retenidos.append((topic, evento))
+            continue
+        evento["seq"] = seq[topic] + 1
+        try:
+            socket_pub.send_multipart([topic, encode_message(evento)], zmq.NOBLOCK)
+        except zmq.Again:
+            contadores.bloqueados += 1
+            detenidos.add(topic)
+            retenidos.append((topic, evento))
+            continue
+        seq[topic] += 1
+        contadores.enviados += 1
+        publicados += 1
+    eventos_pendientes.extendleft(reversed(retenidos))
+    return bool(detenidos)
 
 
 def run_gc(sede: int):
     """Gestor de Carga (GC) de una sede"""
     endpoints = get_endpoints_for_sede(sede)
+    muestreador = instalar_senal_perfil(f"gc-sede{sede}")
 
     gc_reqrep_endpoint = endpoints["gc_reqrep"]
     gc_pub_endpoint = endpoints["gc_pub"]
     actor_prestamos_endpoint = endpoints["actor_prestamos"]
 
     # Monitor
-    if sede == 1:
-        hb_endpoint = GA_SEDE1_HEARTBEAT_ENDPOINT
-    else:
-        hb_endpoint = GA_SEDE2_HEARTBEAT_ENDPOINT
+    hb_endpoint = endpoints["ga_heartbeat"]
 
-    monitor = HeartbeatMonitor(hb_endpoint)
+    if MEMBRESIA_HABILITADA:
+        monitor = MonitorMembresia(f"ga-{sede}")
+    else:
+        monitor = HeartbeatMonitor(hb_endpoint)
     monitor.start()
 
     print(f"[GC Sede {sede}] Monitor de heartbeat iniciado en {hb_endpoint}")
-    print(f"[GC Sede {sede}] Escuchando PS en {gc_reqrep_endpoint}")
-    print(f"[GC Sede {sede}] Publicando eventos en {gc_pub_endpoint}")
+    print(f"[GC Sede {sede}] Escuchando PS en {', '.join(gc_reqrep_endpoint)}")
+    print(f"[GC Sede {sede}] Publicando eventos en {', '.join(gc_pub_endpoint)}")
     print(f"[GC Sede {sede}] Actor de préstamos en {actor_prestamos_endpoint}")
 
     context = create_context()
-    # Socket (REP) para hablar con PS
-    socket_rep_ps = create_rep_socket(context, gc_reqrep_endpoint)
+    # Socket (ROUTER) para hablar con PS: permite tener varias solicitudes en curso
+    socket_router_ps = create_router_socket(context, gc_reqrep_endpoint)
     # Socket (PUB) para enviar devoluciones/renovaciones a los actores
-    socket_pub = create_pub_socket(context, gc_pub_endpoint)
-    # Socket (REQ) para hablar con el Actor de prestamos
-    socket_req_actor = create_req_socket(context, actor_prestamos_endpoint)
+    # (XPUB sin pérdidas: con la cola de un actor llena los eventos se retienen aquí)
+    socket_pub = create_xpub_socket(context, gc_pub_endpoint, ZMQ_HWM_EVENTOS)
+    # Resultados de préstamos que devuelve el hilo trabajador
+    socket_resultados = context.socket(zmq.PULL)
+    socket_resultados.bind(ENDPOINT_RESULTADOS)
+    # Consultas: al GA de la sede y, si está caído, al de la sede más cercana
+    socket_consultas = crear_socket_consultas(context, endpoint_conexion(sede, "ga"))
+    peers = get_peers(sede)
+    socket_consultas_respaldo = crear_socket_consultas(context, endpoint_conexion(peers[0], "ga")) if peers else None
+    consultas = Counter()
+    tabla_disponibilidad = abrir_tabla_disponibilidad(sede)
+
+    admision = ControlAdmision()
+    # Ajustes en caliente (socket de administración, ver comun/administracion.py)
+    ajustes = Ajustes(timeout_actor_ms=REQ_TIMEOUT_MS, lote_eventos=GC_LOTE_EVENTOS,
+                      hwm_pub=ZMQ_HWM_EVENTOS)
+    ajustes.definir("max_cola_prestamos", admision.max_cola_prestamos,
+                    lambda v: setattr(admision, "max_cola_prestamos", v))
+    ajustes.definir("max_cola_eventos", admision.max_cola_eventos,
+                    lambda v: setattr(admision, "max_cola_eventos", v))
+    ajustes.definir("plazo_respuesta_ms", admision.plazo_respuesta_ms,
+                    lambda v: setattr(admision, "plazo_respuesta_ms", v))
+    ajustes.definir("tasa_por_ps", admision.tasa_por_ps, lambda v: admision.fijar_tasa(tasa=v))
+    ajustes.definir("rafaga_por_ps", admision.rafaga_por_ps, lambda v: admision.fijar_tasa(rafaga=v))
+    version_ajustes = ajustes.version
+
+    cola_prestamos = queue.Queue()
+    threading.Thread(
+        target=trabajador_prestamos,
+        args=(context, actor_prestamos_endpoint, monitor, cola_prestamos, ajustes),
+        daemon=True,
+    ).start()
+    # Préstamos idénticos en curso y resultados recientes para reintentos
+    en_vuelo = EnVuelo()
+    recientes = CacheRecientes()
+    # Lotes de carga masiva esperando la respuesta del actor: clave -> (sobre, resultados, índices préstamo)
+    lotes_pendientes = {}
+    contador_lotes = itertools.count()
+    # Ids de solicitud para los PS que no los mandan (el GA aplica cada id una sola vez)
+    ids = GeneradorIds(f"gc{sede}")
+    # Eventos de baja prioridad (devolución/renovación) ya confirmados al PS, pendientes de publicar
+    eventos_pendientes = deque()
+    # Flujo hacia los actores: suscriptores por tópico, contadores y secuencia por tópico
+    suscriptores = Counter()
+    contadores_pub = ContadoresFlujo()
+    seq_eventos = Counter()
+    retenidos = False
+
+    medidor = MedidorCarga()
+    drenando = threading.Event()
+    if MEMBRESIA_HABILITADA:
+        iniciar_reporte_membresia("gc", sede, lambda: {
+            "estado": "DRENANDO" if drenando.is_set() else "OK",
+            "carga": medidor.tasa(),
+            "cola": admision.en_cola + len(eventos_pendientes),
+        })
+
+    def drenado() -> bool:
+        return admision.pausado and admision.en_cola + len(eventos_pendientes) == 0 and not lotes_pendientes
+
+    def estado_admin():
+        return {
+            "en_cola_prestamos": admision.en_cola,
+            "eventos_pendientes": len(eventos_pendientes),
+            "lotes_pendientes": len(lotes_pendientes),
+            "en_vuelo": len(en_vuelo.esperando),
+            "latencia_ms": round(admision.latencia_ms, 2),
+            "rechazos": admision.rechazos,
+            "solicitudes": medidor.total,
+            "eventos_publicados": contadores_pub.enviados,
+            "bloqueos_hwm": contadores_pub.bloqueados,
+            "suscriptores": {t.decode(errors="replace"): n for t, n in suscriptores.items() if n > 0},
+            "consultas": dict(consultas),
+            "pausado": admision.pausado,
+            "drenando": drenando.is_set(),
+            "drenado": drenado(),
+        }
+
+    def pausar(msg):
+        admision.pausado = True
+        return {"pausado": True}
+
+    def reanudar(msg):
+        admision.pausado = False
+        drenando.clear()
+        return {"pausado": False}
+
+    def drenar(msg):
+        # No se admite nada nuevo (los PS reciben OCUPADO y reintentan); lo aceptado
+        # termina de salir (ver "drenado" en estado)
+        admision.pausado = True
+        drenando.set()
+        return {"pendientes": admision.en_cola + len(eventos_pendientes)}
+
+    def terminar(msg):
+        if not drenado() and not msg.get("forzar"):
+            raise ValueError("El GC no está drenado: 'drenar' y esperar 'drenado' en estado")
+        print(f"[GC Sede {sede}] Terminando")
+        # Un segundo para responder y que ZMQ entregue los últimos eventos publicados
+        threading.Timer(1.0, os._exit, (0,)).start()
+        return {"eventos_publicados": contadores_pub.enviados}
+
+    ServidorAdmin("gc", sede, ajustes, estado_admin, muestreador) \
+        .comando("pausar", pausar).comando("reanudar", reanudar).comando("drenar", drenar) \
+        .comando("terminar", terminar).start()
+
+    poller = zmq.Poller()
+    poller.register(socket_router_ps, zmq.POLLIN)
+    poller.register(socket_resultados, zmq.POLLIN)
+    poller.register(socket_pub, zmq.POLLIN)  # suscripciones de los actores
+    poller.register(socket_consultas, zmq.POLLIN)
+    if socket_consultas_respaldo is not None:
+        poller.register(socket_consultas_respaldo, zmq.POLLIN)
 
     while True:
-        # Recibir mensaje desde PS
-        raw = socket_rep_ps.recv()
-        msg_ps = decode_message(raw)
+        if ajustes.version != version_ajustes:
+            # Opciones de socket: se aplican en el hilo dueño del socket
+            version_ajustes = ajustes.version
+            socket_pub.setsockopt(zmq.SNDHWM, ajustes["hwm_pub"])
+
+        # Si hay eventos por publicar no nos bloqueamos esperando; si todos están
+        # retenidos (actores llenos o ausentes) se reintenta cada 10 ms
+        if not eventos_pendientes:
+            espera = None
+        else:
+            espera = 10 if retenidos else 0
+        socks = dict(poller.poll(espera))
 
-        operacion = msg_ps.get("operacion")
-        payload = msg_ps.get("payload", {}) or {}
+        if socket_pub in socks:
+            registrar_suscripciones(socket_pub, suscriptores)
 
-        if operacion == "prestamo":
-            usar_backup = False
+        # 1. Resultados de préstamos -> responder al PS con el resultado real
+        while socket_resultados in socks:
             try:
-                if not monitor.ga_vivo:
-                    usar_backup = True
-                    print("[GC] Detectado GA muerto (Heartbeat). Solicitando backup.")
-            except NameError:
-                usar_backup = False
-
-            # Prestamo -> llamada síncrona al actor de prestamos
-            msg_actor = {
-                "operacion": "prestamo",
-                "payload": payload,
-                "usar_backup": usar_backup,
-            }
+                clave, raw_resp, latencia = socket_resultados.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            admision.registrar_fin(float(latencia))
+            resp = decode_message(raw_resp)
+            clave = clave.decode()
+            if clave in lotes_pendientes:
+                # Completar los resultados por línea del lote con los de los préstamos
+                sobre, resultados, indices = lotes_pendientes.pop(clave)
+                parciales = resp.get("resultados") or [resp] * len(indices)
+                for i, r in zip(indices, parciales):
+                    resultados[i] = r
+                responder(socket_router_ps, sobre, {"ok": True, "resultados": resultados})
+                continue
+            for sobre, idem in en_vuelo.completar(clave):
+                recientes.guardar(idem, resp)
+                socket_router_ps.send_multipart(sobre + [raw_resp])
+
+        # 1b. Respuestas de consultas: ya traen el sobre del PS
+        for socket in (socket_consultas, socket_consultas_respaldo):
+            while socket is not None and socket in socks:
+                try:
+                    frames = socket.recv_multipart(zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                consultas["respondidas"] += 1
+                socket_router_ps.send_multipart(frames)
+
+        # 2. Nuevas solicitudes de los PS
+        while socket_router_ps in socks:
             try:
-                socket_req_actor.send(encode_message(msg_actor))
-                raw_resp = socket_req_actor.recv()
-                resp_actor = decode_message(raw_resp)
-            except Exception as e:
-                print(f"[GC] Error/Timeout con Actor Prestamos: {e}")
-                print("[GC] Reiniciando conexión con Actor...")
-                # LAZY PIRATE: Cerramos y reabrimos socket para limpiar estado ZMQ
-                socket_req_actor.close()
-                socket_req_actor = create_req_socket(context, actor_prestamos_endpoint)
-
-                resp_actor = {
+                sobre, raw = split_envelope(socket_router_ps.recv_multipart(zmq.NOBLOCK))
+            except zmq.Again:
+                break
+            msg_ps = decode_message(raw)
+            medidor.registrar()
+
+            operacion = msg_ps.get("operacion")
+            payload = msg_ps.get("payload", {}) or {}
+            ps_id = msg_ps.get("ps_id") or sobre[0].hex()
+
+            if operacion == "lote":
+                # Carga masiva: préstamos en una sola llamada al actor, devoluciones y
+                # renovaciones en un solo evento por tópico
+                items = msg_ps.get("items", [])
+                hay_prestamos = any(it.get("operacion") == "prestamo" for it in items)
+                rechazo = admision.admitir(ps_id, "prestamo" if hay_prestamos else "lote", len(eventos_pendientes))
+                if rechazo is not None:
+                    responder(socket_router_ps, sobre, rechazo)
+                    continue
+
+                resultados = [None] * len(items)
+                indices_prestamo = []
+                eventos_lote = {TOPIC_DEVOLUCION: [], TOPIC_RENOVACION: []}
+                for i, it in enumerate(items):
+                    op_item = it.get("operacion")
+                    it["id_solicitud"] = it.get("id_solicitud") or ids.nuevo()
+                    if op_item == "prestamo":
+                        indices_prestamo.append(i)
+                    elif op_item in ("devolucion", "renovacion"):
+                        topic = TOPIC_DEVOLUCION if op_item == "devolucion" else TOPIC_RENOVACION
+                        eventos_lote[topic].append({"operacion": op_item, "payload": it.get("payload", {}),
+                                                    "id_solicitud": it["id_solicitud"]})
+                        resultados[i] = {"ok": True, "tipo": op_item, "mensaje": "Encolada para procesamiento."}
+                    else:
+                        resultados[i] = {"ok": False, "razon": "OPERACION_DESCONOCIDA",
+                                         "mensaje": f"Operación '{op_item}' no soportada por el GC."}
+
+                for topic, sub_items in eventos_lote.items():
+                    if sub_items:
+                        evento = {"operacion": "lote", "payload": {"items": sub_items}, "sede": sede}
+                        eventos_pendientes.append((topic, evento))
+
+                if indices_prestamo:
+                    clave = f"lote|{next(contador_lotes)}"
+                    lotes_pendientes[clave] = (sobre, resultados, indices_prestamo)
+                    admision.en_cola += 1
+                    sub_items = [{"operacion": "prestamo", "payload": items[i].get("payload", {}),
+                                  "id_solicitud": items[i]["id_solicitud"]} for i in indices_prestamo]
+                    cola_prestamos.put((clave, "lote", {"items": sub_items}, None))
+                else:
+                    responder(socket_router_ps, sobre, {"ok": True, "resultados": resultados})
+                continue
+
+            if operacion in OPERACIONES_CONSULTA:
+                # Solo lectura: no pasa por el actor ni por la cola de préstamos
+                rechazo = admision.admitir(ps_id, operacion, len(eventos_pendientes))
+                if rechazo is None and operacion == "disponibilidad" and monitor.ga_vivo:
+                    # Se lee la tabla que mantiene el GA local (con el GA caído
+                    # quedaría desactualizada: responde el respaldo)
+                    try:
+                        if tabla_disponibilidad is None:
+                            tabla_disponibilidad = abrir_tabla_disponibilidad(sede)
+                        else:
+                            tabla_disponibilidad.renovar()
+                    except (OSError, ValueError):
+                        tabla_disponibilidad = None
+                    if tabla_disponibilidad is not None and tabla_disponibilidad.version >= 0:
+                        responder(socket_router_ps, sobre,
+                                  respuesta_disponibilidad(tabla_disponibilidad, payload.get("libro_codigo")))
+                        consultas["locales"] += 1
+                        continue
+                if rechazo is None:
+                    socket = socket_consultas
+                    if not monitor.ga_vivo and socket_consultas_respaldo is not None:
+                        socket = socket_consultas_respaldo
+                        consultas["respaldo"] += 1
+                    try:
+                        socket.send_multipart(sobre + [raw], zmq.NOBLOCK)
+                        consultas["enviadas"] += 1
+                    except zmq.Again:
+                        consultas["rechazadas"] += 1
+                        rechazo = {"ok": False, "razon": "OCUPADO", "reintentar_en_ms": 200,
+                                   "mensaje": "Consulta no enviada: GA no disponible o demasiadas en curso."}
+                if rechazo is not None:
+                    responder(socket_router_ps, sobre, rechazo)
+                continue
+
+            if operacion not in ("prestamo", "devolucion", "renovacion"):
+                # Operacion desconocida
+                resp = {
                     "ok": False,
-                    "razon": "ERROR_ACTOR_PRESTAMOS",
-                    "mensaje": f"El Actor de Préstamos no responde (posible fallo de GA). Reintente.",
+                    "razon": "OPERACION_DESCONOCIDA",
+                    "mensaje": f"Operación '{operacion}' no soportada por el GC.",
                 }
+                responder(socket_router_ps, sobre, resp)
+                continue
 
-            # Responder al PS con el resultado real
-            socket_rep_ps.send(encode_message(resp_actor))
+            # Reintento (mismo id_solicitud) de algo ya resuelto: se responde con el resultado original
+            idem = clave_idempotencia(msg_ps)
+            resp = recientes.obtener(idem)
+            if resp is not None:
+                responder(socket_router_ps, sobre, resp)
+                continue
 
-        elif operacion == "devolucion":
-            # Devolución -> responder al PS
-            ack = {
-                "ok": True,
-                "tipo": "devolucion",
-                "mensaje": "Solicitud de devolución recibida y encolada para procesamiento.",
-            }
-            socket_rep_ps.send(encode_message(ack))
+            # Préstamo idéntico ya en curso: se une a esa llamada, sin ir al actor
+            clave = clave_operacion(operacion, payload)
+            if operacion == "prestamo" and clave in en_vuelo.esperando:
+                en_vuelo.agregar(clave, sobre, idem)
+                continue
 
-            # Publicar evento para actores
-            evento = {
-                "operacion": "devolucion",
-                "payload": payload,
-                "sede": sede,
-            }
-            socket_pub.send_multipart(
-                [TOPIC_DEVOLUCION, encode_message(evento)]
-            )
-
-        elif operacion == "renovacion":
-            # Renovación -> responder al PS
-            ack = {
-                "ok": True,
-                "tipo": "renovacion",
-                "mensaje": "Solicitud de renovacion recibida y encolada para procesamiento.",
-            }
-            socket_rep_ps.send(encode_message(ack))
+            rechazo = admision.admitir(ps_id, operacion, len(eventos_pendientes))
+            if rechazo is not None:
+                responder(socket_router_ps, sobre, rechazo)
+                continue
 
-            # Publicar evento para actores
-            evento = {
-                "operacion": "renovacion",
-                "payload": payload,
-                "sede": sede,
-            }
-            socket_pub.send_multipart(
-                [TOPIC_RENOVACION, encode_message(evento)]
-            )
+            id_solicitud = msg_ps.get("id_solicitud") or ids.nuevo()
+            if operacion == "prestamo":
+                admision.en_cola += 1
+                en_vuelo.agregar(clave, sobre, idem)
+                cola_prestamos.put((clave, "prestamo", payload, id_solicitud))
 
-        else:
-            # Operacion desconocida
-            resp = {
-                "ok": False,
-                "razon": "OPERACION_DESCONOCIDA",
-                "mensaje": f"Operación '{operacion}' no soportada por el GC.",
-            }
-            socket_rep_ps.send(encode_message(resp))
+            else:
+                # Devolución/Renovación -> responder al PS y encolar el evento
+                ack = {
+                    "ok": True,
+                    "tipo": operacion,
+                    "mensaje": f"Solicitud de {operacion} recibida y encolada para procesamiento.",
+                }
+                responder(socket_router_ps, sobre, ack)
+                recientes.guardar(idem, ack)
+                topic = TOPIC_DEVOLUCION if operacion == "devolucion" else TOPIC_RENOVACION
+                evento = {
+                    "operacion": operacion,
+                    "payload": payload,
+                    "sede": sede,
+                    "id_solicitud": id_solicitud,
+                }
+                eventos_pendientes.append((topic, evento))
+
+        # 3. Publicar eventos: los préstamos tienen prioridad sobre el GA,
+        # mientras haya préstamos en cola solo sale un evento por vuelta
+        lote = ajustes["lote_eventos"] if admision.en_cola == 0 else 1
+        retenidos = publicar_eventos(socket_pub, eventos_pendientes, lote, suscriptores, contadores_pub, seq_eventos)
 
 
 if __name__ == "__main__":
@@ -170,7 +536,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "--sede",
         type=int,
-        choices=[1, 2],
+        choices=SEDES,
         required=True,
         help="Número de sede (1 o 2)",
     )
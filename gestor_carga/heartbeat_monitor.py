@@ -4,18 +4,22 @@ import json
 import threading
 import zmq
 from comun.config import HEARTBEAT_TIMEOUT_SECONDS
+from comun.membresia import VistaMembresia
 
 class HeartbeatMonitor:
     """ Monitor heartbeat para el GC
-    Se conecta al PUB del GA y detecta si esta vivo
+    Se conecta al PUB del GA y detecta si esta vivo.
+    Un GA que anuncia "DRENANDO" (reinicio sin corte) cuenta como no vivo:
+    los préstamos pasan al respaldo sin esperar el timeout.
     """
     def __init__(self, endpoint: str):
         self.endpoint = endpoint
         self.ga_vivo = False
         self.ultimo_timestamp = 0
+        self.estado = "OK"
 
     def start(self):
-        ctx = zmq.Context()
+        ctx = zmq.Context.instance()
         socket_sub = ctx.socket(zmq.SUB)
         socket_sub.connect(self.endpoint)
         socket_sub.setsockopt(zmq.SUBSCRIBE, b"HEARTBEAT")
@@ -27,7 +31,11 @@ class HeartbeatMonitor:
                     topic, raw_msg = socket_sub.recv_multipart()
                     data = json.loads(raw_msg.decode("utf-8"))
                     self.ultimo_timestamp = data["timestamp"]
-                    self.ga_vivo = True
+                    estado = data.get("estado", "OK")
+                    if estado != self.estado:
+                        print(f"[GC] GA primario: {estado}")
+                        self.estado = estado
+                    self.ga_vivo = estado == "OK"
                 except Exception as e:
                     print(f"[GC] ERROR en monitor HB: {e}")
 
@@ -39,7 +47,25 @@ class HeartbeatMonitor:
                     print("[GC] ALERTA: GA primario NO responde.")
                     self.ga_vivo = False
                 else:
-                    self.ga_vivo = True
+                    self.ga_vivo = self.estado == "OK"
 
         threading.Thread(target=escuchar, daemon=True).start()
         threading.Thread(target=verificar, daemon=True).start()
+
+
+class MonitorMembresia:
+    """ Alternativa a HeartbeatMonitor cuando hay servicio de membresía:
+    en vez de suscribirse al GA, consulta la vista agregada del clúster
+    """
+    def __init__(self, ga_id: str):
+        self.ga_id = ga_id
+        self.vista = VistaMembresia()
+
+    def start(self):
+        self.vista.start()
+        print(f"[GC] Vida de {self.ga_id} tomada de la vista de membresía")
+
+    @property
+    def ga_vivo(self):
+        # Mientras la vista no conozca al GA se asume vivo (el actor igual hace failover)
+        return not self.vista.conocido(self.ga_id) or self.vista.esta_vivo(self.ga_id)
@@ -0,0 +1,82 @@
+#membresia/servicio.py
+import argparse
+import json
+import time
+from comun.config import (
+    MEMBRESIA_ENDPOINT_PULL,
+    MEMBRESIA_ENDPOINT_PUB,
+    TOPIC_MEMBRESIA,
+    HEARTBEAT_INTERVAL_SECONDS,
+    HEARTBEAT_TIMEOUT_SECONDS,
+)
+from comun.zeromq_utils import (
+    create_context,
+    create_pub_socket,
+    start_heartbeat_listener,
+    decode_message,
+)
+
+# Un miembro que no reporta en este tiempo se quita de la vista
+OLVIDAR_TRAS_SEGUNDOS = HEARTBEAT_TIMEOUT_SECONDS * 10
+
+
+def construir_vista(miembros: dict, ahora: float) -> dict:
+    """Vista compacta del clúster: un registro por miembro con vida, carga y cola"""
+    lista = []
+    for miembro_id, (recibido, data) in miembros.items():
+        edad = ahora - recibido
+        lista.append({
+            "id": miembro_id,
+            "componente": data.get("componente"),
+            "sede": data.get("sede"),
+            "vivo": edad <= HEARTBEAT_TIMEOUT_SECONDS,
+            "estado": data.get("estado", "OK"),
+            "version": data.get("version"),
+            "version_sw": data.get("version_sw"),
+            "carga": data.get("carga", 0),
+            "cola": data.get("cola", 0),
+            "edad_s": round(edad, 2),
+        })
+    return {"timestamp": ahora, "miembros": lista}
+
+
+def run_membresia(interval: float):
+    """Agregador de heartbeats:
+    - Recibe (PULL) los reportes de todos los GA, GC y actores
+    - Publica (PUB) cada 'interval' segundos una sola vista del clúster
+    """
+    context = create_context()
+    socket_pull = start_heartbeat_listener(context, MEMBRESIA_ENDPOINT_PULL)
+    socket_pub = create_pub_socket(context, MEMBRESIA_ENDPOINT_PUB)
+    print(f"[Membresia] Recibiendo heartbeats en {MEMBRESIA_ENDPOINT_PULL}")
+    print(f"[Membresia] Publicando vista en {MEMBRESIA_ENDPOINT_PUB}")
+
+    miembros = {}  # id -> (hora de recepción, último reporte)
+    proxima_publicacion = time.time()
+
+    while True:
+        espera_ms = max(0, int((proxima_publicacion - time.time()) * 1000))
+        if socket_pull.poll(espera_ms):
+            raw = socket_pull.recv()
+            if raw != b"HB":
+                try:
+                    data = decode_message(raw)
+                    miembros[data["id"]] = (time.time(), data)
+                except Exception as e:
+                    print(f"[Membresia] Reporte inválido: {e}")
+
+        ahora = time.time()
+        if ahora >= proxima_publicacion:
+            for miembro_id in [m for m, (t, _) in miembros.items() if ahora - t > OLVIDAR_TRAS_SEGUNDOS]:
+                print(f"[Membresia] {miembro_id} no reporta hace más de {OLVIDAR_TRAS_SEGUNDOS:.0f} s, se olvida")
+                del miembros[miembro_id]
+            vista = construir_vista(miembros, ahora)
+            socket_pub.send_multipart([TOPIC_MEMBRESIA, json.dumps(vista).encode("utf-8")])
+            proxima_publicacion = ahora + interval
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio de membresía del clúster")
+    parser.add_argument("--intervalo", type=float, default=HEARTBEAT_INTERVAL_SECONDS / 2)
+    args = parser.parse_args()
+    run_membresia(args.intervalo)
@@ -1,5 +1,6 @@
 # ps/ps.py
 import argparse
+import asyncio
 import time
 from pathlib import Path
 from comun.zeromq_utils import (
@@ -7,21 +8,26 @@ from comun.zeromq_utils import (
     create_req_socket,
     encode_message,
     safe_recv,
+    GeneradorIds,
 )
+from comun.zeromq_async import create_async_context, ClienteAsync
 from comun.config import (
-    GC_SEDE1_ENDPOINT_REQREP,
-    GC_SEDE2_ENDPOINT_REQREP,
+    SEDES,
+    endpoint_conexion,
+    PS_TIMEOUT_LOTE_MS,
+    ASYNC_MAX_EN_CURSO,
 )
 
+# Reintentos cuando el GC responde "ocupado, reintente en X ms" o no responde
+MAX_REINTENTOS_OCUPADO = 5
+# Respuestas que piden reintentar más tarde (SIN_CUPO: la sede espera cupo de otra).
+# Reintentar es seguro: la solicitud lleva su id_solicitud y el GA la aplica una sola vez
+RAZONES_REINTENTO = ("OCUPADO", "LIMITE_TASA", "SIN_CUPO", "ERROR_ACTOR_PRESTAMOS", "GA_CRASH", "DRENANDO")
+
 
 def get_gc_endpoint_for_sede(sede: int) -> str:
     """Devuelve el endpoint del Gestor de Carga (GC) a la sede dada"""
-    if sede == 1:
-        return GC_SEDE1_ENDPOINT_REQREP
-    elif sede == 2:
-        return GC_SEDE2_ENDPOINT_REQREP
-    else:
-        raise ValueError("La sede debe ser 1 o 2")
+    return endpoint_conexion(sede, "gc_reqrep")
 
 
 def parse_line(line: str):
@@ -55,11 +61,52 @@ def parse_line(line: str):
     return operacion, payload
 
 
+def enviar_solicitud(context, socket_req_gc, gc_endpoint: str, msg: dict, timeout_ms: int = 3000):
+    """
+    Envía una solicitud al GC y espera la respuesta.
+    - Implementa 'Lazy Pirate': si hay timeout, reinicia el socket y reenvía el mismo
+      mensaje (mismo id_solicitud: si ya se aplicó, el GA devuelve el resultado original).
+    - Si el GC responde ocupado, espera lo que indica y reintenta.
+    Devuelve (socket, respuesta); respuesta es None si no hubo respuesta.
+    """
+    resp = None
+    for intento in range(MAX_REINTENTOS_OCUPADO + 1):
+        try:
+            # Intentar enviar
+            socket_req_gc.send(encode_message(msg))
+
+            # Esperar respuesta
+            resp = safe_recv(socket_req_gc)
+
+            if resp is None:
+                print("[PS] No se recibió respuesta del GC (timeout). Reiniciando conexión...")
+                # FIX: Cerrar socket dañado y crear uno nuevo para la siguiente iteración
+                socket_req_gc.close()
+                socket_req_gc = create_req_socket(context, gc_endpoint, timeout_ms)
+                if intento < MAX_REINTENTOS_OCUPADO:
+                    continue
+            elif resp.get("razon") in RAZONES_REINTENTO and intento < MAX_REINTENTOS_OCUPADO:
+                # El GC pidió bajar el ritmo: esperar lo indicado y reintentar
+                espera_ms = resp.get("reintentar_en_ms", 500)
+                print(f"[PS] Solicitud no atendida por ahora ({resp['razon']}), reintento en {espera_ms} ms")
+                time.sleep(espera_ms / 1000)
+                continue
+
+        except Exception as e:
+            print(f"[PS] Error crítico de socket: {e}")
+            print("[PS] Reiniciando conexión...")
+            socket_req_gc.close()
+            socket_req_gc = create_req_socket(context, gc_endpoint, timeout_ms)
+            if intento < MAX_REINTENTOS_OCUPADO:
+                continue
+        break
+    return socket_req_gc, resp
+
+
 def run_ps(sede: int, archivo_solicitudes: Path):
     """PS:
     - Lee un archivo de texto línea por línea
     - Por cada línea válida envía una solicitud al GC
-    - Implementa 'Lazy Pirate': si hay timeout, reinicia el socket para no estallar.
     """
     if not archivo_solicitudes.exists():
         print(f"[PS] El archivo de solicitudes no existe: {archivo_solicitudes}")
@@ -68,6 +115,10 @@ def run_ps(sede: int, archivo_solicitudes: Path):
     print(f"[PS Sede {sede}] Usando GC en {gc_endpoint}")
     print(f"[PS Sede {sede}] Leyendo solicitudes de {archivo_solicitudes}")
 
+    # Identificador estable del PS para el límite de tasa del GC
+    ps_id = f"sede{sede}-{archivo_solicitudes.stem}"
+    ids = GeneradorIds(ps_id)
+
     context = create_context()
     socket_req_gc = create_req_socket(context, gc_endpoint)
 
@@ -81,32 +132,203 @@ def run_ps(sede: int, archivo_solicitudes: Path):
             msg = {
                 "operacion": operacion,
                 "payload": payload,
+                "ps_id": ps_id,
+                "id_solicitud": ids.nuevo(),
             }
             print(f"[PS] Enviando: {msg}")
 
-            try:
-                # Intentar enviar
-                socket_req_gc.send(encode_message(msg))
+            socket_req_gc, resp = enviar_solicitud(context, socket_req_gc, gc_endpoint, msg)
+            if resp is not None:
+                print(f"[PS] Respuesta GC: {resp}")
+
+            # Pausa entre solicitudes
+            time.sleep(0.5)
+
+
+def run_buscar(sede: int, texto: str, limite: int = 10):
+    """Búsqueda de libros por título/autor (consulta de solo lectura al GC)"""
+    gc_endpoint = get_gc_endpoint_for_sede(sede)
+    context = create_context()
+    socket_req_gc = create_req_socket(context, gc_endpoint)
+    msg = {"operacion": "buscar", "payload": {"texto": texto, "limite": limite}, "ps_id": f"sede{sede}-consultas"}
+    t_inicio = time.time()
+    socket_req_gc, resp = enviar_solicitud(context, socket_req_gc, gc_endpoint, msg)
+    socket_req_gc.close()
+    if resp is None or not resp.get("ok"):
+        print(f"[PS] Búsqueda sin respuesta: {resp}")
+        return
+    print(f"[PS] '{texto}': {resp['total']} coincidencias{' (se puntuaron las mejores)' if resp.get('truncado') else ''}"
+          f" en {(time.time() - t_inicio) * 1000:.1f} ms (versión BD {resp.get('version_bd')})")
+    for r in resp["resultados"]:
+        print(f"  {r['codigo']:<10} {r['puntaje']:6.2f}  disp {r['disponibles']:<3} {r['titulo']} — {r['autor']}")
+
+
+def run_prestamos_usuario(sede: int, usuario_id: str):
+    """Préstamos activos de un usuario (consulta de solo lectura al GC)"""
+    gc_endpoint = get_gc_endpoint_for_sede(sede)
+    context = create_context()
+    socket_req_gc = create_req_socket(context, gc_endpoint)
+    msg = {"operacion": "prestamos_usuario", "payload": {"usuario_id": usuario_id}, "ps_id": f"sede{sede}-consultas"}
+    socket_req_gc, resp = enviar_solicitud(context, socket_req_gc, gc_endpoint, msg)
+    socket_req_gc.close()
+    if resp is None or not resp.get("ok"):
+        print(f"[PS] Consulta sin respuesta: {resp}")
+        return
+    limite = resp.get("limite") or "sin límite"
+    print(f"[PS] {usuario_id}: {resp['cantidad']} préstamos activos (máximo {limite}, versión BD {resp.get('version_bd')})")
+    for p in resp["prestamos"]:
+        print(f"  {p['libro_codigo']:<10} entrega {p['fecha_entrega']}  renovaciones {p['renovaciones']}  {p['titulo']}")
+
+
+def run_disponibilidad(sede: int, libro_codigo: str):
+    """Ejemplares de un libro (consulta de solo lectura: el GC la responde de la tabla del GA)"""
+    gc_endpoint = get_gc_endpoint_for_sede(sede)
+    context = create_context()
+    socket_req_gc = create_req_socket(context, gc_endpoint)
+    msg = {"operacion": "disponibilidad", "payload": {"libro_codigo": libro_codigo}, "ps_id": f"sede{sede}-consultas"}
+    socket_req_gc, resp = enviar_solicitud(context, socket_req_gc, gc_endpoint, msg)
+    socket_req_gc.close()
+    if resp is None or not resp.get("ok"):
+        print(f"[PS] Consulta sin respuesta: {resp}")
+        return
+    print(f"[PS] {libro_codigo}: {resp['disponibles']} de {resp['totales']} disponibles,"
+          f" {resp['prestamos']} préstamos activos (versión BD {resp.get('version_bd')})")
 
-                # Esperar respuesta
-                resp = safe_recv(socket_req_gc)
 
+async def run_ps_async(sede: int, archivo_solicitudes: Path, max_en_curso: int = ASYNC_MAX_EN_CURSO):
+    """PS en modo asyncio:
+    - Mantiene hasta 'max_en_curso' solicitudes en curso sobre un solo socket DEALER
+    - Los timeouts cancelan la espera sin destruir el socket y se reenvía el mismo mensaje
+    - Si el GC responde ocupado, solo esa solicitud espera y reintenta
+    """
+    if not archivo_solicitudes.exists():
+        print(f"[PS] El archivo de solicitudes no existe: {archivo_solicitudes}")
+        return
+    gc_endpoint = get_gc_endpoint_for_sede(sede)
+    print(f"[PS Sede {sede}] (asyncio) Usando GC en {gc_endpoint}, hasta {max_en_curso} en curso")
+
+    ps_id = f"sede{sede}-{archivo_solicitudes.stem}"
+    ids = GeneradorIds(ps_id)
+    context = create_async_context()
+    cliente_gc = ClienteAsync(context, gc_endpoint)
+    limite = asyncio.Semaphore(max_en_curso)
+    tareas = set()
+
+    async def enviar(msg: dict):
+        try:
+            for intento in range(MAX_REINTENTOS_OCUPADO + 1):
+                resp = await cliente_gc.solicitar(msg)
                 if resp is None:
-                    print("[PS] No se recibió respuesta del GC (timeout). Reiniciando conexión...")
-                    # FIX: Cerrar socket dañado y crear uno nuevo para la siguiente iteración
-                    socket_req_gc.close()
-                    socket_req_gc = create_req_socket(context, gc_endpoint)
-                else:
-                    print(f"[PS] Respuesta GC: {resp}")
-
-            except Exception as e:
-                print(f"[PS] Error crítico de socket: {e}")
-                print("[PS] Reiniciando conexión...")
-                socket_req_gc.close()
-                socket_req_gc = create_req_socket(context, gc_endpoint)
+                    print(f"[PS] Timeout esperando al GC: {msg['payload']}")
+                    if intento < MAX_REINTENTOS_OCUPADO:
+                        continue  # mismo id_solicitud: el reenvío no se aplica dos veces
+                    return
+                if resp.get("razon") in RAZONES_REINTENTO and intento < MAX_REINTENTOS_OCUPADO:
+                    await asyncio.sleep(resp.get("reintentar_en_ms", 500) / 1000)
+                    continue
+                print(f"[PS] Respuesta GC: {resp}")
+                return
+        finally:
+            limite.release()
 
-            # Pausa entre solicitudes
-            time.sleep(0.5)
+    t_inicio = time.time()
+    total = 0
+    with archivo_solicitudes.open("r", encoding="utf-8") as f:
+        for linea in f:
+            parsed = parse_line(linea)
+            if parsed is None:
+                continue
+
+            operacion, payload = parsed
+            msg = {"operacion": operacion, "payload": payload, "ps_id": ps_id, "id_solicitud": ids.nuevo()}
+            await limite.acquire()
+            tarea = asyncio.ensure_future(enviar(msg))
+            tareas.add(tarea)
+            tarea.add_done_callback(tareas.discard)
+            total += 1
+
+    if tareas:
+        await asyncio.gather(*tareas)
+    cliente_gc.close()
+    duracion = time.time() - t_inicio
+    print(f"[PS] {total} solicitudes en {duracion:.2f} s (asyncio)")
+
+
+def enviar_lote(context, socket_req_gc, gc_endpoint: str, ps_id: str, lote: list, salida, sesion: str):
+    """Envía un lote al GC y escribe un resultado por línea. Devuelve (socket, n_ok)"""
+    msg = {
+        "operacion": "lote",
+        "ps_id": ps_id,
+        # Id por línea: reenviar el lote tras un timeout no repite lo ya aplicado
+        "items": [{"operacion": op, "payload": payload, "id_solicitud": f"{sesion}-{num_linea}"}
+                  for num_linea, _, op, payload in lote],
+    }
+    socket_req_gc, resp = enviar_solicitud(context, socket_req_gc, gc_endpoint, msg, PS_TIMEOUT_LOTE_MS)
+
+    resultados = resp.get("resultados") if resp else None
+    if resultados is None:
+        # Timeout o rechazo del lote completo: todas sus líneas quedan con ese error
+        error = resp or {"ok": False, "mensaje": "Sin respuesta del GC"}
+        resultados = [error] * len(lote)
+
+    n_ok = 0
+    for (num_linea, texto, _, _), r in zip(lote, resultados):
+        estado = "OK" if r.get("ok") else "ERROR"
+        n_ok += estado == "OK"
+        salida.write(f"{num_linea};{texto};{estado};{r.get('mensaje', r.get('razon', ''))}\n")
+    return socket_req_gc, n_ok
+
+
+def run_ps_lotes(sede: int, archivo_solicitudes: Path, tam_lote: int, archivo_salida: Path):
+    """PS en modo carga masiva:
+    - Lee el archivo en streaming (no lo carga entero) y valida cada línea
+    - Agrupa las operaciones en lotes de 'tam_lote' y envía cada lote en un solo mensaje
+    - Escribe el resultado de cada línea en 'archivo_salida'
+    """
+    if not archivo_solicitudes.exists():
+        print(f"[PS] El archivo de solicitudes no existe: {archivo_solicitudes}")
+        return
+    gc_endpoint = get_gc_endpoint_for_sede(sede)
+    print(f"[PS Sede {sede}] Modo lotes ({tam_lote} por lote) contra GC en {gc_endpoint}")
+    print(f"[PS Sede {sede}] Resultados en {archivo_salida}")
+
+    ps_id = f"sede{sede}-{archivo_solicitudes.stem}"
+    sesion = GeneradorIds(ps_id).prefijo
+    context = create_context()
+    socket_req_gc = create_req_socket(context, gc_endpoint, PS_TIMEOUT_LOTE_MS)
+
+    t_inicio = time.time()
+    total, total_ok, invalidas = 0, 0, 0
+    with archivo_solicitudes.open("r", encoding="utf-8") as f, \
+            archivo_salida.open("w", encoding="utf-8") as salida:
+        lote = []
+        for num_linea, linea in enumerate(f, start=1):
+            texto = linea.strip()
+            if not texto or texto.startswith("#"):
+                continue
+            parsed = parse_line(texto)
+            if parsed is None:
+                invalidas += 1
+                salida.write(f"{num_linea};{texto};INVALIDA;Línea inválida\n")
+                continue
+
+            operacion, payload = parsed
+            lote.append((num_linea, texto, operacion, payload))
+            if len(lote) >= tam_lote:
+                socket_req_gc, n_ok = enviar_lote(context, socket_req_gc, gc_endpoint, ps_id, lote, salida, sesion)
+                total += len(lote)
+                total_ok += n_ok
+                lote = []
+                print(f"[PS] {total} operaciones enviadas ({total_ok} OK)")
+
+        if lote:
+            socket_req_gc, n_ok = enviar_lote(context, socket_req_gc, gc_endpoint, ps_id, lote, salida, sesion)
+            total += len(lote)
+            total_ok += n_ok
+
+    duracion = time.time() - t_inicio
+    print(f"[PS] Carga masiva terminada: {total} operaciones ({total_ok} OK, {invalidas} líneas inválidas)"
+          f" en {duracion:.2f} s -> {total / duracion if duracion else 0:.1f} op/s")
 
 
 if __name__ == "__main__":
@@ -114,19 +336,82 @@ if __name__ == "__main__":
     parser.add_argument(
         "--sede",
         type=int,
-        choices=[1, 2],
+        choices=SEDES,
         required=True,
         help="Numero de sede a la que se envian las solicitudes",
     )
     parser.add_argument(
         "--archivo",
         type=str,
-        required=True,
+        default=None,
         help="Ruta al archivo de solicitudes",
     )
+    parser.add_argument(
+        "--buscar",
+        type=str,
+        default=None,
+        help="Buscar libros por título/autor en vez de enviar solicitudes (la última palabra vale como prefijo)",
+    )
+    parser.add_argument(
+        "--usuario",
+        type=str,
+        default=None,
+        help="Consultar los préstamos activos de un usuario en vez de enviar solicitudes",
+    )
+    parser.add_argument(
+        "--disponibilidad",
+        type=str,
+        default=None,
+        help="Consultar los ejemplares disponibles de un libro (código) en vez de enviar solicitudes",
+    )
+    parser.add_argument(
+        "--limite",
+        type=int,
+        default=10,
+        help="Resultados de la búsqueda (1-100)",
+    )
+    parser.add_argument(
+        "--lote",
+        type=int,
+        default=0,
+        help="Modo carga masiva: operaciones por lote (0 = una solicitud por línea)",
+    )
+    parser.add_argument(
+        "--salida",
+        type=str,
+        default=None,
+        help="Archivo de resultados por línea del modo lotes (por defecto <archivo>.resultados.txt)",
+    )
+    parser.add_argument(
+        "--asyncio",
+        action="store_true",
+        help="Ejecutar con zmq.asyncio: muchas solicitudes en curso a la vez",
+    )
     args = parser.parse_args()
+    if args.buscar is None and args.usuario is None and args.disponibilidad is None and args.archivo is None:
+        parser.error("se requiere --archivo (o --buscar / --usuario / --disponibilidad)")
 
-    run_ps(
-        sede=args.sede,
-        archivo_solicitudes=Path(args.archivo),
-    )
\ No newline at end of file
+    if args.buscar is not None:
+        run_buscar(sede=args.sede, texto=args.buscar, limite=args.limite)
+    elif args.usuario is not None:
+        run_prestamos_usuario(sede=args.sede, usuario_id=args.usuario)
+    elif args.disponibilidad is not None:
+        run_disponibilidad(sede=args.sede, libro_codigo=args.disponibilidad)
+    elif args.asyncio:
+        asyncio.run(run_ps_async(
+            sede=args.sede,
+            archivo_solicitudes=Path(args.archivo),
+        ))
+    elif args.lote > 0:
+        archivo = Path(args.archivo)
+        run_ps_lotes(
+            sede=args.sede,
+            archivo_solicitudes=archivo,
+            tam_lote=args.lote,
+            archivo_salida=Path(args.salida) if args.salida else archivo.with_suffix(".resultados.txt"),
+        )
+    else:
+        run_ps(
+            sede=args.sede,
+            archivo_solicitudes=Path(args.archivo),
+        )
\ No newline at end of file
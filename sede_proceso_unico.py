@@ -0,0 +1,58 @@
+# sede_proceso_unico.py
+"""
+Sede completa en un solo proceso: GA, actores y GC como hilos que comparten
+el contexto ZeroMQ del proceso. Entre ellos los mensajes van por inproc://
+(sin pila TCP ni syscalls de red); los endpoints TCP de la topología se siguen
+publicando, así los PS y las demás sedes se conectan igual que siempre.
+
+Uso:
+  python sede_proceso_unico.py --sede 1
+  TRANSPORTE=auto python sede_proceso_unico.py --sede 2   # además ipc:// para procesos del mismo host
+"""
+import argparse
+import threading
+import time
+
+from comun.config import SEDES, marcar_en_proceso
+from comun.perfilado import instalar_senal_perfil
+from gestor_almacenamiento.ga import run_ga
+from gestor_carga.gc import run_gc
+from actores.actor_prestamo import run_actor_prestamos
+from actores.actor_devolucion import run_actor_devolucion
+from actores.actor_renovacion import run_actor_renovacion
+
+# Roles que se atienden dentro del proceso (se conectan entre sí por inproc)
+ROLES_SEDE = ("gc_reqrep", "gc_pub", "actor_prestamos", "ga", "ga_heartbeat", "ga_vencimientos", "ga_replicacion")
+
+
+def run_sede(sede: int):
+    # Antes de arrancar: cada componente resuelve sus endpoints al iniciar
+    marcar_en_proceso(sede, ROLES_SEDE)
+    # Los componentes corren en hilos: la señal de perfilado la instala el proceso
+    instalar_senal_perfil(f"sede{sede}")
+    componentes = [
+        ("GA", run_ga),
+        ("ActorPrestamos", run_actor_prestamos),
+        ("ActorDevolucion", run_actor_devolucion),
+        ("ActorRenovacion", run_actor_renovacion),
+        ("GC", run_gc),
+    ]
+    hilos = []
+    for nombre, run in componentes:
+        hilo = threading.Thread(target=run, args=(sede,), name=f"{nombre}-sede{sede}", daemon=True)
+        hilo.start()
+        hilos.append(hilo)
+    print(f"[Sede {sede}] GA, actores y GC en un solo proceso (inproc)")
+
+    # Si un componente muere, el proceso termina (quien lo supervise lo reinicia completo)
+    while all(h.is_alive() for h in hilos):
+        time.sleep(1)
+    caidos = [h.name for h in hilos if not h.is_alive()]
+    print(f"[Sede {sede}] Componente terminado: {', '.join(caidos)}. Cerrando la sede.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sede completa (GA, actores y GC) en un solo proceso")
+    parser.add_argument("--sede", type=int, choices=SEDES, required=True)
+    args = parser.parse_args()
+    run_sede(args.sede)
@@ -8,7 +8,8 @@ import random
 import json
 from pathlib import Path
 from comun.zeromq_utils import create_context, create_req_socket, encode_message, decode_message, safe_recv
-from comun.config import GC_SEDE1_ENDPOINT_REQREP
+from comun.config import endpoint_conexion
+from comun.administracion import enviar_comando
 
 # CONFIGURACIÓN
 PYTHON_EXE = sys.executable
@@ -58,7 +59,7 @@ def esperar_inicio(segundos=3):
 def cliente_virtual(sede, n_peticiones, resultados):
     """Simula un PS enviando muchas peticiones seguidas"""
     context = create_context()
-    endpoint = GC_SEDE1_ENDPOINT_REQREP if sede == 1 else "tcp://127.0.0.1:5552"
+    endpoint = endpoint_conexion(sede, "gc_reqrep")
     socket = create_req_socket(context, endpoint)
 
     aciertos = 0
@@ -102,6 +103,83 @@ def cliente_virtual(sede, n_peticiones, resultados):
 
 # --- ESCENARIOS DE PRUEBA ---
 
+def test_admision_recupera():
+    """Unitaria: tras timeouts del actor (EWMA sobre el plazo) el GC vuelve a admitir préstamos"""
+    from gestor_carga.admision import ControlAdmision, LATENCIA_BASE_MS
+    log("\n=== INICIANDO TEST: RECUPERACIÓN DEL CONTROL DE ADMISIÓN ===")
+    admision = ControlAdmision()
+    admision.fijar_tasa(tasa=1e6, rafaga=1e6)
+    for _ in range(8):  # caída del GA: préstamos que vencen a los 3000 ms
+        assert admision.admitir("ps", "prestamo", 0) is None
+        admision.en_cola += 1
+        admision.registrar_fin(3000)
+    assert admision.latencia_ms > admision.plazo_respuesta_ms, admision.latencia_ms
+    # Con la cola vacía pasa el sondeo; con él en curso, el resto espera
+    assert admision.admitir("ps", "prestamo", 0) is None
+    admision.en_cola += 1
+    assert admision.admitir("ps", "prestamo", 0)["razon"] == "OCUPADO"
+    # El GA volvió: el sondeo responde rápido y la estimación baja
+    admision.registrar_fin(20)
+    # Sin actividad la estimación vuelve a la base (se simulan 30 s inactivo)
+    admision.ultima_actividad -= 30
+    assert admision.admitir("ps", "prestamo", 0) is None
+    assert admision.latencia_ms < LATENCIA_BASE_MS + 1, admision.latencia_ms
+    admision.en_cola += 1
+    assert admision.admitir("ps", "prestamo", 0) is None
+    log("Admisión recuperada: préstamos admitidos tras la caída del GA")
+
+
+def test_persistencia_json():
+    """Unitaria: escribir_json/leer_json (objeto vacío y con datos) y detección de un archivo dañado"""
+    import tempfile
+    from gestor_almacenamiento.persistencia import escribir_json, leer_json
+    log("\n=== INICIANDO TEST: PERSISTENCIA JSON CON SUMA ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bd.json"
+        for obj, indent in (({}, None), ({}, 2), ({"version": 3, "libros": [{"codigo": "L0001"}]}, 2)):
+            escribir_json(path, obj, indent=indent)
+            json.loads(path.read_text(encoding="utf-8"))  # JSON válido, con la clave de la suma
+            assert leer_json(path) == obj, path.read_text(encoding="utf-8")
+        # Un byte cambiado (mismo largo, sigue siendo JSON válido): lo detecta la suma
+        path.write_bytes(path.read_bytes().replace(b'"version": 3', b'"version": 4'))
+        try:
+            leer_json(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("leer_json aceptó un archivo dañado")
+    log("Persistencia JSON: ida y vuelta correcta y archivo dañado detectado")
+
+
+def test_arranque_perezoso():
+    """Unitaria: el GA arranca del snapshot binario sin dejar libros decodificados en el overlay"""
+    import tempfile
+    from gestor_almacenamiento import ga
+    from gestor_almacenamiento.formato_binario import escribir_snapshot_binario
+    log("\n=== INICIANDO TEST: ARRANQUE PEREZOSO DESDE EL SNAPSHOT BINARIO ===")
+    libros = [{"codigo": f"L{i:05d}", "titulo": f"Libro {i}", "autor": f"Autor {i % 50}",
+               "ejemplares_totales": 2, "ejemplares_disponibles": 2 - (i % 3 == 0),
+               "prestamos": [{"usuario_id": f"U{i % 7}", "fecha_entrega": "2020-01-01", "renovaciones": 0}]
+               if i % 3 == 0 else []}
+              for i in range(1, 3001)]
+    with tempfile.TemporaryDirectory() as tmp:
+        nombres = {"primaria": "bd.json", "replica": "replica.json", "snapshot": "bd.bin",
+                   "disponibilidad": "disp.tbl", "vencimientos": "vencidos.jsonl"}
+        paths = {clave: Path(tmp) / nombre for clave, nombre in nombres.items()}
+        db = {"version": 7, "libros": libros}
+        ga.save_db(paths["primaria"], db)
+        escribir_snapshot_binario(paths["snapshot"], db)
+
+        origen = ga.cargar_estado(1, paths)
+        assert origen == "snapshot binario", origen
+        assert len(ga.db_in_memory["libros"].overlay) == 0, len(ga.db_in_memory["libros"].overlay)
+        # Los índices se armaron igual: todos los préstamos, su heap y la búsqueda
+        assert ga.indice_usuarios.memoria()["prestamos"] == 1000
+        assert sum(ga.indice_vencimientos.dias["2020-01-01"].values()) == 1000
+        assert ga.indice_busqueda.buscar("Libro 2999")[0][0][0] == "L02999"
+    log("Arranque perezoso: índices armados y overlay vacío")
+
+
 def test_tolerancia_fallos():
     log("=== INICIANDO TEST: TOLERANCIA A FALLOS ===")
 
@@ -139,6 +217,72 @@ def test_tolerancia_fallos():
     matar_todo()
 
 
+def test_reinicio_sin_corte():
+    log("\n=== INICIANDO TEST: REINICIO ESCALONADO DEL GA SIN CORTE ===")
+
+    procesos.clear()
+    iniciar_componente("gestor_almacenamiento/ga.py", "--sede 1", "ga1_reinicio.log")
+    iniciar_componente("gestor_almacenamiento/ga.py", "--sede 2", "ga2_reinicio.log")
+    iniciar_componente("gestor_carga/gc.py", "--sede 1", "gc1_reinicio.log")
+    iniciar_componente("actores/actor_prestamo.py", "--sede 1", "actor_prestamo1_reinicio.log")
+
+    esperar_inicio(5)
+
+    # Cliente continuo: (instante, latencia, ok) de cada préstamo
+    medidas = []
+    fin = threading.Event()
+
+    def cliente():
+        socket = create_req_socket(create_context(), endpoint_conexion(1, "gc_reqrep"))
+        i = 0
+        while not fin.is_set():
+            msg = {"operacion": "prestamo", "id_solicitud": f"reinicio-{i}",
+                   "payload": {"libro_codigo": f"L{random.randint(1, 1000):04d}",
+                               "usuario_id": f"REINICIO_{i}", "fecha_actual": "2025-11-20"}}
+            t_inicio = time.time()
+            socket.send(encode_message(msg))
+            resp = safe_recv(socket)
+            if resp is None:
+                socket.close()
+                socket = create_req_socket(create_context(), endpoint_conexion(1, "gc_reqrep"))
+            medidas.append((t_inicio, time.time() - t_inicio, resp is not None and resp.get("ok") is not None))
+            i += 1
+            time.sleep(0.1)  # por debajo del límite de tasa por PS del GC
+
+    hilo = threading.Thread(target=cliente, daemon=True)
+    hilo.start()
+    time.sleep(5)
+
+    log("Reinicio escalonado del GA Sede 1 (drenar -> terminar -> arrancar)...")
+    t_reinicio = time.time()
+    subprocess.run([PYTHON_EXE, "-m", "comun.despliegue", "--componente", "ga", "--sedes", "1"], cwd=BASE_DIR)
+    t_listo = time.time()
+    time.sleep(3)
+    fin.set()
+    hilo.join()
+
+    def resumen(etiqueta, tramo):
+        latencias = sorted(m[1] for m in tramo)
+        if not latencias:
+            return
+        p99 = latencias[min(len(latencias) - 1, int(0.99 * len(latencias)))]
+        fallidas = sum(1 for m in tramo if not m[2])
+        log(f"{etiqueta}: {len(tramo)} préstamos, p50 {latencias[len(latencias) // 2] * 1000:.1f} ms,"
+            f" p99 {p99 * 1000:.1f} ms, sin respuesta {fallidas}")
+
+    resumen("Antes del reinicio", [m for m in medidas if m[0] < t_reinicio])
+    resumen("Durante el reinicio", [m for m in medidas if t_reinicio <= m[0] < t_listo])
+    resumen("Después del reinicio", [m for m in medidas if m[0] >= t_listo])
+    log("Verifica en 'logs_despliegue/ga_sede1.log' el mensaje de 'Relevo en caliente'.")
+
+    # El GA nuevo lo arrancó comun.despliegue: no está en la lista de procesos
+    try:
+        enviar_comando("ga", 1, {"comando": "terminar", "forzar": True})
+    except Exception:
+        pass
+    matar_todo()
+
+
 def test_carga_stress():
     log("\n=== INICIANDO TEST: CARGA (MUCHAS PETICIONES) ===")
 
@@ -188,8 +332,13 @@ def test_carga_stress():
 
 if __name__ == "__main__":
     try:
+        test_admision_recupera()
+        test_persistencia_json()
+        test_arranque_perezoso()
         test_tolerancia_fallos()
         time.sleep(2)
         test_carga_stress()
+        time.sleep(2)
+        test_reinicio_sin_corte()
     except KeyboardInterrupt:
         matar_todo()
\ No newline at end of file